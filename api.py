@@ -19,8 +19,9 @@ from biz.queue.worker import handle_merge_request_event, handle_push_event, hand
 from biz.service.review_service import ReviewService
 from biz.utils.im import notifier
 from biz.utils.log import logger
-from biz.utils.queue import handle_queue
+from biz.utils.queue import handle_queue, init_queue
 from biz.utils.reporter import Reporter
+from biz.utils.review_cache import ReviewCache
 
 from biz.utils.config_checker import check_config
 
@@ -71,6 +72,12 @@ def daily_report():
         return jsonify({'message': f"Failed to generate daily report: {e}"}), 500
 
 
+@api_app.route('/review/cache/stats', methods=['GET'])
+def review_cache_stats():
+    # 审查结果缓存的条目数及命中/未命中次数
+    return jsonify(ReviewCache().stats()), 200
+
+
 def setup_scheduler():
     """
     配置并启动定时任务调度器
@@ -124,6 +131,10 @@ def handle_webhook():
         return jsonify({'message': 'Invalid data format'}), 400
 
 
+def queue_full_response():
+    return jsonify({'message': 'Too many pending review tasks, please retry later.'}), 503
+
+
 def handle_github_webhook(event_type, data):
     # 获取GitHub配置
     github_token = os.getenv('GITHUB_ACCESS_TOKEN') or request.headers.get('X-GitHub-Token')
@@ -139,13 +150,15 @@ def handle_github_webhook(event_type, data):
 
     if event_type == "pull_request":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug)
+        if not handle_queue(handle_github_pull_request_event, data, github_token, github_url, github_url_slug):
+            return queue_full_response()
         # 立马返回响应
         return jsonify(
             {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
     elif event_type == "push":
         # 使用handle_queue进行异步处理
-        handle_queue(handle_github_push_event, data, github_token, github_url, github_url_slug)
+        if not handle_queue(handle_github_push_event, data, github_token, github_url, github_url_slug):
+            return queue_full_response()
         # 立马返回响应
         return jsonify(
             {'message': f'GitHub request received(event_type={event_type}), will process asynchronously.'}), 200
@@ -187,15 +200,17 @@ def handle_gitlab_webhook(data):
 
     # 处理Merge Request Hook
     if object_kind == "merge_request":
-        # 创建一个新进程进行异步处理
-        handle_queue(handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        # 提交到任务队列进行异步处理
+        if not handle_queue(handle_merge_request_event, data, gitlab_token, gitlab_url, gitlab_url_slug):
+            return queue_full_response()
         # 立马返回响应
         return jsonify(
             {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
     elif object_kind == "push":
-        # 创建一个新进程进行异步处理
+        # 提交到任务队列进行异步处理
         # TODO check if PUSH_REVIEW_ENABLED is needed here
-        handle_queue(handle_push_event, data, gitlab_token, gitlab_url, gitlab_url_slug)
+        if not handle_queue(handle_push_event, data, gitlab_token, gitlab_url, gitlab_url_slug):
+            return queue_full_response()
         # 立马返回响应
         return jsonify(
             {'message': f'Request received(object_kind={object_kind}), will process asynchronously.'}), 200
@@ -209,6 +224,8 @@ if __name__ == '__main__':
     check_config()
     # 启动定时任务调度器
     setup_scheduler()
+    # 预热任务队列工作进程
+    init_queue()
 
     # 启动Flask API服务
     port = int(os.environ.get('SERVER_PORT', 5001))
@@ -1,21 +1,47 @@
 import os
+import shutil
+import threading
 import traceback
+import uuid
 from flask import Blueprint, request, jsonify
-from werkzeug.utils import secure_filename
 
 from biz.utils.rag_code_reviewer import RAGCodeReviewer
 from biz.utils.code_reviewer import CodeReviewer
+from biz.utils.knowledge_base import DocumentProcessor
 from biz.utils.log import logger
 
 knowledge_bp = Blueprint('knowledge', __name__)
 
+# 进程内复用的RAG审查器，知识库与向量化模型只初始化一次
+_rag_reviewer = None
+_rag_reviewer_lock = threading.Lock()
+
+
+def get_rag_reviewer() -> RAGCodeReviewer:
+    global _rag_reviewer
+    with _rag_reviewer_lock:
+        if _rag_reviewer is None:
+            _rag_reviewer = RAGCodeReviewer()
+        return _rag_reviewer
+
 # 允许的文件扩展名
-ALLOWED_EXTENSIONS = {'txt', 'md'}
+ALLOWED_EXTENSIONS = {'txt', 'md', 'pdf', 'docx'}
 
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
+def save_upload(file, upload_folder: str) -> str:
+    """
+    以 uuid + 原扩展名保存上传的文件，返回保存路径。不使用 secure_filename：它会去掉中文等非 ASCII 字符，
+    `编码规范.pdf` 会变成没有扩展名的 `pdf`，同扩展名的文件还会互相覆盖；原文件名作为标题单独传递
+    """
+    os.makedirs(upload_folder, exist_ok=True)
+    file_path = os.path.join(upload_folder, uuid.uuid4().hex + os.path.splitext(file.filename)[1].lower())
+    file.save(file_path)
+    return file_path
+
 @knowledge_bp.route('/upload', methods=['POST'])
 def upload_document():
     """上传知识文档"""
@@ -28,7 +54,7 @@ def upload_document():
             return jsonify({'error': '没有选择文件'}), 400
         
         if not allowed_file(file.filename):
-            return jsonify({'error': f'不支持的文件类型。请上传 .txt 或 .md 格式的文档文件。'}), 400
+            return jsonify({'error': f'不支持的文件类型。请上传 .txt、.md、.pdf 或 .docx 格式的文档文件。'}), 400
         
         # 获取标题和标签
         title = request.form.get('title', file.filename)
@@ -36,14 +62,10 @@ def upload_document():
         tags = [tag.strip() for tag in tags if tag.strip()]
         
         # 保存文件
-        filename = secure_filename(file.filename)
-        upload_folder = 'data/uploads'
-        os.makedirs(upload_folder, exist_ok=True)
-        file_path = os.path.join(upload_folder, filename)
-        file.save(file_path)
+        file_path = save_upload(file, 'data/uploads')
         
         # 添加到知识库
-        reviewer = RAGCodeReviewer()
+        reviewer = get_rag_reviewer()
         doc_id = reviewer.add_knowledge_document(title, file_path, tags)
         
         # 删除临时文件
@@ -61,11 +83,52 @@ def upload_document():
         logger.error(traceback.format_exc())
         return jsonify({'error': f'上传失败: {str(e)}'}), 500
 
+@knowledge_bp.route('/upload/batch', methods=['POST'])
+def upload_documents():
+    """批量上传知识文档，字段 files 可包含多个文件，标题使用文件名"""
+    upload_folder = os.path.join('data/uploads', uuid.uuid4().hex)
+    try:
+        files = [file for file in request.files.getlist('files') if file.filename]
+        if not files:
+            return jsonify({'error': '没有文件'}), 400
+        
+        unsupported = [file.filename for file in files
+                       if os.path.splitext(file.filename)[1].lower() not in DocumentProcessor.SUPPORTED_EXTENSIONS]
+        if unsupported:
+            return jsonify({'error': f'不支持的文件类型: {", ".join(unsupported)}'}), 400
+        
+        tags = request.form.get('tags', '').split(',')
+        tags = [tag.strip() for tag in tags if tag.strip()]
+        
+        # 保存文件，标题使用原文件名
+        file_names = {save_upload(file, upload_folder): file.filename for file in files}
+        
+        # 批量添加到知识库
+        reviewer = get_rag_reviewer()
+        stats = reviewer.add_knowledge_documents(list(file_names), tags, titles=list(file_names.values()))
+        
+        return jsonify({
+            'message': f'成功导入 {len(stats["documents"])} 个文档',
+            'documents': [{'doc_id': doc['doc_id'], 'title': doc['title']} for doc in stats['documents']],
+            'failed': [file_names[file_path] for file_path in stats['failed']],
+            'chunks': stats['chunks'],
+            'elapsed': round(stats['elapsed'], 2),
+            'tags': tags
+        })
+        
+    except Exception as e:
+        logger.error(f"批量上传文档失败: {e}")
+        logger.error(traceback.format_exc())
+        return jsonify({'error': f'上传失败: {str(e)}'}), 500
+    finally:
+        # 删除临时文件
+        shutil.rmtree(upload_folder, ignore_errors=True)
+
 @knowledge_bp.route('/documents', methods=['GET'])
 def list_documents():
     """列出所有知识文档"""
     try:
-        reviewer = RAGCodeReviewer()
+        reviewer = get_rag_reviewer()
         documents = reviewer.list_knowledge_documents()
         
         return jsonify({
@@ -82,7 +145,7 @@ def delete_document(doc_id):
     """删除知识文档"""
     try:
         source = request.args.get('source', 'custom')  # 获取source参数
-        reviewer = RAGCodeReviewer()
+        reviewer = get_rag_reviewer()
         reviewer.delete_knowledge_document(doc_id, source)
         
         return jsonify({'message': f'文档 {doc_id} 已删除'})
@@ -95,7 +158,7 @@ def delete_document(doc_id):
 def restore_builtin_documents():
     """恢复所有内置文档"""
     try:
-        reviewer = RAGCodeReviewer()
+        reviewer = get_rag_reviewer()
         reviewer.restore_builtin_documents()
         
         return jsonify({'message': '内置文档已恢复'})
@@ -106,17 +169,13 @@ def restore_builtin_documents():
 
 @knowledge_bp.route('/documents/reload', methods=['POST'])
 def reload_builtin_documents():
-    """重新加载内置文档（清除后重新添加）"""
+    """重新加载内置文档（按内容哈希增量同步，只处理有变化的文档）"""
     try:
-        reviewer = RAGCodeReviewer()
-        
-        # 清除内置文档集合
-        reviewer.knowledge_base.clear_builtin_collection()
+        reviewer = get_rag_reviewer()
         
-        # 重新初始化内置文档
-        reviewer.knowledge_base._init_builtin_knowledge()
+        stats = reviewer.knowledge_base.reload_builtin_knowledge()
         
-        return jsonify({'message': '内置文档已重新加载'})
+        return jsonify({'message': '内置文档已重新加载', 'stats': stats})
         
     except Exception as e:
         logger.error(f"重新加载内置文档失败: {e}")
@@ -139,7 +198,7 @@ def search_documents():
         if not 0 <= similarity_threshold <= 1:
             return jsonify({'error': '相似度阈值必须在0到1之间'}), 400
         
-        reviewer = RAGCodeReviewer()
+        reviewer = get_rag_reviewer()
         results = reviewer.knowledge_base.search_relevant_documents(
             query, n_results, source, similarity_threshold
         )
@@ -181,7 +240,7 @@ def test_rag():
         if not 0 <= temperature <= 2:
             return jsonify({'error': '温度值必须在0到2之间'}), 400
         
-        reviewer = RAGCodeReviewer()
+        reviewer = get_rag_reviewer()
         
         # 获取相关知识
         relevant_docs = reviewer.get_relevant_knowledge(code, similarity_threshold)
@@ -208,7 +267,7 @@ def test_rag():
 def get_status():
     """获取知识库状态"""
     try:
-        reviewer = RAGCodeReviewer()
+        reviewer = get_rag_reviewer()
         documents = reviewer.list_knowledge_documents()
         
         custom_docs = [doc for doc in documents if doc['source'] == 'custom']
@@ -248,7 +307,7 @@ def compare_rag():
             return jsonify({'error': '温度值必须在0到2之间'}), 400
         
         # 1. 使用RAG进行审查
-        rag_reviewer = RAGCodeReviewer()
+        rag_reviewer = get_rag_reviewer()
         
         # 获取相关知识
         relevant_docs = rag_reviewer.get_relevant_knowledge(code, similarity_threshold)
@@ -0,0 +1,52 @@
+import io
+import os
+from unittest import TestCase, main, mock
+
+from flask import Flask
+
+from biz.api import knowledge_api
+
+
+class FakeReviewer:
+    def __init__(self):
+        self.saved = {}
+        self.titles = None
+
+    def add_knowledge_documents(self, file_paths, tags=None, workers=None, on_progress=None, titles=None):
+        # 请求结束后临时目录会被删除，这里读出保存的文件
+        for file_path in file_paths:
+            with open(file_path, encoding="utf-8") as f:
+                self.saved[file_path] = f.read()
+        self.titles = titles
+        documents = [{"doc_id": f"doc{i}", "title": title} for i, title in enumerate(titles[:-1])]
+        return {"documents": documents, "failed": file_paths[-1:], "chunks": 2, "elapsed": 0.1}
+
+
+class TestUploadDocuments(TestCase):
+    def setUp(self):
+        app = Flask(__name__)
+        app.register_blueprint(knowledge_api.knowledge_bp, url_prefix="/knowledge")
+        self.client = app.test_client()
+        self.reviewer = FakeReviewer()
+        patcher = mock.patch.object(knowledge_api, "get_rag_reviewer", return_value=self.reviewer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_non_ascii_and_duplicate_extension_names(self):
+        names = ["编码规范.md", "安全指南.md", "Guide.MD"]
+        files = [(io.BytesIO(name.encode("utf-8")), name) for name in names]
+        response = self.client.post("/knowledge/upload/batch", data={"files": files},
+                                    content_type="multipart/form-data")
+
+        self.assertEqual(response.status_code, 200)
+        # 每个文件单独保存、保留扩展名，原文件名作为标题
+        self.assertEqual(sorted(self.reviewer.saved.values()), sorted(names))
+        self.assertTrue(all(os.path.splitext(path)[1] == ".md" for path in self.reviewer.saved))
+        self.assertEqual(self.reviewer.titles, names)
+        body = response.get_json()
+        self.assertEqual([doc["title"] for doc in body["documents"]], names[:2])
+        self.assertEqual(body["failed"], ["Guide.MD"])
+
+
+if __name__ == '__main__':
+    main()
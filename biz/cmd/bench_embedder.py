@@ -0,0 +1,147 @@
+import argparse
+import glob
+import multiprocessing
+import resource
+import time
+from typing import List
+
+import numpy as np
+
+from biz.utils.embedder import DEFAULT_MODEL_NAME, EMBEDDING_BACKENDS
+
+
+def load_kb_chunks(kb_path: str) -> List[str]:
+    """读取知识库中已有的全部文档块"""
+    import chromadb
+
+    client = chromadb.PersistentClient(path=kb_path)
+    chunks = []
+    for name in ("custom_knowledge", "builtin_knowledge"):
+        try:
+            chunks.extend(client.get_collection(name).get(include=["documents"])["documents"])
+        except ValueError:
+            pass
+    return chunks
+
+
+def load_file_chunks(pattern: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """按知识库的处理流程提取并分割匹配的文件"""
+    from biz.utils.knowledge_base import DocumentProcessor
+    from biz.utils.text_splitter import TextSplitter
+
+    splitter = TextSplitter(chunk_size, chunk_overlap)
+    chunks = []
+    for file_path in sorted(glob.glob(pattern)):
+        chunks.extend(splitter.split_text(DocumentProcessor.process_document(file_path)))
+    return chunks
+
+
+def review_queries() -> List[str]:
+    """代码审查检索实际使用的查询"""
+    from biz.utils.knowledge_base import REVIEW_QUERY_TEMPLATES
+    from biz.utils.language_detector import LANGUAGES
+
+    return [template.format(language=language) for language in LANGUAGES for template in REVIEW_QUERY_TEMPLATES]
+
+
+def measure(backend: str, model_name: str, chunks: List[str], queries: List[str], batch_size: int, connection):
+    """在独立进程中加载模型并计时，峰值内存不受其他后端影响"""
+    from biz.utils.embedder import get_embedding_model
+
+    start = time.perf_counter()
+    model = get_embedding_model(model_name, backend)
+    load_time = time.perf_counter() - start
+    # 预热，排除首次推理的初始化开销
+    model.encode(chunks[:batch_size], batch_size=batch_size)
+
+    start = time.perf_counter()
+    doc_vectors = np.asarray(model.encode(chunks, batch_size=batch_size), dtype=np.float32)
+    corpus_time = time.perf_counter() - start
+
+    # 查询逐条向量化，与线上检索一致
+    start = time.perf_counter()
+    query_vectors = np.asarray([model.encode(query) for query in queries], dtype=np.float32)
+    query_time = (time.perf_counter() - start) / max(len(queries), 1)
+
+    connection.send({
+        "load": load_time,
+        "corpus": corpus_time,
+        "query": query_time,
+        # Linux 下 ru_maxrss 单位为 KB
+        "rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "doc_vectors": doc_vectors,
+        "query_vectors": query_vectors,
+    })
+    connection.close()
+
+
+def run_backend(backend: str, model_name: str, chunks: List[str], queries: List[str], batch_size: int) -> dict:
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=measure, args=(backend, model_name, chunks, queries, batch_size, sender))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    return result
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def recall_at_k(reference: dict, result: dict, k: int) -> float:
+    """以参考后端的 top-k 检索结果为准，计算 recall@k"""
+    def top_k(item):
+        scores = normalize(item["query_vectors"]) @ normalize(item["doc_vectors"]).T
+        return np.argsort(-scores, axis=1)[:, :k]
+
+    expected, actual = top_k(reference), top_k(result)
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="向量化推理后端基准测试：延迟、内存和相对参考后端的 recall@k")
+    parser.add_argument("--backends", default=",".join(EMBEDDING_BACKENDS),
+                        help="逗号分隔的推理后端，第一个作为参考后端")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME)
+    parser.add_argument("--kb-path", default=None, help="使用知识库中已有的文档块作为语料，如 data/knowledge_base")
+    parser.add_argument("--pattern", default="docs/builtin/*.md", help="未指定 --kb-path 时使用的语料文件 glob")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    backends = [backend.strip() for backend in args.backends.split(",") if backend.strip()]
+    unknown = [backend for backend in backends if backend not in EMBEDDING_BACKENDS]
+    if unknown:
+        parser.error(f"不支持的推理后端: {', '.join(unknown)}")
+    chunks = load_kb_chunks(args.kb_path) if args.kb_path else \
+        load_file_chunks(args.pattern, args.chunk_size, args.chunk_overlap)
+    if not chunks:
+        print("语料为空")
+        return
+    queries = review_queries()
+    print(f"语料: {len(chunks)} 个块, {len(queries)} 个查询, 参考后端: {backends[0]}, k={args.k}")
+
+    reference = None
+    for backend in backends:
+        result = run_backend(backend, args.model, chunks, queries, args.batch_size)
+        if result is None:
+            print(f"{backend:<10} 运行失败")
+            continue
+        reference = reference or result
+        # 同一文本在两个后端下的向量余弦相似度
+        cosine = float(np.mean(np.sum(normalize(reference["doc_vectors"]) * normalize(result["doc_vectors"]), axis=1)))
+        print(f"{backend:<10} 加载 {result['load']:>6.2f} s  语料 {result['corpus']:>7.2f} s "
+              f"({len(chunks) / result['corpus']:>7.1f} 块/秒)  单条查询 {result['query'] * 1000:>6.2f} ms  "
+              f"峰值内存 {result['rss']:>7.1f} MB  recall@{args.k} {recall_at_k(reference, result, args.k):.3f}  "
+              f"余弦 {cosine:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import argparse
+import glob
+import re
+import time
+from typing import List
+
+from biz.utils.text_splitter import TextSplitter
+
+HEADING_LINE = re.compile(r"^ {0,3}#{1,6}\s", re.MULTILINE)
+FENCE_LINE = re.compile(r"^ {0,3}(?:```|~~~)", re.MULTILINE)
+
+
+def legacy_split_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
+    """原 TextSplitter.split_text 的实现，作为对比基准"""
+    if len(text) <= chunk_size:
+        return [text]
+
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = start + chunk_size
+        if end < len(text):
+            sentence_ends = ['.', '?', '!', '\n', '。', '？', '！']
+            for i in range(end, max(start + chunk_size - 200, start), -1):
+                if text[i] in sentence_ends:
+                    end = i + 1
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end - chunk_overlap
+    return chunks
+
+
+def split_sections(text: str) -> List[str]:
+    """按 Markdown 标题把文本拆成章节"""
+    starts = [0] + [match.start() for match in HEADING_LINE.finditer(text)] + [len(text)]
+    sections = [text[starts[i]:starts[i + 1]].strip() for i in range(len(starts) - 1)]
+    return [section for section in sections if section]
+
+
+def chunk_quality(texts: List[str], results: List[List[str]], chunk_size: int) -> dict:
+    """
+    拆开的章节：长度不超过 chunk_size、却没有被任何一个块完整包含的章节；
+    断开的代码块：块内代码块围栏数量为奇数
+    """
+    chunks = [chunk for doc_chunks in results for chunk in doc_chunks]
+    split = 0
+    for text, doc_chunks in zip(texts, results):
+        for section in split_sections(text):
+            if len(section) <= chunk_size and not any(section in chunk for chunk in doc_chunks):
+                split += 1
+    broken_fences = sum(1 for chunk in chunks if len(FENCE_LINE.findall(chunk)) % 2)
+    return {"chunks": len(chunks), "split_sections": split, "broken_fences": broken_fences,
+            "avg_len": sum(map(len, chunks)) / max(len(chunks), 1)}
+
+
+def run(name: str, split, texts: List[str], chunk_size: int, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [split(text) for text in texts]
+    elapsed = (time.perf_counter() - start) / repeat
+    quality = chunk_quality(texts, results, chunk_size)
+    total_chars = sum(map(len, texts))
+    print(f"{name:<8} {elapsed * 1000:>9.2f} ms {total_chars / elapsed / 1e6:>8.1f} MB/s "
+          f"{quality['chunks']:>6} 块 平均 {quality['avg_len']:>6.0f} 字符 "
+          f"拆开的章节 {quality['split_sections']:>4} 断开的代码块 {quality['broken_fences']:>4}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="文本分割器基准测试（对比原实现）")
+    parser.add_argument("--pattern", default="docs/builtin/*.md", help="语料文件 glob")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--scale", type=int, default=1, help="把每个文件重复拼接的次数，用于测试长文档")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    texts = []
+    for file_path in sorted(glob.glob(args.pattern)):
+        with open(file_path, "r", encoding="utf-8") as f:
+            texts.append("\n\n".join([f.read()] * args.scale))
+    if not texts:
+        print(f"没有匹配的文件: {args.pattern}")
+        return
+    print(f"语料: {len(texts)} 个文件, {sum(map(len, texts))} 个字符, "
+          f"chunk_size={args.chunk_size}, chunk_overlap={args.chunk_overlap}")
+
+    splitter = TextSplitter(args.chunk_size, args.chunk_overlap)
+    # 原实现在句子边界出现在窗口前部时 start 会回退，chunk_overlap 较大时可能无法结束
+    if args.chunk_overlap < args.chunk_size - 200:
+        run("legacy", lambda text: legacy_split_text(text, args.chunk_size, args.chunk_overlap), texts,
+            args.chunk_size, args.repeat)
+    else:
+        print("legacy   跳过：chunk_overlap >= chunk_size - 200 时原实现可能无法结束")
+    run("current", splitter.split_text, texts, args.chunk_size, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
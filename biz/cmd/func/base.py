@@ -4,7 +4,7 @@ from abc import abstractmethod
 from typing import List, Dict, Any
 
 from biz.llm.factory import Factory
-from biz.utils.token_util import count_tokens, truncate_text_by_tokens
+from biz.utils.token_util import count_and_truncate
 
 
 class BaseReviewFunc(abc.ABC):
@@ -73,9 +73,7 @@ class LLMReviewFunc(BaseReviewFunc):
             return '内容为空，无法进行评审。'
 
         # 计算tokens数量，如果超过REVIEW_MAX_TOKENS，截断changes_text
-        tokens_count = count_tokens(text)
-        if tokens_count > self.review_max_tokens:
-            text = truncate_text_by_tokens(text, self.review_max_tokens)
+        _, text = count_and_truncate(text, self.review_max_tokens)
 
         messages = self.get_prompts(text)
         review_result = self.call_llm(messages).strip()
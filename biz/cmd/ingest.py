@@ -0,0 +1,40 @@
+import argparse
+import sys
+
+from dotenv import load_dotenv
+
+from biz.utils.knowledge_base import KnowledgeBase, collect_document_files
+
+
+def print_progress(stats: dict):
+    elapsed = stats["elapsed"] or 1e-9
+    print(f"\r📥 {stats['processed']}/{stats['total']} 个文件, {stats['chunks']} 个块, "
+          f"{stats['processed'] / elapsed:.1f} 文件/秒, {stats['chunks'] / elapsed:.1f} 块/秒", end="", flush=True)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量导入文档到知识库（支持 PDF、DOCX、Markdown 和文本文件）")
+    parser.add_argument("paths", nargs="+", help="文件或目录，目录会递归导入其中支持的文件")
+    parser.add_argument("--tags", default="", help="所有文档共用的标签，逗号分隔")
+    parser.add_argument("--workers", type=int, default=None, help="提取文本的进程数，默认取 INGEST_WORKERS 或 CPU 核数")
+    args = parser.parse_args(argv)
+
+    file_paths = collect_document_files(args.paths)
+    if not file_paths:
+        print("❌ 没有找到可导入的文件")
+        return 1
+    tags = [tag.strip() for tag in args.tags.split(",") if tag.strip()]
+
+    print(f"共 {len(file_paths)} 个文件，开始导入...")
+    stats = KnowledgeBase.get_instance().add_custom_documents(file_paths, tags, args.workers, print_progress)
+    print()
+    print(f"✅ 导入完成: 成功 {len(stats['documents'])} 个，失败 {len(stats['failed'])} 个，"
+          f"共 {stats['chunks']} 个块，耗时 {stats['elapsed']:.1f} 秒")
+    for file_path in stats["failed"]:
+        print(f"❌ {file_path}")
+    return 0 if not stats["failed"] else 2
+
+
+if __name__ == "__main__":
+    load_dotenv("conf/.env")
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import os
+import tempfile
+from unittest import TestCase, main, mock
+
+from biz.cmd import ingest
+
+
+class FakeKnowledgeBase:
+    def __init__(self, failed: int = 0):
+        self.failed = failed
+        self.calls = []
+
+    def add_custom_documents(self, file_paths, tags=None, workers=None, on_progress=None):
+        self.calls.append((file_paths, tags, workers))
+        on_progress({"processed": len(file_paths), "total": len(file_paths), "chunks": 3, "elapsed": 0.5})
+        return {"documents": [{"file": path} for path in file_paths[self.failed:]], "failed": file_paths[:self.failed],
+                "chunks": 3, "elapsed": 0.5}
+
+
+class TestIngest(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        for name in ("a.md", "b.pdf", "skip.png"):
+            open(os.path.join(self.tmp_dir.name, name), "w").close()
+
+    def run_main(self, knowledge_base, argv):
+        with mock.patch.object(ingest.KnowledgeBase, "get_instance", return_value=knowledge_base), \
+                mock.patch("builtins.print"):
+            return ingest.main(argv)
+
+    def test_directory_tags_and_workers(self):
+        knowledge_base = FakeKnowledgeBase()
+        code = self.run_main(knowledge_base, [self.tmp_dir.name, "--tags", "java, 安全,", "--workers", "2"])
+        self.assertEqual(code, 0)
+        file_paths, tags, workers = knowledge_base.calls[0]
+        self.assertEqual(sorted(os.path.basename(path) for path in file_paths), ["a.md", "b.pdf"])
+        self.assertEqual((tags, workers), (["java", "安全"], 2))
+
+    def test_exit_codes(self):
+        self.assertEqual(self.run_main(FakeKnowledgeBase(failed=1), [self.tmp_dir.name]), 2)
+        self.assertEqual(self.run_main(FakeKnowledgeBase(), [os.path.join(self.tmp_dir.name, "missing")]), 1)
+
+
+if __name__ == '__main__':
+    main()
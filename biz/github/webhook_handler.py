@@ -2,10 +2,11 @@ import os
 import re
 import time
 
-import requests
 import fnmatch
+from biz.utils.http_client import backoff_delay, get_session
 from biz.utils.log import logger
 
+GITHUB_API_URL = 'https://api.github.com'
 
 
 def filter_changes(changes: list):
@@ -61,6 +62,7 @@ class PullRequestHandler:
         self.webhook_data = webhook_data
         self.github_token = github_token
         self.github_url = github_url
+        self.session = get_session(GITHUB_API_URL, github_token)
         self.event_type = None
         self.repo_full_name = None
         self.action = None
@@ -83,9 +85,8 @@ class PullRequestHandler:
             logger.warn(f"Invalid event type: {self.event_type}. Only 'pull_request' event is supported now.")
             return []
 
-        # GitHub pull request changes API可能存在延迟，多次尝试
-        max_retries = 3  # 最大重试次数
-        retry_delay = 10  # 重试间隔时间（秒）
+        # GitHub pull request changes API可能存在延迟，多次尝试，重试间隔按指数退避递增
+        max_retries = 5  # 最大重试次数
         for attempt in range(max_retries):
             # 调用 GitHub API 获取 Pull Request 的 files（变更）
             url = f"https://api.github.com/repos/{self.repo_full_name}/pulls/{self.pull_request_number}/files"
@@ -93,7 +94,7 @@ class PullRequestHandler:
                 'Authorization': f'token {self.github_token}',
                 'Accept': 'application/vnd.github.v3+json'
             }
-            response = requests.get(url, headers=headers)
+            response = self.session.get(url, headers=headers)
             logger.debug(
                 f"Get changes response from GitHub (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
 
@@ -113,9 +114,10 @@ class PullRequestHandler:
                         }
                         changes.append(change)
                     return changes
-                else:
+                elif attempt < max_retries - 1:
+                    retry_delay = backoff_delay(attempt, base=2, cap=16)
                     logger.info(
-                        f"Changes is empty, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
+                        f"Changes is empty, retrying in {retry_delay:.1f} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
                     time.sleep(retry_delay)
             else:
                 logger.warn(f"Failed to get changes from GitHub (URL: {url}): {response.status_code}, {response.text}")
@@ -135,7 +137,7 @@ class PullRequestHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, headers=headers)
         logger.debug(f"Get commits response from GitHub: {response.status_code}, {response.text}")
         
         # 检查请求是否成功
@@ -160,6 +162,7 @@ class PullRequestHandler:
             return []
 
     def add_pull_request_notes(self, review_result):
+        """添加 PR 评论，成功时返回评论 id"""
         url = f"https://api.github.com/repos/{self.repo_full_name}/issues/{self.pull_request_number}/comments"
         headers = {
             'Authorization': f'token {self.github_token}',
@@ -168,13 +171,33 @@ class PullRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = self.session.post(url, headers=headers, json=data)
         logger.debug(f"Add comment to GitHub PR {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to pull request.")
+            return response.json().get('id')
         else:
             logger.error(f"Failed to add comment: {response.status_code}")
             logger.error(response.text)
+            return None
+
+    def update_pull_request_note(self, comment_id, review_result) -> bool:
+        """修改已发布的 PR 评论，用于把临时评论更新为最终审查结果"""
+        url = f"https://api.github.com/repos/{self.repo_full_name}/issues/comments/{comment_id}"
+        headers = {
+            'Authorization': f'token {self.github_token}',
+            'Accept': 'application/vnd.github.v3+json'
+        }
+        data = {
+            'body': review_result
+        }
+        response = self.session.patch(url, headers=headers, json=data)
+        logger.debug(f"Update comment on GitHub PR {url}: {response.status_code}, {response.text}")
+        if response.status_code == 200:
+            return True
+        logger.error(f"Failed to update comment: {response.status_code}")
+        logger.error(response.text)
+        return False
 
     def target_branch_protected(self) -> bool:
         url = f"https://api.github.com/repos/{self.repo_full_name}/branches?protected=true"
@@ -183,7 +206,7 @@ class PullRequestHandler:
             'Accept': 'application/vnd.github.v3+json'
         }
 
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, headers=headers)
         if response.status_code == 200:
             data = response.json()
             target_branch = self.webhook_data['pull_request']['base']['ref']
@@ -198,6 +221,7 @@ class PushHandler:
         self.webhook_data = webhook_data
         self.github_token = github_token
         self.github_url = github_url
+        self.session = get_session(GITHUB_API_URL, github_token)
         self.event_type = None
         self.repo_full_name = None
         self.branch_name = None
@@ -255,7 +279,7 @@ class PushHandler:
         data = {
             'body': message
         }
-        response = requests.post(url, headers=headers, json=data)
+        response = self.session.post(url, headers=headers, json=data)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -270,7 +294,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, headers=headers)
         logger.debug(
             f"Get commits response from GitHub for repository_commits: {response.status_code}, {response.text}, URL: {url}")
 
@@ -287,7 +311,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, headers=headers)
         logger.debug(
             f"Get commit response from GitHub: {response.status_code}, {response.text}, URL: {url}")
 
@@ -302,7 +326,7 @@ class PushHandler:
             'Authorization': f'token {self.github_token}',
             'Accept': 'application/vnd.github.v3+json'
         }
-        response = requests.get(url, headers=headers)
+        response = self.session.get(url, headers=headers)
         logger.debug(
             f"Get changes response from GitHub for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
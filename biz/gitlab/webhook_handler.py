@@ -3,8 +3,8 @@ import re
 import time
 from urllib.parse import urljoin
 import fnmatch
-import requests
 
+from biz.utils.http_client import backoff_delay, get_session
 from biz.utils.log import logger
 
 
@@ -55,6 +55,7 @@ class MergeRequestHandler:
         self.webhook_data = webhook_data
         self.gitlab_token = gitlab_token
         self.gitlab_url = gitlab_url
+        self.session = get_session(gitlab_url, gitlab_token, verify=False)
         self.event_type = None
         self.project_id = None
         self.action = None
@@ -79,9 +80,8 @@ class MergeRequestHandler:
             logger.warn(f"Invalid event type: {self.event_type}. Only 'merge_request' event is supported now.")
             return []
 
-        # Gitlab merge request changes API可能存在延迟，多次尝试
-        max_retries = 3  # 最大重试次数
-        retry_delay = 10  # 重试间隔时间（秒）
+        # Gitlab merge request changes API可能存在延迟，多次尝试，重试间隔按指数退避递增
+        max_retries = 5  # 最大重试次数
         for attempt in range(max_retries):
             # 调用 GitLab API 获取 Merge Request 的 changes
             url = urljoin(f"{self.gitlab_url}/",
@@ -89,7 +89,7 @@ class MergeRequestHandler:
             headers = {
                 'Private-Token': self.gitlab_token
             }
-            response = requests.get(url, headers=headers, verify=False)
+            response = self.session.get(url, headers=headers)
             logger.debug(
                 f"Get changes response from GitLab (attempt {attempt + 1}): {response.status_code}, {response.text}, URL: {url}")
 
@@ -98,9 +98,10 @@ class MergeRequestHandler:
                 changes = response.json().get('changes', [])
                 if changes:
                     return changes
-                else:
+                elif attempt < max_retries - 1:
+                    retry_delay = backoff_delay(attempt, base=2, cap=16)
                     logger.info(
-                        f"Changes is empty, retrying in {retry_delay} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
+                        f"Changes is empty, retrying in {retry_delay:.1f} seconds... (attempt {attempt + 1}/{max_retries}), URL: {url}")
                     time.sleep(retry_delay)
             else:
                 logger.warn(f"Failed to get changes from GitLab (URL: {url}): {response.status_code}, {response.text}")
@@ -120,7 +121,7 @@ class MergeRequestHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = self.session.get(url, headers=headers)
         logger.debug(f"Get commits response from gitlab: {response.status_code}, {response.text}")
         # 检查请求是否成功
         if response.status_code == 200:
@@ -130,6 +131,7 @@ class MergeRequestHandler:
             return []
 
     def add_merge_request_notes(self, review_result):
+        """添加 MR 评论，成功时返回评论 id"""
         url = urljoin(f"{self.gitlab_url}/",
                       f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/notes")
         headers = {
@@ -139,13 +141,34 @@ class MergeRequestHandler:
         data = {
             'body': review_result
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = self.session.post(url, headers=headers, json=data)
         logger.debug(f"Add notes to gitlab {url}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Note successfully added to merge request.")
+            return response.json().get('id')
         else:
             logger.error(f"Failed to add note: {response.status_code}")
             logger.error(response.text)
+            return None
+
+    def update_merge_request_note(self, note_id, review_result) -> bool:
+        """修改已发布的 MR 评论，用于把临时评论更新为最终审查结果"""
+        url = urljoin(f"{self.gitlab_url}/",
+                      f"api/v4/projects/{self.project_id}/merge_requests/{self.merge_request_iid}/notes/{note_id}")
+        headers = {
+            'Private-Token': self.gitlab_token,
+            'Content-Type': 'application/json'
+        }
+        data = {
+            'body': review_result
+        }
+        response = self.session.put(url, headers=headers, json=data)
+        logger.debug(f"Update note on gitlab {url}: {response.status_code}, {response.text}")
+        if response.status_code == 200:
+            return True
+        logger.error(f"Failed to update note: {response.status_code}")
+        logger.error(response.text)
+        return False
 
     def target_branch_protected(self) -> bool:
         url = urljoin(f"{self.gitlab_url}/",
@@ -154,7 +177,7 @@ class MergeRequestHandler:
             'Private-Token': self.gitlab_token,
             'Content-Type': 'application/json'
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = self.session.get(url, headers=headers)
         logger.debug(f"Get protected branches response from gitlab: {response.status_code}, {response.text}")
         # 检查请求是否成功
         if response.status_code == 200:
@@ -171,6 +194,7 @@ class PushHandler:
         self.webhook_data = webhook_data
         self.gitlab_token = gitlab_token
         self.gitlab_url = gitlab_url
+        self.session = get_session(gitlab_url, gitlab_token, verify=False)
         self.event_type = None
         self.project_id = None
         self.branch_name = None
@@ -230,7 +254,7 @@ class PushHandler:
         data = {
             'note': message
         }
-        response = requests.post(url, headers=headers, json=data, verify=False)
+        response = self.session.post(url, headers=headers, json=data)
         logger.debug(f"Add comment to commit {last_commit_id}: {response.status_code}, {response.text}")
         if response.status_code == 201:
             logger.info("Comment successfully added to push commit.")
@@ -245,7 +269,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = self.session.get(url, headers=headers)
         logger.debug(
             f"Get commits response from GitLab for repository_commits: {response.status_code}, {response.text}, URL: {url}")
 
@@ -268,7 +292,7 @@ class PushHandler:
         headers = {
             'Private-Token': self.gitlab_token
         }
-        response = requests.get(url, headers=headers, verify=False)
+        response = self.session.get(url, headers=headers)
         logger.debug(
             f"Get changes response from GitLab for repository_compare: {response.status_code}, {response.text}, URL: {url}")
 
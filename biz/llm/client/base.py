@@ -1,11 +1,101 @@
+import asyncio
 from abc import abstractmethod
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional
 import os
 
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.log import logger
 
 
+THINK_OPEN_TAG = "<think>"
+THINK_CLOSE_TAG = "</think>"
+# 流式输出在思考链中结束（被截断）时返回的内容，与 OllamaClient._extract_content 保持一致
+COT_ABORT = "COT ABORT!"
+
+
+class ThinkTagFilter:
+    """
+    增量过滤 <think>...</think> 思考链：思考内容到达时直接丢弃，只在缓冲区保留可能被切开的标签前缀，
+    避免把很长的思考链整段缓存在内存中
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_think = False
+        self.emitted = False
+
+    @staticmethod
+    def _partial_tag_length(text: str, tags: tuple) -> int:
+        """text 末尾可能是某个标签开头部分的最大长度"""
+        for length in range(min(len(text), max(len(tag) for tag in tags) - 1), 0, -1):
+            if any(tag.startswith(text[-length:]) for tag in tags):
+                return length
+        return 0
+
+    def feed(self, chunk: str) -> str:
+        """输入一段流式内容，返回可以输出的部分"""
+        self.buffer += chunk
+        output = []
+        while True:
+            if self.in_think:
+                index = self.buffer.find(THINK_CLOSE_TAG)
+                if index < 0:
+                    keep = self._partial_tag_length(self.buffer, (THINK_CLOSE_TAG,))
+                    self.buffer = self.buffer[len(self.buffer) - keep:]
+                    break
+                self.buffer = self.buffer[index + len(THINK_CLOSE_TAG):]
+                self.in_think = False
+                continue
+
+            # 思考链之外：遇到 <think> 进入思考链；孤立的 </think> 直接去掉
+            open_index = self.buffer.find(THINK_OPEN_TAG)
+            close_index = self.buffer.find(THINK_CLOSE_TAG)
+            if open_index >= 0 and (close_index < 0 or open_index < close_index):
+                output.append(self.buffer[:open_index])
+                self.buffer = self.buffer[open_index + len(THINK_OPEN_TAG):]
+                self.in_think = True
+                continue
+            if close_index >= 0:
+                output.append(self.buffer[:close_index])
+                self.buffer = self.buffer[close_index + len(THINK_CLOSE_TAG):]
+                continue
+            keep = self._partial_tag_length(self.buffer, (THINK_OPEN_TAG, THINK_CLOSE_TAG))
+            output.append(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+
+        text = "".join(output)
+        self.emitted = self.emitted or bool(text.strip())
+        return text
+
+    def flush(self) -> str:
+        """流结束时调用，返回剩余内容；在思考链中结束且没有输出过正文时返回 COT_ABORT"""
+        if self.in_think:
+            self.buffer = ""
+            return "" if self.emitted else COT_ABORT
+        text, self.buffer = self.buffer, ""
+        return text
+
+
+def iter_openai_stream(stream: Iterable) -> Iterator[str]:
+    """
+    从 OpenAI 兼容接口的流式响应中提取正文增量：
+    reasoning_content（如 deepseek-reasoner）直接丢弃，正文中的 <think> 思考链增量过滤
+    """
+    think_filter = ThinkTagFilter()
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        content = getattr(chunk.choices[0].delta, "content", None)
+        if content:
+            text = think_filter.feed(content)
+            if text:
+                yield text
+    text = think_filter.flush()
+    if text:
+        yield text
+
+
 class BaseClient:
     """ Base class for chat models client. """
 
@@ -22,6 +112,12 @@ class BaseClient:
             logger.error("尝试连接LLM失败， {e}")
             return False
 
+    def _resolve_temperature(self, temperature: Optional[float] | NotGiven) -> float:
+        """未传入或为None时使用默认温度，并限制在有效范围内"""
+        if temperature is NOT_GIVEN or temperature is None:
+            temperature = self.default_temperature
+        return max(0.0, min(2.0, temperature))
+
     @abstractmethod
     def completions(self,
                     messages: List[Dict[str, str]],
@@ -35,3 +131,27 @@ class BaseClient:
             model: Model name to use
             temperature: Controls randomness in the response (0.0 to 2.0)
         """
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        """Chat with the model asynchronously.
+
+        默认实现在线程池中执行同步的 completions，供没有异步 SDK 的供应商使用；
+        有异步 SDK 的供应商应覆盖此方法，使单个进程可以同时发起大量请求。
+        """
+        return await asyncio.to_thread(self.completions, messages, model, temperature)
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        """Chat with the model and yield the response incrementally.
+
+        返回正文的增量片段，思考链/推理内容在到达时即被丢弃；
+        默认实现一次性返回 completions 的结果，支持流式输出的供应商应覆盖此方法。
+        """
+        yield self.completions(messages=messages, model=model, temperature=temperature)
@@ -1,9 +1,9 @@
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
-from biz.llm.client.base import BaseClient
+from biz.llm.client.base import BaseClient, iter_openai_stream
 from biz.llm.types import NotGiven, NOT_GIVEN
 from biz.utils.log import logger
 
@@ -17,6 +17,7 @@ class DeepSeekClient(BaseClient):
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
         self.client = OpenAI(api_key=self.api_key, base_url=self.base_url) # DeepSeek supports OpenAI API SDK
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
         self.default_model = os.getenv("DEEPSEEK_API_MODEL", "deepseek-chat")
 
     def completions(self,
@@ -26,14 +27,7 @@ class DeepSeekClient(BaseClient):
                     ) -> str:
         try:
             model = model or self.default_model
-            temperature = temperature if temperature is not NOT_GIVEN else self.default_temperature
-            
-            # 处理None值，使用默认温度
-            if temperature is None:
-                temperature = self.default_temperature
-            
-            # 确保温度值在有效范围内
-            temperature = max(0.0, min(2.0, temperature))
+            temperature = self._resolve_temperature(temperature)
             
             logger.debug(f"Sending request to DeepSeek API. Model: {model}, Temperature: {temperature}, Messages: {messages}")
             
@@ -43,18 +37,70 @@ class DeepSeekClient(BaseClient):
                 temperature=temperature
             )
             
-            if not completion or not completion.choices:
-                logger.error("Empty response from DeepSeek API")
-                return "AI服务返回为空，请稍后重试"
-                
-            return completion.choices[0].message.content
+            return self._extract_content(completion)
             
         except Exception as e:
-            logger.error(f"DeepSeek API error: {str(e)}")
-            # 检查是否是认证错误
-            if "401" in str(e):
-                return "DeepSeek API认证失败，请检查API密钥是否正确"
-            elif "404" in str(e):
-                return "DeepSeek API接口未找到，请检查API地址是否正确"
-            else:
-                return f"调用DeepSeek API时出错: {str(e)}"
+            return self._handle_error(e)
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        try:
+            model = model or self.default_model
+            temperature = self._resolve_temperature(temperature)
+
+            logger.debug(f"Sending async request to DeepSeek API. Model: {model}, Temperature: {temperature}, Messages: {messages}")
+
+            completion = await self.async_client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature
+            )
+            return self._extract_content(completion)
+
+        except Exception as e:
+            return self._handle_error(e)
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        try:
+            model = model or self.default_model
+            temperature = self._resolve_temperature(temperature)
+
+            logger.debug(f"Sending stream request to DeepSeek API. Model: {model}, Temperature: {temperature}, Messages: {messages}")
+
+            stream = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+            )
+            # deepseek-reasoner 的推理过程在 reasoning_content 中返回，由 iter_openai_stream 丢弃
+            yield from iter_openai_stream(stream)
+
+        except Exception as e:
+            yield self._handle_error(e)
+
+    @staticmethod
+    def _extract_content(completion) -> str:
+        if not completion or not completion.choices:
+            logger.error("Empty response from DeepSeek API")
+            return "AI服务返回为空，请稍后重试"
+
+        return completion.choices[0].message.content
+
+    @staticmethod
+    def _handle_error(e: Exception) -> str:
+        logger.error(f"DeepSeek API error: {str(e)}")
+        # 检查是否是认证错误
+        if "401" in str(e):
+            return "DeepSeek API认证失败，请检查API密钥是否正确"
+        elif "404" in str(e):
+            return "DeepSeek API接口未找到，请检查API地址是否正确"
+        else:
+            return f"调用DeepSeek API时出错: {str(e)}"
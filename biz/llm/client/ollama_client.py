@@ -1,11 +1,12 @@
 import os
 import re
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
+from ollama import AsyncClient
 from ollama import ChatResponse
 from ollama import Client
 
-from biz.llm.client.base import BaseClient
+from biz.llm.client.base import BaseClient, ThinkTagFilter
 from biz.llm.types import NotGiven, NOT_GIVEN
 
 
@@ -17,6 +18,9 @@ class OllamaClient(BaseClient):
         self.client = Client(
             host=self.base_url,
         )
+        self.async_client = AsyncClient(
+            host=self.base_url,
+        )
 
     def _extract_content(self, content: str) -> str:
         """
@@ -43,14 +47,7 @@ class OllamaClient(BaseClient):
                     temperature: Optional[float] | NotGiven = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
-        temperature = temperature if temperature is not NOT_GIVEN else self.default_temperature
-        
-        # 处理None值，使用默认温度
-        if temperature is None:
-            temperature = self.default_temperature
-        
-        # 确保温度值在有效范围内
-        temperature = max(0.0, min(2.0, temperature))
+        temperature = self._resolve_temperature(temperature)
         
         response: ChatResponse = self.client.chat(
             model=model, 
@@ -59,3 +56,42 @@ class OllamaClient(BaseClient):
         )
         content = response['message']['content']
         return self._extract_content(content)
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        model = model or self.default_model
+        temperature = self._resolve_temperature(temperature)
+
+        response: ChatResponse = await self.async_client.chat(
+            model=model,
+            messages=messages,
+            options={"temperature": temperature}
+        )
+        content = response['message']['content']
+        return self._extract_content(content)
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        model = model or self.default_model
+        temperature = self._resolve_temperature(temperature)
+
+        # 思考链在流式输出过程中即被丢弃，不再等完整响应后统一去除
+        think_filter = ThinkTagFilter()
+        for chunk in self.client.chat(
+            model=model,
+            messages=messages,
+            options={"temperature": temperature},
+            stream=True,
+        ):
+            text = think_filter.feed(chunk['message']['content'])
+            if text:
+                yield text
+        text = think_filter.flush()
+        if text:
+            yield text
@@ -1,9 +1,9 @@
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 
-from biz.llm.client.base import BaseClient
+from biz.llm.client.base import BaseClient, iter_openai_stream
 from biz.llm.types import NotGiven, NOT_GIVEN
 
 
@@ -16,6 +16,7 @@ class OpenAIClient(BaseClient):
             raise ValueError("API key is required. Please provide it or set it in the environment variables.")
 
         self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
         self.default_model = os.getenv("OPENAI_API_MODEL", "gpt-4o-mini")
 
     def completions(self,
@@ -24,14 +25,7 @@ class OpenAIClient(BaseClient):
                     temperature: Optional[float] | NotGiven = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
-        temperature = temperature if temperature is not NOT_GIVEN else self.default_temperature
-        
-        # 处理None值，使用默认温度
-        if temperature is None:
-            temperature = self.default_temperature
-        
-        # 确保温度值在有效范围内
-        temperature = max(0.0, min(2.0, temperature))
+        temperature = self._resolve_temperature(temperature)
         
         completion = self.client.chat.completions.create(
             model=model,
@@ -39,3 +33,34 @@ class OpenAIClient(BaseClient):
             temperature=temperature,
         )
         return completion.choices[0].message.content
+
+    async def acompletions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> str:
+        model = model or self.default_model
+        temperature = self._resolve_temperature(temperature)
+
+        completion = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+        )
+        return completion.choices[0].message.content
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        model = model or self.default_model
+        temperature = self._resolve_temperature(temperature)
+
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+        )
+        yield from iter_openai_stream(stream)
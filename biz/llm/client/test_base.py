@@ -0,0 +1,123 @@
+import asyncio
+import sys
+import threading
+from types import SimpleNamespace
+from unittest import TestCase, main, mock
+
+from biz.llm.client.base import COT_ABORT, BaseClient, ThinkTagFilter, iter_openai_stream
+
+
+def feed_all(chunks) -> str:
+    think_filter = ThinkTagFilter()
+    return "".join(think_filter.feed(chunk) for chunk in chunks) + think_filter.flush()
+
+
+def openai_chunk(content=None, reasoning_content=None):
+    delta = SimpleNamespace(content=content, reasoning_content=reasoning_content)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+class TestThinkTagFilter(TestCase):
+    def test_tags_split_across_chunks(self):
+        self.assertEqual(feed_all(["<th", "ink>思考", "中</th", "ink>正文", "结束"]), "正文结束")
+        self.assertEqual(feed_all(["前<", "think>x</think", ">后"]), "前后")
+        # 看起来像标签开头但不是标签的内容原样输出
+        self.assertEqual(feed_all(["a <", "b> c <th"]), "a <b> c <th")
+
+    def test_think_content_is_not_buffered(self):
+        think_filter = ThinkTagFilter()
+        think_filter.feed("<think>" + "x" * 10000)
+        self.assertEqual(think_filter.buffer, "")
+        think_filter.feed("...</thi")
+        self.assertEqual(think_filter.buffer, "</thi")
+
+    def test_unterminated_think_aborts_without_output(self):
+        self.assertEqual(feed_all(["<think>推理没有结束"]), COT_ABORT)
+        # 已经输出过正文时不再返回 COT_ABORT
+        self.assertEqual(feed_all(["结论", "<think>推理没有结束"]), "结论")
+
+    def test_stray_close_tag_is_removed(self):
+        self.assertEqual(feed_all(["推理</think>", "正文"]), "推理正文")
+
+
+class TestIterOpenaiStream(TestCase):
+    def test_reasoning_content_and_empty_choices_are_skipped(self):
+        stream = [
+            SimpleNamespace(choices=[]),
+            openai_chunk(reasoning_content="推理过程"),
+            openai_chunk(content="<think>x</think>"),
+            openai_chunk(content="总分"),
+            openai_chunk(content=":90分"),
+        ]
+        self.assertEqual(list(iter_openai_stream(stream)), ["总分", ":90分"])
+
+    def test_unterminated_think_yields_abort(self):
+        self.assertEqual(list(iter_openai_stream([openai_chunk(content="<think>被截断")])), [COT_ABORT])
+
+
+class SyncClient(BaseClient):
+    """只实现同步接口的客户端，记录调用参数和所在线程"""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def completions(self, messages, model=None, temperature=None):
+        self.calls.append((messages, model, temperature, threading.current_thread()))
+        return "总分:80分"
+
+
+class FakeAsyncCompletions:
+    def __init__(self):
+        self.kwargs = None
+
+    async def create(self, **kwargs):
+        self.kwargs = kwargs
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="异步结果"))])
+
+
+class TestAcompletions(TestCase):
+    def test_default_runs_completions_in_thread(self):
+        client = SyncClient()
+        messages = [{"role": "user", "content": "review"}]
+        self.assertEqual(asyncio.run(client.acompletions(messages, temperature=0.5)), "总分:80分")
+        (call_messages, _, temperature, thread), = client.calls
+        self.assertEqual((call_messages, temperature), (messages, 0.5))
+        self.assertIsNot(thread, threading.current_thread())
+
+    def test_zhipuai_uses_thread_fallback(self):
+        threads = []
+
+        def create(**kwargs):
+            threads.append(threading.current_thread())
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="同步结果"))])
+
+        # ZhipuAI SDK 只有同步接口，替换为假的 SDK 模块
+        sdk = SimpleNamespace(ZhipuAI=lambda api_key: SimpleNamespace(
+            chat=SimpleNamespace(completions=SimpleNamespace(create=create))))
+        with mock.patch.dict(sys.modules, {"zhipuai": sdk}):
+            sys.modules.pop("biz.llm.client.zhipuai", None)
+            from biz.llm.client.zhipuai import ZhipuAIClient
+            client = ZhipuAIClient(api_key="test")
+            self.assertIs(ZhipuAIClient.acompletions, BaseClient.acompletions)
+            self.assertEqual(asyncio.run(client.acompletions([{"role": "user", "content": "review"}])), "同步结果")
+        self.assertIsNot(threads[0], threading.current_thread())
+
+    def test_openai_uses_async_client(self):
+        try:
+            from biz.llm.client.openai import OpenAIClient
+        except ImportError as e:
+            self.skipTest(f"依赖未安装: {e.name}")
+        # 不创建真实的 SDK 客户端
+        client = OpenAIClient.__new__(OpenAIClient)
+        client.default_model = "gpt-4o-mini"
+        client.default_temperature = 0.3
+        create = FakeAsyncCompletions()
+        client.async_client = SimpleNamespace(chat=SimpleNamespace(completions=create))
+        messages = [{"role": "user", "content": "review"}]
+        self.assertEqual(asyncio.run(client.acompletions(messages, temperature=5)), "异步结果")
+        self.assertEqual(create.kwargs, {"model": "gpt-4o-mini", "messages": messages, "temperature": 2.0})
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,15 @@
 import os
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 from zhipuai import ZhipuAI
 
-from biz.llm.client.base import BaseClient
+from biz.llm.client.base import BaseClient, iter_openai_stream
 from biz.llm.types import NotGiven, NOT_GIVEN
 
 
 class ZhipuAIClient(BaseClient):
+    """ZhipuAI SDK 没有异步的对话接口，acompletions 使用 BaseClient 的线程池实现"""
+
     def __init__(self, api_key: str = None):
         super().__init__()  # 调用父类初始化
         self.api_key = api_key or os.getenv("ZHIPUAI_API_KEY")
@@ -23,14 +25,7 @@ class ZhipuAIClient(BaseClient):
                     temperature: Optional[float] | NotGiven = NOT_GIVEN,
                     ) -> str:
         model = model or self.default_model
-        temperature = temperature if temperature is not NOT_GIVEN else self.default_temperature
-        
-        # 处理None值，使用默认温度
-        if temperature is None:
-            temperature = self.default_temperature
-        
-        # 确保温度值在有效范围内
-        temperature = max(0.0, min(2.0, temperature))
+        temperature = self._resolve_temperature(temperature)
         
         completion = self.client.chat.completions.create(
             model=model,
@@ -38,3 +33,19 @@ class ZhipuAIClient(BaseClient):
             temperature=temperature,
         )
         return completion.choices[0].message.content
+
+    def stream_completions(self,
+                           messages: List[Dict[str, str]],
+                           model: Optional[str] | NotGiven = NOT_GIVEN,
+                           temperature: Optional[float] | NotGiven = NOT_GIVEN,
+                           ) -> Iterator[str]:
+        model = model or self.default_model
+        temperature = self._resolve_temperature(temperature)
+
+        stream = self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            stream=True,
+        )
+        yield from iter_openai_stream(stream)
@@ -1,28 +1,26 @@
+import importlib
 import os
 
 from biz.llm.client.base import BaseClient
-from biz.llm.client.deepseek import DeepSeekClient
-from biz.llm.client.ollama_client import OllamaClient
-from biz.llm.client.openai import OpenAIClient
-from biz.llm.client.qwen import QwenClient
-from biz.llm.client.zhipuai import ZhipuAIClient
 from biz.utils.log import logger
 
+# 模型供应商 -> (客户端模块, 类名)。各供应商的 SDK 导入较慢，创建客户端时才导入所用供应商的模块
+CHAT_MODEL_PROVIDERS = {
+    'zhipuai': ('biz.llm.client.zhipuai', 'ZhipuAIClient'),
+    'openai': ('biz.llm.client.openai', 'OpenAIClient'),
+    'deepseek': ('biz.llm.client.deepseek', 'DeepSeekClient'),
+    'qwen': ('biz.llm.client.qwen', 'QwenClient'),
+    'ollama': ('biz.llm.client.ollama_client', 'OllamaClient'),
+}
+
 
 class Factory:
     @staticmethod
     def getClient(provider: str = None) -> BaseClient:
         provider = provider or os.getenv("LLM_PROVIDER", "openai")
-        chat_model_providers = {
-            'zhipuai': lambda: ZhipuAIClient(),
-            'openai': lambda: OpenAIClient(),
-            'deepseek': lambda: DeepSeekClient(),
-            'qwen': lambda: QwenClient(),
-            'ollama': lambda : OllamaClient()
-        }
-
-        provider_func = chat_model_providers.get(provider)
-        if provider_func:
-            return provider_func()
+        client_class = CHAT_MODEL_PROVIDERS.get(provider)
+        if client_class:
+            module_name, class_name = client_class
+            return getattr(importlib.import_module(module_name), class_name)()
         else:
             raise Exception(f'Unknown chat model provider: {provider}')
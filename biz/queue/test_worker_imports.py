@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase, main
+
+# 只有启用 RAG 时才需要的重量级模块
+HEAVY_MODULES = ["chromadb", "sentence_transformers", "torch", "onnxruntime", "PyPDF2", "docx", "bs4", "markdown"]
+# 未启用 RAG 时导入任务处理模块的时间上限（秒）
+IMPORT_TIME_BUDGET = 1.0
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+try:
+    __import__(sys.argv[1])
+except ImportError as e:
+    print(json.dumps({"missing": e.name}))
+    sys.exit(0)
+print(json.dumps({"elapsed": time.perf_counter() - start,
+                  "heavy": [name for name in sys.argv[2:] if name in sys.modules]}))
+"""
+
+
+def probe_import(module: str) -> dict:
+    """在新的解释器中导入模块，返回耗时和已导入的重量级模块"""
+    env = dict(os.environ, ENABLE_RAG="0")
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    output = subprocess.run([sys.executable, "-c", PROBE, module] + HEAVY_MODULES, cwd=project_root, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+class TestWorkerImports(TestCase):
+    def test_worker_import_skips_rag_dependencies(self):
+        result = probe_import("biz.queue.worker")
+        if "missing" in result:
+            self.skipTest(f"依赖未安装: {result['missing']}")
+        self.assertEqual(result["heavy"], [])
+        self.assertLess(result["elapsed"], IMPORT_TIME_BUDGET)
+
+    def test_document_processing_is_lightweight(self):
+        # 批量导入的文本提取子进程只需要 DocumentProcessor
+        result = probe_import("biz.utils.knowledge_base")
+        self.assertEqual(result.get("heavy"), [])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,5 @@
 import os
+import threading
 import traceback
 from datetime import datetime
 
@@ -7,10 +8,80 @@ from biz.event.event_manager import event_manager
 from biz.gitlab.webhook_handler import filter_changes, MergeRequestHandler, PushHandler
 from biz.github.webhook_handler import filter_changes as filter_github_changes, PullRequestHandler as GithubPullRequestHandler, PushHandler as GithubPushHandler
 from biz.utils.code_reviewer import CodeReviewer
-from biz.utils.rag_code_reviewer import RAGCodeReviewer
 from biz.utils.im import notifier
 from biz.utils.log import logger
 
+# 进程内复用的审查器（包含 LLM 客户端和知识库），避免每个任务重复初始化
+_reviewers = {}
+_reviewers_lock = threading.Lock()
+
+
+def get_reviewer(enable_rag: bool):
+    """
+    获取当前进程内长期复用的审查器
+    :param enable_rag: 是否使用RAG增强的代码审查器
+    :return: RAGCodeReviewer 或 CodeReviewer
+    """
+    if enable_rag:
+        # 知识库依赖 chromadb、sentence_transformers（torch）等重量级模块，启用 RAG 时才导入
+        from biz.utils.rag_code_reviewer import RAGCodeReviewer
+        reviewer_cls = RAGCodeReviewer
+    else:
+        reviewer_cls = CodeReviewer
+    with _reviewers_lock:
+        reviewer = _reviewers.get(reviewer_cls)
+        if reviewer is None:
+            reviewer = reviewer_cls()
+            _reviewers[reviewer_cls] = reviewer
+        return reviewer
+
+
+class ProvisionalNote:
+    """
+    流式审查时的临时评论：收到第一段审查内容时发布，之后原地修改，审查结束后更新为最终结果；
+    未开启流式审查（没有进度回调）时 finish 直接发布最终结果
+    """
+
+    def __init__(self, add_note, update_note):
+        self.add_note = add_note
+        self.update_note = update_note
+        self.note_id = None
+        self.posted = False
+        self.finished = False
+        self._lock = threading.Lock()
+
+    def update(self, review_text: str):
+        body = f'Auto Review Result（审查中，内容将持续更新…）: \n{review_text}'
+        with self._lock:
+            if not self.posted:
+                self.posted = True
+                self.note_id = self.add_note(body)
+            elif self.note_id is not None:
+                self.update_note(self.note_id, body)
+
+    def finish(self, body: str):
+        with self._lock:
+            self.finished = True
+            if self.note_id is not None and self.update_note(self.note_id, body):
+                return
+            self.add_note(body)
+
+    def abort(self, message: str):
+        """审查出错时更新已发布的临时评论，避免一直显示为审查中"""
+        with self._lock:
+            if self.note_id is not None and not self.finished:
+                self.update_note(self.note_id, message)
+
+
+def review_streaming_enabled() -> bool:
+    return os.environ.get('REVIEW_STREAMING_ENABLED', '0') == '1'
+
+
+def warm_up():
+    """预热：由常驻工作进程启动时调用，提前创建审查器"""
+    enable_rag = os.environ.get('ENABLE_RAG', '1') == '1'
+    get_reviewer(enable_rag)
+    logger.info(f'工作进程 {os.getpid()} 预热完成')
 
 
 def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gitlab_url_slug: str):
@@ -43,13 +114,9 @@ def handle_push_event(webhook_data: dict, gitlab_token: str, gitlab_url: str, gi
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
                 # 使用RAG增强的代码审查器
                 enable_rag = os.environ.get('ENABLE_RAG', '1') == '1'
-                if enable_rag:
-                    reviewer = RAGCodeReviewer()
-                    review_result = reviewer.review_and_strip_code(str(changes), commits_text)
-                    score = reviewer.parse_review_score(review_text=review_result)
-                else:
-                    review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-                    score = CodeReviewer.parse_review_score(review_text=review_result)
+                reviewer = get_reviewer(enable_rag)
+                review_result = reviewer.review_changes(changes, commits_text)
+                score = reviewer.parse_review_score(review_text=review_result)
                 # 将review结果提交到Gitlab的 notes
                 handler.add_push_notes(f'Auto Review Result: \n{review_result}')
 
@@ -85,6 +152,7 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
     :param gitlab_url_slug:
     :return:
     '''
+    note = None
     try:
         # 解析Webhook数据
         handler = MergeRequestHandler(webhook_data, gitlab_token, gitlab_url)
@@ -113,16 +181,15 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
         commits_text = ';'.join(commit['message'] for commit in commits)
         # 使用RAG增强的代码审查器
         enable_rag = os.environ.get('ENABLE_RAG', '1') == '1'
-        if enable_rag:
-            reviewer = RAGCodeReviewer()
-            review_result = reviewer.review_and_strip_code(str(changes), commits_text)
-            score = reviewer.parse_review_score(review_text=review_result)
-        else:
-            review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-            score = CodeReviewer.parse_review_score(review_text=review_result)
+        reviewer = get_reviewer(enable_rag)
+        # 开启流式审查时先发布临时评论，审查结束后修改为最终结果
+        note = ProvisionalNote(handler.add_merge_request_notes, handler.update_merge_request_note)
+        review_result = reviewer.review_changes(changes, commits_text,
+                                                on_progress=note.update if review_streaming_enabled() else None)
+        score = reviewer.parse_review_score(review_text=review_result)
 
         # 将review结果提交到Gitlab的 notes
-        handler.add_merge_request_notes(f'Auto Review Result: \n{review_result}')
+        note.finish(f'Auto Review Result: \n{review_result}')
 
         # dispatch merge_request_reviewed event
         event_manager['merge_request_reviewed'].send(
@@ -144,6 +211,8 @@ def handle_merge_request_event(webhook_data: dict, gitlab_token: str, gitlab_url
         error_message = f'AI Code Review 服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        if note is not None:
+            note.abort(f'Auto Review Result: \n审查失败: {str(e)}')
 
 def handle_github_push_event(webhook_data: dict, github_token: str, github_url: str, github_url_slug: str):
     push_review_enabled = os.environ.get('PUSH_REVIEW_ENABLED', '0') == '1'
@@ -170,13 +239,9 @@ def handle_github_push_event(webhook_data: dict, github_token: str, github_url:
                 commits_text = ';'.join(commit.get('message', '').strip() for commit in commits)
                 # 使用RAG增强的代码审查器
                 enable_rag = os.environ.get('ENABLE_RAG', '1') == '1'
-                if enable_rag:
-                    reviewer = RAGCodeReviewer()
-                    review_result = reviewer.review_and_strip_code(str(changes), commits_text)
-                    score = reviewer.parse_review_score(review_text=review_result)
-                else:
-                    review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
-                    score = CodeReviewer.parse_review_score(review_text=review_result)
+                reviewer = get_reviewer(enable_rag)
+                review_result = reviewer.review_changes(changes, commits_text)
+                score = reviewer.parse_review_score(review_text=review_result)
             # 将review结果提交到GitHub的 notes
             handler.add_push_notes(f'Auto Review Result: \n{review_result}')
 
@@ -210,6 +275,7 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
     :param github_url_slug:
     :return:
     '''
+    note = None
     try:
         # 解析Webhook数据
         handler = GithubPullRequestHandler(webhook_data, github_token, github_url)
@@ -236,10 +302,13 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
 
         # review 代码
         commits_text = ';'.join(commit['title'] for commit in commits)
-        review_result = CodeReviewer().review_and_strip_code(str(changes), commits_text)
+        # 开启流式审查时先发布临时评论，审查结束后修改为最终结果
+        note = ProvisionalNote(handler.add_pull_request_notes, handler.update_pull_request_note)
+        review_result = get_reviewer(enable_rag=False).review_changes(
+            changes, commits_text, on_progress=note.update if review_streaming_enabled() else None)
 
         # 将review结果提交到GitHub的 notes
-        handler.add_pull_request_notes(f'Auto Review Result: \n{review_result}')
+        note.finish(f'Auto Review Result: \n{review_result}')
 
         # dispatch pull_request_reviewed event
         event_manager['merge_request_reviewed'].send(
@@ -260,3 +329,5 @@ def handle_github_pull_request_event(webhook_data: dict, github_token: str, gith
         error_message = f'服务出现未知错误: {str(e)}\n{traceback.format_exc()}'
         notifier.send_notification(content=error_message)
         logger.error('出现未知错误: %s', error_message)
+        if note is not None:
+            note.abort(f'Auto Review Result: \n审查失败: {str(e)}')
@@ -1,8 +1,159 @@
 import sqlite3
-
-import pandas as pd
+from datetime import datetime
+from typing import TYPE_CHECKING
 
 from biz.entity.review_entity import MergeRequestReviewEntity, PushReviewEntity
+from biz.service.storage import get_pool, migrate
+
+if TYPE_CHECKING:
+    # pandas 导入较慢，只有查询统计数据（Dashboard、报表）时才需要，在函数内导入
+    import pandas as pd
+
+
+def _create_review_log_tables(cursor: sqlite3.Cursor):
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS mr_review_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_name TEXT,
+                author TEXT,
+                source_branch TEXT,
+                target_branch TEXT,
+                updated_at INTEGER,
+                commit_messages TEXT,
+                score INTEGER,
+                url TEXT,
+                review_result TEXT,
+                additions INTEGER DEFAULT 0,
+                deletions INTEGER DEFAULT 0
+            )
+        ''')
+    cursor.execute('''
+            CREATE TABLE IF NOT EXISTS push_review_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_name TEXT,
+                author TEXT,
+                branch TEXT,
+                updated_at INTEGER,
+                commit_messages TEXT,
+                score INTEGER,
+                review_result TEXT,
+                additions INTEGER DEFAULT 0,
+                deletions INTEGER DEFAULT 0
+            )
+        ''')
+
+
+def _add_line_stat_columns(cursor: sqlite3.Cursor):
+    # 引入版本号之前创建的旧数据库可能缺少 additions、deletions 列
+    for table in ["mr_review_log", "push_review_log"]:
+        cursor.execute(f"PRAGMA table_info({table})")
+        current_columns = [col[1] for col in cursor.fetchall()]
+        for column in ["additions", "deletions"]:
+            if column not in current_columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER DEFAULT 0")
+
+
+def _create_review_log_indexes(cursor: sqlite3.Cursor):
+    # 与 get_*_review_logs 的过滤条件对应：时间范围，以及按作者/项目过滤后按时间排序
+    for table in ["mr_review_log", "push_review_log"]:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_updated_at ON {table} (updated_at)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_author_updated_at ON {table} (author, updated_at)")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_project_updated_at ON {table} (project_name, updated_at)")
+
+
+# 审查日志表与对应的按天汇总表
+DAILY_STATS_TABLES = {
+    "mr_review_log": "mr_review_daily_stats",
+    "push_review_log": "push_review_daily_stats",
+}
+
+# 审查时间（时间戳）按服务器本地时区换算为日期，与 Dashboard 按本地日期筛选一致
+DAY_EXPR = "date({}, 'unixepoch', 'localtime')"
+
+
+def _create_daily_stats_tables(cursor: sqlite3.Cursor):
+    # 按 天 × 项目 × 开发者 汇总的审查次数、得分总和和增删行数，Dashboard 图表只读汇总表
+    for log_table, stats_table in DAILY_STATS_TABLES.items():
+        cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS {stats_table} (
+                    day TEXT NOT NULL,
+                    project_name TEXT NOT NULL,
+                    author TEXT NOT NULL,
+                    review_count INTEGER DEFAULT 0,
+                    score_sum INTEGER DEFAULT 0,
+                    additions INTEGER DEFAULT 0,
+                    deletions INTEGER DEFAULT 0,
+                    PRIMARY KEY (day, project_name, author)
+                ) WITHOUT ROWID
+            ''')
+        # 用已有的审查日志回填
+        cursor.execute(f'''
+                INSERT OR REPLACE INTO {stats_table} (day, project_name, author, review_count, score_sum, additions, deletions)
+                SELECT {DAY_EXPR.format("updated_at")}, COALESCE(project_name, ''), COALESCE(author, ''),
+                       COUNT(*), SUM(COALESCE(score, 0)), SUM(COALESCE(additions, 0)), SUM(COALESCE(deletions, 0))
+                FROM {log_table}
+                WHERE updated_at IS NOT NULL
+                GROUP BY 1, 2, 3
+            ''')
+
+
+# 数据库迁移，按版本顺序追加，已发布的迁移不要修改
+MIGRATIONS = [
+    _create_review_log_tables,
+    _add_line_stat_columns,
+    _create_review_log_indexes,
+    _create_daily_stats_tables,
+]
+
+
+def _update_daily_stats(cursor: sqlite3.Cursor, log_table: str, entity):
+    """在插入审查日志的同一事务中累加汇总表"""
+    cursor.execute(f'''
+            INSERT INTO {DAILY_STATS_TABLES[log_table]} (day, project_name, author, review_count, score_sum, additions, deletions)
+            VALUES ({DAY_EXPR.format("?")}, ?, ?, 1, ?, ?, ?)
+            ON CONFLICT (day, project_name, author) DO UPDATE SET
+                review_count = review_count + 1,
+                score_sum = score_sum + excluded.score_sum,
+                additions = additions + excluded.additions,
+                deletions = deletions + excluded.deletions
+        ''', (entity.updated_at, entity.project_name or '', entity.author or '', entity.score or 0,
+              entity.additions or 0, entity.deletions or 0))
+
+
+def _get_daily_stats(log_table: str, authors: list = None, project_names: list = None, updated_at_gte: int = None,
+                     updated_at_lte: int = None) -> 'pd.DataFrame':
+    """从汇总表按 项目 × 开发者 汇总时间范围内的统计数据，时间范围按天对齐"""
+    import pandas as pd
+
+    query = f"""
+                SELECT project_name, author, SUM(review_count) AS review_count, SUM(score_sum) AS score_sum,
+                       SUM(additions) AS additions, SUM(deletions) AS deletions
+                FROM {DAILY_STATS_TABLES[log_table]}
+                WHERE 1=1
+                """
+    params = []
+
+    if authors:
+        placeholders = ','.join(['?'] * len(authors))
+        query += f" AND author IN ({placeholders})"
+        params.extend(authors)
+
+    if project_names:
+        placeholders = ','.join(['?'] * len(project_names))
+        query += f" AND project_name IN ({placeholders})"
+        params.extend(project_names)
+
+    if updated_at_gte is not None:
+        query += " AND day >= ?"
+        params.append(datetime.fromtimestamp(updated_at_gte).strftime("%Y-%m-%d"))
+
+    if updated_at_lte is not None:
+        query += " AND day <= ?"
+        params.append(datetime.fromtimestamp(updated_at_lte).strftime("%Y-%m-%d"))
+    query += " GROUP BY project_name, author"
+    with get_pool(ReviewService.DB_FILE).connection() as conn:
+        return pd.read_sql_query(sql=query, con=conn, params=params)
 
 
 class ReviewService:
@@ -10,50 +161,9 @@ class ReviewService:
 
     @staticmethod
     def init_db():
-        """初始化数据库及表结构"""
+        """初始化数据库，执行未完成的迁移"""
         try:
-            with sqlite3.connect(ReviewService.DB_FILE) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS mr_review_log (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            project_name TEXT,
-                            author TEXT,
-                            source_branch TEXT,
-                            target_branch TEXT,
-                            updated_at INTEGER,
-                            commit_messages TEXT,
-                            score INTEGER,
-                            url TEXT,
-                            review_result TEXT,
-                            additions INTEGER DEFAULT 0,
-                            deletions INTEGER DEFAULT 0
-                        )
-                    ''')
-                cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS push_review_log (
-                            id INTEGER PRIMARY KEY AUTOINCREMENT,
-                            project_name TEXT,
-                            author TEXT,
-                            branch TEXT,
-                            updated_at INTEGER,
-                            commit_messages TEXT,
-                            score INTEGER,
-                            review_result TEXT,
-                            additions INTEGER DEFAULT 0,
-                            deletions INTEGER DEFAULT 0
-                        )
-                    ''')
-                # 确保旧版本的mr_review_log、push_review_log表添加additions、deletions列
-                tables = ["mr_review_log", "push_review_log"]
-                columns = ["additions", "deletions"]
-                for table in tables:
-                    cursor.execute(f"PRAGMA table_info({table})")
-                    current_columns = [col[1] for col in cursor.fetchall()]
-                    for column in columns:
-                        if column not in current_columns:
-                            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER DEFAULT 0")
-                conn.commit()
+            migrate(ReviewService.DB_FILE, MIGRATIONS)
         except sqlite3.DatabaseError as e:
             print(f"Database initialization failed: {e}")
 
@@ -61,7 +171,7 @@ class ReviewService:
     def insert_mr_review_log(entity: MergeRequestReviewEntity):
         """插入合并请求审核日志"""
         try:
-            with sqlite3.connect(ReviewService.DB_FILE) as conn:
+            with get_pool(ReviewService.DB_FILE).connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                                 INSERT INTO mr_review_log (project_name,author, source_branch, target_branch, updated_at, commit_messages, score, url,review_result, additions, deletions)
@@ -71,16 +181,18 @@ class ReviewService:
                                 entity.target_branch,
                                 entity.updated_at, entity.commit_messages, entity.score,
                                 entity.url, entity.review_result, entity.additions, entity.deletions))
-                conn.commit()
+                _update_daily_stats(cursor, "mr_review_log", entity)
         except sqlite3.DatabaseError as e:
             print(f"Error inserting review log: {e}")
 
     @staticmethod
     def get_mr_review_logs(authors: list = None, project_names: list = None, updated_at_gte: int = None,
-                           updated_at_lte: int = None) -> pd.DataFrame:
+                           updated_at_lte: int = None) -> 'pd.DataFrame':
         """获取符合条件的合并请求审核日志"""
+        import pandas as pd
+
         try:
-            with sqlite3.connect(ReviewService.DB_FILE) as conn:
+            with get_pool(ReviewService.DB_FILE).connection() as conn:
                 query = """
                             SELECT project_name, author, source_branch, target_branch, updated_at, commit_messages, score, url, review_result, additions, deletions
                             FROM mr_review_log
@@ -112,11 +224,26 @@ class ReviewService:
             print(f"Error retrieving review logs: {e}")
             return pd.DataFrame()
 
+    @staticmethod
+    def get_mr_review_stats(authors: list = None, project_names: list = None, updated_at_gte: int = None,
+                            updated_at_lte: int = None) -> 'pd.DataFrame':
+        """
+        从按天汇总表获取合并请求统计，每行为一个 项目 × 开发者
+        列：project_name, author, review_count, score_sum, additions, deletions
+        """
+        import pandas as pd
+
+        try:
+            return _get_daily_stats("mr_review_log", authors, project_names, updated_at_gte, updated_at_lte)
+        except sqlite3.DatabaseError as e:
+            print(f"Error retrieving review stats: {e}")
+            return pd.DataFrame()
+
     @staticmethod
     def insert_push_review_log(entity: PushReviewEntity):
         """插入推送审核日志"""
         try:
-            with sqlite3.connect(ReviewService.DB_FILE) as conn:
+            with get_pool(ReviewService.DB_FILE).connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute('''
                                 INSERT INTO push_review_log (project_name,author, branch, updated_at, commit_messages, score,review_result, additions, deletions)
@@ -125,16 +252,18 @@ class ReviewService:
                                (entity.project_name, entity.author, entity.branch,
                                 entity.updated_at, entity.commit_messages, entity.score,
                                 entity.review_result, entity.additions, entity.deletions))
-                conn.commit()
+                _update_daily_stats(cursor, "push_review_log", entity)
         except sqlite3.DatabaseError as e:
             print(f"Error inserting review log: {e}")
 
     @staticmethod
     def get_push_review_logs(authors: list = None, project_names: list = None, updated_at_gte: int = None,
-                             updated_at_lte: int = None) -> pd.DataFrame:
+                             updated_at_lte: int = None) -> 'pd.DataFrame':
         """获取符合条件的推送审核日志"""
+        import pandas as pd
+
         try:
-            with sqlite3.connect(ReviewService.DB_FILE) as conn:
+            with get_pool(ReviewService.DB_FILE).connection() as conn:
                 # 基础查询
                 query = """
                     SELECT project_name, author, branch, updated_at, commit_messages, score, review_result, additions, deletions
@@ -174,6 +303,21 @@ class ReviewService:
             print(f"Error retrieving push review logs: {e}")
             return pd.DataFrame()
 
+    @staticmethod
+    def get_push_review_stats(authors: list = None, project_names: list = None, updated_at_gte: int = None,
+                              updated_at_lte: int = None) -> 'pd.DataFrame':
+        """
+        从按天汇总表获取推送统计，每行为一个 项目 × 开发者
+        列：project_name, author, review_count, score_sum, additions, deletions
+        """
+        import pandas as pd
+
+        try:
+            return _get_daily_stats("push_review_log", authors, project_names, updated_at_gte, updated_at_lte)
+        except sqlite3.DatabaseError as e:
+            print(f"Error retrieving push review stats: {e}")
+            return pd.DataFrame()
+
 
 # Initialize database
 ReviewService.init_db()
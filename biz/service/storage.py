@@ -0,0 +1,106 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from biz.utils.log import logger
+
+# 迁移函数，参数为处于事务中的 cursor
+Migration = Callable[[sqlite3.Cursor], None]
+
+
+class ConnectionPool:
+    """
+    SQLite 连接池：每个进程按数据库文件维护一组空闲连接，连接以 WAL 模式打开，
+    读（如 Dashboard 查询）与写（如 worker 写入审查日志）互不阻塞
+    """
+
+    def __init__(self, db_file: str, max_idle: int = 5, busy_timeout: int = 5000):
+        self.db_file = db_file
+        self.max_idle = max_idle
+        self.busy_timeout = busy_timeout
+        self._idle: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _create_connection(self) -> sqlite3.Connection:
+        db_dir = os.path.dirname(self.db_file)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_file, timeout=self.busy_timeout / 1000, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 已能保证数据库一致性，只有掉电时可能丢失最近的事务
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout)}")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """借出一个连接，正常退出时提交事务，出现异常时回滚，用完后放回连接池"""
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = self._create_connection()
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+# 进程内共享的连接池，按 (pid, 数据库文件) 区分；fork 出的子进程不复用父进程的连接
+_pools: Dict[Tuple[int, str], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_file: str) -> ConnectionPool:
+    """获取当前进程中数据库文件对应的连接池"""
+    key = (os.getpid(), os.path.abspath(db_file))
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(db_file, max_idle=int(os.getenv("SQLITE_POOL_SIZE", 5)))
+            _pools[key] = pool
+        return pool
+
+
+def migrate(db_file: str, migrations: List[Migration]) -> int:
+    """
+    按顺序执行数据库迁移，已执行到的版本号记录在 PRAGMA user_version 中，
+    第 N 个迁移函数对应版本 N；每个迁移在单独的事务中执行，多个进程同时启动时只会执行一次
+    :return: 迁移后的版本号
+    """
+    with get_pool(db_file).connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for target_version, migration in enumerate(migrations, start=1):
+            if target_version <= version:
+                continue
+            cursor = conn.cursor()
+            # BEGIN IMMEDIATE 获取写锁后再确认版本，避免并发重复执行
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                version = cursor.execute("PRAGMA user_version").fetchone()[0]
+                if target_version > version:
+                    migration(cursor)
+                    cursor.execute(f"PRAGMA user_version={target_version}")
+                    logger.info(f"数据库 {db_file} 已迁移到版本 {target_version}")
+                    version = target_version
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return version
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import tempfile
+from datetime import datetime
+from unittest import TestCase, main
+
+from biz.entity.review_entity import MergeRequestReviewEntity
+from biz.service.review_service import MIGRATIONS, ReviewService
+from biz.service.storage import get_pool
+
+
+class TestReviewService(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.original_db_file = ReviewService.DB_FILE
+        ReviewService.DB_FILE = os.path.join(self.tmp_dir.name, "data.db")
+
+    def tearDown(self):
+        get_pool(ReviewService.DB_FILE).close()
+        ReviewService.DB_FILE = self.original_db_file
+        self.tmp_dir.cleanup()
+
+    def _user_version(self):
+        with get_pool(ReviewService.DB_FILE).connection() as conn:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def test_migrate_legacy_database(self):
+        """没有版本号的旧数据库补齐 additions、deletions 列并创建索引"""
+        with sqlite3.connect(ReviewService.DB_FILE) as conn:
+            conn.execute("CREATE TABLE mr_review_log (id INTEGER PRIMARY KEY AUTOINCREMENT, project_name TEXT, "
+                         "author TEXT, source_branch TEXT, target_branch TEXT, updated_at INTEGER, "
+                         "commit_messages TEXT, score INTEGER, url TEXT, review_result TEXT)")
+            conn.execute("INSERT INTO mr_review_log (project_name, author, updated_at, score) "
+                         "VALUES ('demo', 'alice', 100, 80)")
+
+        ReviewService.init_db()
+        self.assertEqual(self._user_version(), len(MIGRATIONS))
+
+        df = ReviewService.get_mr_review_logs(authors=["alice"])
+        self.assertEqual(len(df), 1)
+        self.assertEqual(df.iloc[0]["additions"], 0)
+
+        # 迁移时用已有日志回填汇总表
+        stats = ReviewService.get_mr_review_stats()
+        self.assertEqual(stats.iloc[0]["review_count"], 1)
+        self.assertEqual(stats.iloc[0]["score_sum"], 80)
+
+        # 重复初始化不会重复执行迁移
+        ReviewService.init_db()
+        self.assertEqual(self._user_version(), len(MIGRATIONS))
+
+    def test_filtered_query_uses_index(self):
+        ReviewService.init_db()
+        for i in range(3):
+            ReviewService.insert_mr_review_log(MergeRequestReviewEntity(
+                project_name="demo", author=f"user{i}", source_branch="dev", target_branch="main",
+                updated_at=1000 + i, commits=[{"message": "fix"}], score=60 + i, url="", review_result="",
+                url_slug="", webhook_data={}, additions=1, deletions=2))
+
+        df = ReviewService.get_mr_review_logs(authors=["user1", "user2"], updated_at_gte=1000)
+        self.assertEqual(list(df["author"]), ["user2", "user1"])
+
+        with get_pool(ReviewService.DB_FILE).connection() as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT * FROM mr_review_log "
+                                "WHERE author IN ('user1') AND updated_at >= 0 ORDER BY updated_at DESC").fetchall()
+        self.assertEqual(journal_mode, "wal")
+        self.assertTrue(any("INDEX" in row[-1] for row in plan))
+
+    def test_daily_stats_follow_inserts(self):
+        """每次插入都累加按天汇总表，统计结果与原始日志一致"""
+        ReviewService.init_db()
+        day_start = int(datetime(2025, 1, 1).timestamp())
+        rows = [("demo", "alice", 0, 80), ("demo", "alice", 3600, 60), ("demo", "bob", 7200, 90),
+                ("other", "alice", 86400, 70)]
+        for project_name, author, offset, score in rows:
+            ReviewService.insert_mr_review_log(MergeRequestReviewEntity(
+                project_name=project_name, author=author, source_branch="dev", target_branch="main",
+                updated_at=day_start + offset, commits=[], score=score, url="", review_result="",
+                url_slug="", webhook_data={}, additions=10, deletions=5))
+
+        stats = ReviewService.get_mr_review_stats(updated_at_gte=day_start, updated_at_lte=day_start + 3600)
+        alice = stats[(stats["project_name"] == "demo") & (stats["author"] == "alice")].iloc[0]
+        self.assertEqual(alice["review_count"], 2)
+        self.assertEqual(alice["score_sum"], 140)
+        self.assertEqual(alice["additions"], 20)
+        self.assertEqual(int(stats["review_count"].sum()), 3)
+
+        stats = ReviewService.get_mr_review_stats(authors=["alice"])
+        self.assertEqual(int(stats["review_count"].sum()), 3)
+        logs = ReviewService.get_mr_review_logs(authors=["alice"])
+        self.assertEqual(int(stats["score_sum"].sum()), int(logs["score"].sum()))
+
+
+if __name__ == '__main__':
+    main()
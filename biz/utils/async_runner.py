@@ -0,0 +1,30 @@
+import asyncio
+import os
+import threading
+from typing import Any, Coroutine
+
+# 进程内共享的事件循环，运行在后台守护线程中；fork 出的子进程会重新创建
+_loop = None
+_loop_pid = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """获取当前进程共享的事件循环，首次调用时在后台线程中启动"""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="async-runner", daemon=True).start()
+        return _loop
+
+
+def run_async(coro: Coroutine, timeout: float = None) -> Any:
+    """
+    在共享事件循环中执行协程并同步等待结果，供同步代码（如队列任务）调用
+    :param coro: 协程
+    :param timeout: 等待超时时间（秒），None 表示一直等待
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    return future.result(timeout)
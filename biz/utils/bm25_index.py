@@ -0,0 +1,101 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# 标识符（后面紧跟左括号时一并匹配，用于区分函数调用）或连续的中文
+_TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(\()?|[\u4e00-\u9fff]+")
+# 驼峰、下划线命名中的单词，如 SimpleDateFormat -> Simple, Date, Format
+_SUBWORD_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    面向代码和技术文档的分词：标识符转小写后整体作为一个词，驼峰/下划线命名再拆出其中的单词；
+    标识符后紧跟左括号时额外生成 "name(" 词，使 eval( 之类的调用精确匹配；中文按相邻两个字切分
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text):
+        word = match.group(0)
+        if word[0] >= "\u4e00":
+            tokens.extend(word[i:i + 2] for i in range(max(len(word) - 1, 1)))
+            continue
+        name = word[:-1] if match.group(1) else word
+        lower_name = name.lower()
+        tokens.append(lower_name)
+        if match.group(1):
+            tokens.append(lower_name + "(")
+        subwords = _SUBWORD_PATTERN.findall(name)
+        if len(subwords) > 1:
+            tokens.extend(subword.lower() for subword in subwords if len(subword) > 1)
+    return tokens
+
+
+class BM25Index:
+    """
+    内存中的 BM25 倒排索引，按 id 增量添加、删除文档（知识库中为文档块），线程安全
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # 词 -> {id: 词频}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        # id -> (文档长度, 包含的词)，删除时据此更新倒排表
+        self._documents: Dict[str, Tuple[int, Tuple[str, ...]]] = {}
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def add(self, ids: Iterable[str], texts: Iterable[str]):
+        """添加文档，id 已存在时先删除旧内容"""
+        with self._lock:
+            for item_id, text in zip(ids, texts):
+                self._remove(item_id)
+                counts = Counter(tokenize(text))
+                length = sum(counts.values())
+                for term, count in counts.items():
+                    self._postings.setdefault(term, {})[item_id] = count
+                self._documents[item_id] = (length, tuple(counts))
+                self._total_length += length
+
+    def remove(self, ids: Iterable[str]):
+        with self._lock:
+            for item_id in ids:
+                self._remove(item_id)
+
+    def _remove(self, item_id: str):
+        document = self._documents.pop(item_id, None)
+        if document is None:
+            return
+        length, terms = document
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings[term]
+            del postings[item_id]
+            if not postings:
+                del self._postings[term]
+
+    def search(self, query: str, n_results: int = 5) -> List[Tuple[str, float]]:
+        """返回得分最高的 n_results 个 (id, BM25 得分)，不包含与查询没有共同词的文档"""
+        terms = set(tokenize(query))
+        with self._lock:
+            if not self._documents or not terms:
+                return []
+            total = len(self._documents)
+            average_length = self._total_length / total or 1
+            scores = {}
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for item_id, count in postings.items():
+                    length = self._documents[item_id][0]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[item_id] = scores.get(item_id, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
@@ -1,14 +1,24 @@
 import abc
+import asyncio
 import os
 import re
-from typing import Dict, Any, List
+import time
+from typing import Callable, Dict, Any, List, Optional
 
 import yaml
 from jinja2 import Template
 
 from biz.llm.factory import Factory
+from biz.utils.async_runner import run_async
+from biz.utils.language_detector import rank_change_languages
 from biz.utils.log import logger
-from biz.utils.token_util import count_tokens, truncate_text_by_tokens
+from biz.utils.review_cache import ReviewCache
+from biz.utils.token_util import count_and_truncate, count_tokens, within_token_limit
+
+SCORE_PATTERN = re.compile(r"总分[:：]\s*(\d+)分?")
+
+# 审查进度回调，参数为当前已生成的审查内容
+ProgressCallback = Callable[[str], None]
 
 
 class BaseReviewer(abc.ABC):
@@ -17,6 +27,7 @@ class BaseReviewer(abc.ABC):
     def __init__(self, prompt_key: str):
         self.client = Factory().getClient()
         self.prompts = self._load_prompts(prompt_key, os.getenv("REVIEW_STYLE", "professional"))
+        self.cache = ReviewCache()
 
     def _load_prompts(self, prompt_key: str, style="professional") -> Dict[str, Any]:
         """加载提示词配置"""
@@ -41,18 +52,152 @@ class BaseReviewer(abc.ABC):
             logger.error(f"加载提示词配置失败: {e}")
             raise Exception(f"提示词配置加载失败: {e}")
 
-    def call_llm(self, messages: List[Dict[str, Any]]) -> str:
-        """调用 LLM 进行代码审核"""
+    def _cache_key(self, messages: List[Dict[str, Any]], temperature: float) -> str:
+        return ReviewCache.make_key(messages, os.getenv("LLM_PROVIDER", "openai"),
+                                    getattr(self.client, "default_model", ""), temperature)
+
+    def call_llm(self, messages: List[Dict[str, Any]], temperature: Optional[float] = None,
+                 on_progress: Optional[ProgressCallback] = None) -> str:
+        """
+        调用 LLM 进行代码审核，相同输入命中缓存时直接返回缓存结果
+        :param on_progress: 传入时以流式方式请求，每隔 REVIEW_STREAMING_INTERVAL 秒回调一次已生成的内容
+        """
+        if temperature is None:
+            temperature = self.client.default_temperature
+        cache_key = self._cache_key(messages, temperature)
+        cached_result = self.cache.get(cache_key)
+        if cached_result is not None:
+            logger.info(f"命中审查缓存: {cache_key}")
+            return cached_result
+
+        logger.info(f"向 AI 发送代码 Review 请求, messages: {messages}")
+        if on_progress is None:
+            review_result = self.client.completions(messages=messages, temperature=temperature)
+        else:
+            review_result = self._stream_llm(messages, temperature, on_progress)
+        logger.info(f"收到 AI 返回结果: {review_result}")
+        # 只缓存包含总分的有效审查结果，避免缓存接口报错信息
+        if review_result and SCORE_PATTERN.search(review_result):
+            self.cache.set(cache_key, review_result)
+        return review_result
+
+    def _stream_llm(self, messages: List[Dict[str, Any]], temperature: float, on_progress: ProgressCallback) -> str:
+        """
+        流式请求 LLM，收到第一段非空内容时立即交给 on_progress，之后按时间间隔回调已生成的内容，返回完整结果
+        """
+        interval = float(os.getenv("REVIEW_STREAMING_INTERVAL", 3))
+        parts = []
+        # 尚未回调过进度时为 None
+        last_progress = None
+        for chunk in self.client.stream_completions(messages=messages, temperature=temperature):
+            parts.append(chunk)
+            now = time.monotonic()
+            if (chunk.strip() and last_progress is None) or \
+                    (last_progress is not None and now - last_progress >= interval):
+                last_progress = now
+                report_progress(on_progress, "".join(parts))
+        return "".join(parts)
+
+    async def acall_llm(self, messages: List[Dict[str, Any]], temperature: Optional[float] = None) -> str:
+        """call_llm 的异步版本，通过 client.acompletions 发起请求"""
+        if temperature is None:
+            temperature = self.client.default_temperature
+        cache_key = self._cache_key(messages, temperature)
+        cached_result = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached_result is not None:
+            logger.info(f"命中审查缓存: {cache_key}")
+            return cached_result
+
         logger.info(f"向 AI 发送代码 Review 请求, messages: {messages}")
-        review_result = self.client.completions(messages=messages)
+        review_result = await self.client.acompletions(messages=messages, temperature=temperature)
         logger.info(f"收到 AI 返回结果: {review_result}")
+        if review_result and SCORE_PATTERN.search(review_result):
+            await asyncio.to_thread(self.cache.set, cache_key, review_result)
         return review_result
 
+    @staticmethod
+    def strip_review_result(review_result: str) -> str:
+        """如果review_result是markdown格式，则去掉头尾的```"""
+        review_result = review_result.strip()
+        if review_result.startswith("```markdown") and review_result.endswith("```"):
+            return review_result[11:-3].strip()
+        return review_result
+
+    @abc.abstractmethod
+    def prepare_messages(self, changes_text: str, commits_text: str = "",
+                         languages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """截断超长的changes_text并构建发送给 LLM 的消息，languages 为变更涉及的语言，子类必须实现"""
+        pass
+
     @abc.abstractmethod
     def review_code(self, *args, **kwargs) -> str:
         """抽象方法，子类必须实现"""
         pass
 
+    @abc.abstractmethod
+    def review_and_strip_code(self, changes_text: str, commits_text: str = "",
+                              on_progress: Optional[ProgressCallback] = None,
+                              languages: Optional[List[str]] = None) -> str:
+        """抽象方法，子类必须实现"""
+        pass
+
+    async def areview_and_strip_code(self, changes_text: str, commits_text: str = "",
+                                     temperature: Optional[float] = None,
+                                     languages: Optional[List[str]] = None) -> str:
+        """review_and_strip_code 的异步版本：消息准备（截断、知识检索）在线程池中执行，LLM 请求异步发出"""
+        if not changes_text:
+            logger.info("代码为空")
+            return "代码为空"
+        messages = await asyncio.to_thread(self.prepare_messages, changes_text, commits_text, languages)
+        review_result = await self.acall_llm(messages, temperature)
+        return self.strip_review_result(review_result)
+
+    def review_changes(self, changes: list, commits_text: str = "", on_progress: Optional[ProgressCallback] = None) -> str:
+        """
+        审查 changes 列表。REVIEW_MODE=full（默认）时整体作为一次请求审查；
+        REVIEW_MODE=per_file 时按文件（超长文件再按 hunk）拆分，并发审查后合并为一条结果
+        :param changes: filter_changes 过滤后的变更列表
+        :param commits_text:
+        :param on_progress: 进度回调。full 模式下流式返回已生成的内容，per_file 模式下返回已完成单元的结果
+        :return: 审查结果
+        """
+        review_mode = os.getenv("REVIEW_MODE", "full")
+        if review_mode != "per_file" or len(changes) == 0:
+            return self.review_and_strip_code(str(changes), commits_text, on_progress=on_progress,
+                                              languages=rank_change_languages(changes))
+
+        review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 10000))
+        concurrency = max(1, int(os.getenv("REVIEW_CONCURRENCY", 4)))
+        units = split_review_units(changes, review_max_tokens)
+        logger.info(f"按文件并发审查: {len(changes)} 个文件拆分为 {len(units)} 个审查单元, 并发数: {concurrency}")
+
+        # 在进程共享的事件循环中并发审查，同时进行的请求数不超过 concurrency
+        async def review_units() -> List[str]:
+            semaphore = asyncio.Semaphore(concurrency)
+            finished = {}
+
+            async def review_unit(index: int, unit: dict) -> str:
+                async with semaphore:
+                    try:
+                        result = await self.areview_and_strip_code(
+                            str(unit["changes"]), commits_text,
+                            languages=rank_change_languages(unit["changes"]))
+                    except Exception as e:
+                        logger.error(f"审查单元 {unit['label']} 失败: {e}")
+                        result = f"审查失败: {e}"
+                if on_progress is not None:
+                    finished[index] = result
+                    done = sorted(finished)
+                    progress_text = format_unit_sections([units[i] for i in done], [finished[i] for i in done])
+                    await asyncio.to_thread(report_progress, on_progress,
+                                            f"{progress_text}\n\n---\n\n已完成 {len(done)}/{len(units)} 个审查单元")
+                return result
+
+            return await asyncio.gather(*(review_unit(i, unit) for i, unit in enumerate(units)))
+
+        results = run_async(review_units())
+        return merge_review_results(units, results)
+
 
 class CodeReviewer(BaseReviewer):
     """代码 Diff 级别的审查"""
@@ -60,34 +205,36 @@ class CodeReviewer(BaseReviewer):
     def __init__(self):
         super().__init__("code_review_prompt")
 
-    def review_and_strip_code(self, changes_text: str, commits_text: str = "") -> str:
+    def review_and_strip_code(self, changes_text: str, commits_text: str = "",
+                              on_progress: Optional[ProgressCallback] = None,
+                              languages: Optional[List[str]] = None) -> str:
         """
         Review判断changes_text超出取前REVIEW_MAX_TOKENS个token，超出则截断changes_text，
-        调用review_code方法，返回review_result，如果review_result是markdown格式，则去掉头尾的```
+        调用LLM审查，返回review_result，如果review_result是markdown格式，则去掉头尾的```
         :param changes_text:
         :param commits_text:
+        :param on_progress: 传入时流式审查并回调已生成的内容
+        :param languages: 变更涉及的语言，普通审查不使用
         :return:
         """
-        # 如果超长，取前REVIEW_MAX_TOKENS个token
-        review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 10000))
         # 如果changes为空,打印日志
         if not changes_text:
-            logger.info("代码为空, diffs_text = %", str(changes_text))
+            logger.info("代码为空, diffs_text = %s", str(changes_text))
             return "代码为空"
 
-        # 计算tokens数量，如果超过REVIEW_MAX_TOKENS，截断changes_text
-        tokens_count = count_tokens(changes_text)
-        if tokens_count > review_max_tokens:
-            changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
+        messages = self.prepare_messages(changes_text, commits_text)
+        return self.strip_review_result(self.call_llm(messages, on_progress=on_progress))
 
-        review_result = self.review_code(changes_text, commits_text).strip()
-        if review_result.startswith("```markdown") and review_result.endswith("```"):
-            return review_result[11:-3].strip()
-        return review_result
+    def prepare_messages(self, changes_text: str, commits_text: str = "",
+                         languages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        # 如果超长，取前REVIEW_MAX_TOKENS个token
+        review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 10000))
+        # 计算tokens数量，如果超过REVIEW_MAX_TOKENS，截断changes_text（只编码一次）
+        _, changes_text = count_and_truncate(changes_text, review_max_tokens)
+        return self._build_messages(changes_text, commits_text)
 
-    def review_code(self, diffs_text: str, commits_text: str = "") -> str:
-        """Review 代码并返回结果"""
-        messages = [
+    def _build_messages(self, diffs_text: str, commits_text: str = "") -> List[Dict[str, Any]]:
+        return [
             self.prompts["system_message"],
             {
                 "role": "user",
@@ -96,13 +243,96 @@ class CodeReviewer(BaseReviewer):
                 ),
             },
         ]
-        return self.call_llm(messages)
+
+    def review_code(self, diffs_text: str, commits_text: str = "") -> str:
+        """Review 代码并返回结果"""
+        return self.call_llm(self._build_messages(diffs_text, commits_text))
 
     @staticmethod
     def parse_review_score(review_text: str) -> int:
         """解析 AI 返回的 Review 结果，返回评分"""
         if not review_text:
             return 0
-        match = re.search(r"总分[:：]\s*(\d+)分?", review_text)
+        match = SCORE_PATTERN.search(review_text)
         return int(match.group(1)) if match else 0
 
+
+def split_review_units(changes: list, max_tokens: int) -> List[Dict[str, Any]]:
+    """
+    将变更拆分为审查单元：每个文件一个单元，超过 max_tokens 的文件按 hunk 分组拆成多个单元
+    :return: [{'label': 单元名称, 'changes': [change], 'weight': 变更行数}]
+    """
+    units = []
+    for change in changes:
+        path = change.get("new_path", "")
+        weight = change.get("additions", 0) + change.get("deletions", 0)
+        diff = change.get("diff", "")
+        if within_token_limit(str([change]), max_tokens):
+            units.append({"label": path, "changes": [change], "weight": weight})
+            continue
+
+        # 按 hunk 拆分，累积到接近 token 上限为一组；单个 hunk 超长时由 review_and_strip_code 截断
+        hunks = [hunk for hunk in re.split(r"(?m)^(?=@@ )", diff) if hunk]
+        groups = []
+        current, current_tokens = [], 0
+        for hunk in hunks:
+            hunk_tokens = count_tokens(hunk)
+            if current and current_tokens + hunk_tokens > max_tokens:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(hunk)
+            current_tokens += hunk_tokens
+        if current:
+            groups.append(current)
+
+        for i, group in enumerate(groups):
+            group_diff = "".join(group)
+            group_change = dict(change, diff=group_diff)
+            group_weight = len(re.findall(r"^[+-](?![+-]{2})", group_diff, re.MULTILINE))
+            units.append({
+                "label": f"{path} ({i + 1}/{len(groups)})",
+                "changes": [group_change],
+                "weight": group_weight,
+            })
+    return units
+
+
+def report_progress(on_progress: ProgressCallback, review_text: str):
+    """调用进度回调；回调失败（如更新评论失败）只记录日志，不影响审查本身"""
+    # 流式输出时结束的 ``` 还没有到达，提前去掉开头的 ```markdown，避免整段被渲染成代码块
+    review_text = review_text.strip()
+    if review_text.startswith("```markdown"):
+        review_text = review_text[11:].strip()
+    if not review_text:
+        return
+    try:
+        on_progress(review_text)
+    except Exception as e:
+        logger.warn(f"审查进度回调失败: {e}")
+
+
+def format_unit_sections(units: List[Dict[str, Any]], results: List[str]) -> str:
+    """按单元拼接审查结果，各单元自身的“总分”改写为“得分”"""
+    sections = []
+    for unit, result in zip(units, results):
+        section_text = SCORE_PATTERN.sub(lambda m: f"得分: {m.group(1)}分", result or "")
+        sections.append(f"### 📄 {unit['label']}\n\n{section_text}")
+    return "\n\n---\n\n".join(sections)
+
+
+def merge_review_results(units: List[Dict[str, Any]], results: List[str]) -> str:
+    """
+    合并各审查单元的结果，总分按变更行数加权平均；各单元自身的“总分”改写为“得分”，
+    保证合并后的结果只有一个可被 parse_review_score 解析的总分
+    """
+    weighted_score, total_weight = 0, 0
+    for unit, result in zip(units, results):
+        match = SCORE_PATTERN.search(result or "")
+        if match:
+            weight = max(unit["weight"], 1)
+            weighted_score += int(match.group(1)) * weight
+            total_weight += weight
+
+    total_score = round(weighted_score / total_weight) if total_weight else 0
+    summary = f"共审查 {len(units)} 个单元，总分按变更行数加权计算。\n\n总分: {total_score}分"
+    return "\n\n---\n\n".join([format_unit_sections(units, results), summary])
@@ -0,0 +1,104 @@
+import ast
+import re
+from collections import Counter
+from typing import Dict, List
+
+# 导入语句中的模块：Python import / from ... import、Java import、JS import ... from / require、Go import、C/C++ #include
+_IMPORT_PATTERN = re.compile(
+    r"^\s*(?:from\s+(?P<py_from>[\w.]+)\s+import\s+(?P<py_names>[\w, ]+)"
+    # JS 默认导入（import React from 'react'、import React, { ... }）中的名称不是模块
+    r"|import\s+(?:static\s+)?(?P<module>[\w.]+)(?![\w.]|\s*,\s*[{*]|.*\bfrom\s*['\"])"
+    r"|import\s+(?:\w+\s+)?\"(?P<go>[\w./-]+)\""
+    r"|#include\s*[<\"](?P<include>[\w./]+)[>\"])"
+    r"|\bfrom\s+['\"](?P<js_from>[^'\"]+)['\"]"
+    r"|\brequire\(\s*['\"](?P<require>[^'\"]+)['\"]\s*\)",
+    re.MULTILINE)
+# 函数/方法调用，obj.method( 同时记录接收者
+_CALL_PATTERN = re.compile(r"(?:\b([A-Za-z_]\w*)\s*\.\s*)?\b([A-Za-z_]\w*)\s*\(")
+_IDENTIFIER_PATTERN = re.compile(r"\b[A-Za-z_]\w*\b")
+# 字符串字面量和注释中的词不作为标识符
+_STRING_PATTERN = re.compile(r"\"(?:\\.|[^\"\\\n])*\"|'(?:\\.|[^'\\\n])*'|(?:#|//).*$", re.MULTILINE)
+
+# 各语言的关键字和过于常见的词，不作为检索词
+STOP_WORDS = frozenset("""
+and as assert async await break case catch class const continue def default del delete do elif else
+enum except export extends false final finally for from func function go if implements import in
+instanceof interface is lambda let new nil none not null or package pass private protected public
+raise return self static struct super switch this throw throws true try type typeof var void while
+with yield int str bool float string list dict set len print println printf fmt std err args kwargs require
+""".split())
+# 标识符最短长度
+MIN_TERM_LENGTH = 3
+
+
+def changes_to_diff_text(changes_text: str) -> str:
+    """
+    审查时传入的 changes_text 是变更列表的 str()，diff 中的换行被转义；
+    还原为按行的 diff 文本（截断后无法解析时直接反转义换行），普通 diff 文本原样返回
+    """
+    if "\n" in changes_text or "\\n" not in changes_text:
+        return changes_text
+    try:
+        changes = ast.literal_eval(changes_text)
+        return "\n".join(change.get("diff", "") for change in changes)
+    except (ValueError, SyntaxError, TypeError, AttributeError, MemoryError, RecursionError):
+        return changes_text.replace("\\n", "\n")
+
+
+def _is_term(word: str) -> bool:
+    return len(word) >= MIN_TERM_LENGTH and word.lower() not in STOP_WORDS
+
+
+def extract_diff_terms(diff_text: str, max_terms: int = 8) -> Dict[str, List[str]]:
+    """
+    从 diff 新增的行中提取检索词（不含上下文行和删除的行），每类按出现次数排序，最多 max_terms 个
+    :return: {"imports": 导入的模块, "calls": 调用的函数/方法（obj.method 形式）, "identifiers": 其他标识符}
+    """
+    new_code = "\n".join(line[1:] for line in diff_text.splitlines()
+                         if line.startswith("+") and not line.startswith("+++"))
+    imports, calls, identifiers = Counter(), Counter(), Counter()
+    for match in _IMPORT_PATTERN.finditer(new_code):
+        module = next(value for value in (match.group("py_from"), match.group("module"), match.group("go"),
+                                          match.group("include"), match.group("js_from"), match.group("require"))
+                      if value)
+        imports[module] += 1
+        for name in (match.group("py_names") or "").split(","):
+            name = name.strip().split(" ")[0]
+            if _is_term(name):
+                imports[f"{module}.{name}"] += 1
+
+    code = _STRING_PATTERN.sub(" ", new_code)
+    called = set()
+    for match in _CALL_PATTERN.finditer(code):
+        receiver, name = match.groups()
+        if not _is_term(name):
+            continue
+        calls[f"{receiver}.{name}" if receiver and _is_term(receiver) else name] += 1
+        called.add(name)
+
+    # 模块名和被调用的函数名已作为导入、调用检索词，不再重复计入标识符
+    imported = {part for module in imports for part in re.split(r"[./-]", module)}
+    for word in _IDENTIFIER_PATTERN.findall(code):
+        if _is_term(word) and word not in called and word not in imported:
+            identifiers[word] += 1
+
+    return {
+        "imports": [term for term, _ in imports.most_common(max_terms)],
+        "calls": [term for term, _ in calls.most_common(max_terms)],
+        "identifiers": [term for term, _ in identifiers.most_common(max_terms)],
+    }
+
+
+def build_diff_queries(terms: Dict[str, List[str]], language: str = None) -> List[str]:
+    """
+    每类检索词组成一条查询（调用写成 name( 形式，便于关键词检索精确匹配调用），前面加上语言帮助向量检索
+    """
+    prefix = f"{language} " if language else ""
+    queries = []
+    if terms.get("imports"):
+        queries.append(prefix + " ".join(terms["imports"]))
+    if terms.get("calls"):
+        queries.append(prefix + " ".join(f"{call}(" for call in terms["calls"]))
+    if terms.get("identifiers"):
+        queries.append(prefix + " ".join(terms["identifiers"]))
+    return queries
@@ -0,0 +1,249 @@
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from functools import lru_cache
+from typing import List, Union
+
+import numpy as np
+
+from biz.utils.log import logger
+
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# 向量化推理后端：torch 为原始的 PyTorch 全精度模型；int8 为 PyTorch 动态量化（Linear 层权重 int8）；
+# onnx、onnx-int8 使用 ONNX Runtime 推理，模型首次使用时从 SentenceTransformer 导出
+EMBEDDING_BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = "torch"
+# 各推理后端额外需要的模块：onnxruntime、tokenizers 随 chromadb 安装，onnx-int8 量化还需要 onnx
+BACKEND_MODULES = {
+    "onnx": ("onnxruntime", "tokenizers"),
+    "onnx-int8": ("onnxruntime", "tokenizers", "onnx"),
+}
+# 导出的 ONNX 模型、分词器和池化配置所在目录下的文件名
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_TOKENIZER_FILE = "tokenizer.json"
+ONNX_CONFIG_FILE = "embedder.json"
+
+# 进程内共享的向量化模型，按 (模型名称, 推理后端) 缓存，只加载一次
+_models = {}
+_models_lock = threading.Lock()
+
+
+def get_model_path(model_name: str = DEFAULT_MODEL_NAME) -> str:
+    """优先使用项目 model 目录下的本地模型，不存在时使用在线模型名称"""
+    project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    model_path = os.path.join(project_root, 'model', model_name)
+    if os.path.exists(model_path):
+        return model_path
+    logger.warning(f"本地模型路径不存在: {model_path}, 使用在线模型")
+    return model_name
+
+
+def get_embedding_backend() -> str:
+    """当前配置的推理后端（EMBEDDING_BACKEND），配置无效或缺少所需模块时使用 torch"""
+    backend = os.getenv("EMBEDDING_BACKEND", DEFAULT_BACKEND).strip().lower() or DEFAULT_BACKEND
+    return _resolve_backend(backend)
+
+
+@lru_cache(maxsize=None)
+def _resolve_backend(backend: str) -> str:
+    """检查后端是否可用，每种配置只检查并记录一次警告"""
+    if backend not in EMBEDDING_BACKENDS:
+        logger.warning(f"不支持的向量化推理后端: {backend}，使用 {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    missing = [module for module in BACKEND_MODULES.get(backend, ()) if importlib.util.find_spec(module) is None]
+    if missing:
+        logger.warning(f"向量化推理后端 {backend} 缺少模块 {', '.join(missing)}，使用 {DEFAULT_BACKEND}")
+        return DEFAULT_BACKEND
+    return backend
+
+
+def get_model_fingerprint(model_name: str = DEFAULT_MODEL_NAME, backend: str = None) -> str:
+    """
+    模型指纹，用于判断持久化的向量是否仍然有效：本地模型按文件相对路径、大小和修改时间计算，
+    在线模型使用模型名称；模型文件被替换或更新后指纹随之变化。
+    非 torch 后端计算的向量与原模型略有差异，指纹中包含后端名称
+    """
+    backend = backend or get_embedding_backend()
+    model_path = get_model_path(model_name)
+    digest = hashlib.sha256(model_name.encode())
+    if os.path.isdir(model_path):
+        for root, dirs, files in os.walk(model_path):
+            dirs.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(root, file_name)
+                stat = os.stat(file_path)
+                digest.update(f"{os.path.relpath(file_path, model_path)}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+    if backend != DEFAULT_BACKEND:
+        digest.update(f"backend:{backend}".encode())
+    return digest.hexdigest()[:16]
+
+
+class OnnxEmbedder:
+    """
+    ONNX Runtime 推理的句向量模型，encode 的用法与 SentenceTransformer 相同。
+    分词使用 tokenizers，推理时不需要 PyTorch；池化方式为平均池化，按导出时的配置做 L2 归一化
+    """
+
+    def __init__(self, model_dir: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        self.max_seq_length = config["max_seq_length"]
+        self.normalize = config["normalize"]
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, ONNX_TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.max_seq_length)
+        self.tokenizer.enable_padding()
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, ONNX_MODEL_FILE), options,
+                                                    providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+        embeddings = [None] * len(sentences)
+        # 长度相近的句子放在同一批，减少填充
+        order = sorted(range(len(sentences)), key=lambda i: -len(sentences[i]))
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([sentences[i] for i in batch])
+            attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            inputs = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": attention_mask,
+                "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64),
+            }
+            token_embeddings = self.session.run(None, {name: value for name, value in inputs.items()
+                                                       if name in self.input_names})[0]
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if self.normalize:
+                pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for i, embedding in zip(batch, pooled):
+                embeddings[i] = embedding
+        if not embeddings:
+            return np.empty((0, 0), dtype=np.float32)
+        result = np.stack(embeddings).astype(np.float32)
+        return result[0] if single else result
+
+
+def get_onnx_model_dir(model_name: str = DEFAULT_MODEL_NAME, backend: str = "onnx") -> str:
+    """导出的 ONNX 模型目录（EMBEDDING_ONNX_DIR，默认 data/onnx），不放在 model 目录下，以免改变模型指纹"""
+    return os.path.join(os.getenv("EMBEDDING_ONNX_DIR", "data/onnx"), model_name, backend)
+
+
+def export_onnx_model(model_name: str = DEFAULT_MODEL_NAME, backend: str = "onnx") -> str:
+    """
+    把 SentenceTransformer 模型导出为 ONNX（onnx-int8 再做动态量化），同时保存分词器和池化配置
+    :return: 导出目录
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = get_onnx_model_dir(model_name, backend)
+    # 加载前计算源模型指纹，导出过程中模型文件被替换时下次加载会重新导出
+    source_fingerprint = get_model_fingerprint(model_name, DEFAULT_BACKEND)
+    model = SentenceTransformer(get_model_path(model_name))
+    transformer, pooling = model[0], model[1]
+    if not getattr(pooling, "pooling_mode_mean_tokens", False):
+        raise ValueError(f"{model_name} 不是平均池化模型，不支持导出为 ONNX")
+
+    os.makedirs(model_dir, exist_ok=True)
+    sample = transformer.tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names + ["token_embeddings"]}
+    model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+    export_path = f"{model_path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(transformer.auto_model, tuple(sample[name] for name in input_names), export_path,
+                          input_names=input_names, output_names=["token_embeddings"],
+                          dynamic_axes=dynamic_axes, opset_version=14)
+    if backend == "onnx-int8":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantized_path = f"{export_path}.int8"
+        quantize_dynamic(export_path, quantized_path, weight_type=QuantType.QInt8)
+        os.replace(quantized_path, export_path)
+
+    transformer.tokenizer.backend_tokenizer.save(os.path.join(model_dir, ONNX_TOKENIZER_FILE))
+    os.replace(export_path, model_path)
+    # 配置文件最后写入，其中的源模型指纹与当前模型一致即表示导出完成且没有过期
+    config_path = os.path.join(model_dir, ONNX_CONFIG_FILE)
+    tmp_path = f"{config_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "max_seq_length": model.max_seq_length,
+            "normalize": any(type(module).__name__ == "Normalize" for module in model),
+            "source_fingerprint": source_fingerprint,
+        }, f)
+    os.replace(tmp_path, config_path)
+    logger.info(f"已导出 ONNX 模型: {model_path}")
+    return model_dir
+
+
+def is_onnx_model_current(model_name: str = DEFAULT_MODEL_NAME, backend: str = "onnx") -> bool:
+    """导出的 ONNX 模型是否存在，且导出时的源模型指纹与 model 目录下当前的模型一致"""
+    model_dir = get_onnx_model_dir(model_name, backend)
+    if not os.path.exists(os.path.join(model_dir, ONNX_MODEL_FILE)):
+        return False
+    try:
+        with open(os.path.join(model_dir, ONNX_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return config.get("source_fingerprint") == get_model_fingerprint(model_name, DEFAULT_BACKEND)
+
+
+def _load_model(model_name: str, backend: str):
+    model_path = get_model_path(model_name)
+    if backend in ("onnx", "onnx-int8"):
+        model_dir = get_onnx_model_dir(model_name, backend)
+        if not is_onnx_model_current(model_name, backend):
+            logger.info(f"ONNX 模型不存在或源模型已变化，从 {model_path} 导出")
+            export_onnx_model(model_name, backend)
+        logger.info(f"加载向量化模型: {model_dir} ({backend})")
+        return OnnxEmbedder(model_dir)
+
+    # sentence_transformers 会导入 torch，首次加载模型时才导入
+    from sentence_transformers import SentenceTransformer
+
+    logger.info(f"加载向量化模型: {model_path} ({backend})")
+    model = SentenceTransformer(model_path, device="cpu" if backend == "int8" else None)
+    if backend == "int8":
+        import torch
+
+        torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def get_embedding_model(model_name: str = DEFAULT_MODEL_NAME, backend: str = None):
+    """
+    获取共享的向量化模型，首次调用时加载，之后直接复用
+    :param model_name: 模型名称，对应 model 目录下的文件夹
+    :param backend: 推理后端，默认取 EMBEDDING_BACKEND
+    :return: SentenceTransformer，onnx 后端为用法相同的 OnnxEmbedder
+    """
+    key = (model_name, backend or get_embedding_backend())
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _models_lock:
+        model = _models.get(key)
+        if model is None:
+            model = _load_model(*key)
+            _models[key] = model
+        return model
+
+
+def reload_embedding_model(model_name: str = DEFAULT_MODEL_NAME, backend: str = None):
+    """丢弃已加载的模型并重新加载（模型文件更新后调用）"""
+    with _models_lock:
+        _models.pop((model_name, backend or get_embedding_backend()), None)
+    return get_embedding_model(model_name, backend)
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from biz.utils.log import logger
+
+# 向量记录文件：每条记录为 (内容哈希, float32 向量)，以内存映射方式读取
+DATA_FILE = "embeddings.bin"
+# 元数据文件：模型指纹和向量维度
+META_FILE = "embeddings.json"
+
+
+class EmbeddingCache:
+    """
+    持久化的 内容哈希 -> 向量 缓存。记录定长、追加写入，哈希与向量存放在同一条记录里，
+    多个进程追加时不会错位；内存中只保存 哈希 -> 行号 的索引，向量按需从内存映射中读取。
+    模型指纹变化或条目数将超过 EMBEDDING_CACHE_MAX_ENTRIES 时整体清空
+    """
+
+    def __init__(self, cache_dir: str, fingerprint: str, max_entries: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.max_entries = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 200000)) if max_entries is None else max_entries
+        self._data_path = os.path.join(cache_dir, DATA_FILE)
+        self._meta_path = os.path.join(cache_dir, META_FILE)
+        self._lock = threading.Lock()
+        self._dtype = None
+        self._records = None
+        self._rows = {}
+        self._load()
+
+    @staticmethod
+    def make_key(text: str) -> bytes:
+        """文本内容的哈希"""
+        return hashlib.md5(text.encode('utf-8')).hexdigest().encode('ascii')
+
+    @staticmethod
+    def _record_dtype(dim: int) -> np.dtype:
+        return np.dtype([("key", "S32"), ("vector", "<f4", (dim,))])
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def encode(self, texts: Sequence[str], encoder: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        返回 texts 的向量，已缓存的直接读取，其余（去重后）交给 encoder 计算并写入缓存
+        :param encoder: 向量化函数，如 SentenceTransformer.encode
+        """
+        if not texts:
+            return np.asarray(encoder(list(texts)), dtype=np.float32)
+        keys = [self.make_key(text) for text in texts]
+        with self._lock:
+            vectors = self._lookup(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        if missing:
+            # 计算向量时不持有锁，其他线程可以同时读取缓存
+            new_vectors = dict(zip(missing, np.asarray(encoder(list(missing.values())), dtype=np.float32)))
+            vectors.update(new_vectors)
+            with self._lock:
+                try:
+                    self._append(new_vectors)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"写入向量缓存失败: {e}")
+        return np.stack([vectors[key] for key in keys])
+
+    def _load(self):
+        """读取元数据并建立索引，模型指纹不一致或条目过多时清空"""
+        try:
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            meta = None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取向量缓存元数据失败: {e}，清空缓存")
+            meta = None
+        if not meta or meta.get("model_fingerprint") != self.fingerprint:
+            if meta:
+                logger.info("模型已变化，清空向量缓存")
+            self._reset()
+            return
+
+        self._dtype = self._record_dtype(int(meta["dim"]))
+        try:
+            # 去掉上次写入中断留下的不完整记录
+            size = os.path.getsize(self._data_path)
+            if size % self._dtype.itemsize:
+                os.truncate(self._data_path, size - size % self._dtype.itemsize)
+            self._refresh()
+        except OSError as e:
+            logger.warning(f"读取向量缓存失败: {e}，清空缓存")
+            self._reset()
+            return
+        if len(self._rows) > self.max_entries:
+            logger.info(f"向量缓存条目数 {len(self._rows)} 超过上限 {self.max_entries}，清空缓存")
+            self._reset()
+
+    def _reset(self):
+        self._dtype = None
+        self._records = None
+        self._rows = {}
+        for path in (self._data_path, self._meta_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"删除向量缓存文件失败: {e}")
+
+    def _refresh(self):
+        """文件被其他进程追加或清空后重新映射，只为新增的记录建立索引"""
+        if self._dtype is None:
+            return
+        try:
+            count = os.path.getsize(self._data_path) // self._dtype.itemsize
+        except FileNotFoundError:
+            count = 0
+        indexed = 0 if self._records is None else len(self._records)
+        if count == indexed:
+            return
+        if count < indexed:
+            # 文件被清空后重新写入
+            self._rows = {}
+            indexed = 0
+        self._records = np.memmap(self._data_path, dtype=self._dtype, mode='r', shape=(count,)) if count else None
+        if count:
+            self._rows.update(zip(self._records["key"][indexed:].tolist(), range(indexed, count)))
+
+    def _lookup(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """读取已缓存的向量，有未命中的键时先检查其他进程是否写入了新记录"""
+        if any(key not in self._rows for key in keys):
+            self._refresh()
+        rows = {key: self._rows[key] for key in keys if key in self._rows}
+        if not rows:
+            return {}
+        return dict(zip(rows, self._records["vector"][list(rows.values())]))
+
+    def _append(self, vectors: Dict[bytes, np.ndarray]):
+        """追加新向量，第一次写入时记录模型指纹和向量维度；追加后超过条目数上限时先清空再写入"""
+        dim = len(next(iter(vectors.values())))
+        if self._dtype is not None and self._dtype["vector"].shape[0] != dim:
+            raise ValueError(f"向量维度 {dim} 与缓存维度 {self._dtype['vector'].shape[0]} 不一致")
+
+        self._refresh()
+        keys = [key for key in vectors if key not in self._rows]
+        if not keys:
+            return
+        if len(self._rows) + len(keys) > self.max_entries:
+            logger.info(f"向量缓存条目数将超过上限 {self.max_entries}，清空缓存")
+            self._reset()
+            keys = keys[:self.max_entries]
+            if not keys:
+                return
+        if self._dtype is None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._meta_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"model_fingerprint": self.fingerprint, "dim": dim}, f)
+            os.replace(tmp_path, self._meta_path)
+            self._dtype = self._record_dtype(dim)
+
+        records = np.empty(len(keys), dtype=self._dtype)
+        records["key"] = keys
+        records["vector"] = [vectors[key] for key in keys]
+        # 追加模式下整块写入，多个进程同时追加时记录不会交错
+        with open(self._data_path, 'ab') as f:
+            f.write(records.tobytes())
+        self._refresh()
@@ -0,0 +1,135 @@
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from biz.utils.log import logger
+
+# 可安全重试的请求方法；POST 只在被限流（请求未被处理）时重试
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+# 进程内共享的 Session，按 (pid, host, token, verify) 区分；fork 出的子进程不复用父进程的连接
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """
+    指数退避时间（带抖动）：取 min(cap, base * 2^attempt) 的一半作为固定部分，另一半随机
+    :param attempt: 第几次重试，从 0 开始
+    """
+    base = base if base is not None else float(os.getenv('HTTP_BACKOFF_BASE', 1))
+    cap = cap if cap is not None else float(os.getenv('HTTP_MAX_RETRY_WAIT', 60))
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _parse_retry_after(value: str):
+    """解析 Retry-After 头，支持秒数和 HTTP 日期两种格式"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _rate_limit_wait(response: requests.Response):
+    """
+    被限流时需要等待的秒数，未被限流返回 None。
+    GitHub: 403/429 + X-RateLimit-Remaining: 0 + X-RateLimit-Reset；GitLab: 429 + Retry-After / RateLimit-Reset
+    """
+    headers = response.headers
+    remaining = headers.get('X-RateLimit-Remaining', headers.get('RateLimit-Remaining'))
+    limited = response.status_code == 429 or (response.status_code == 403 and remaining == '0')
+    if not limited:
+        return None
+    wait = _parse_retry_after(headers.get('Retry-After'))
+    if wait is None:
+        reset = headers.get('X-RateLimit-Reset', headers.get('RateLimit-Reset'))
+        if reset and reset.isdigit():
+            wait = max(0.0, int(reset) - time.time())
+    return wait
+
+
+class ApiSession(requests.Session):
+    """
+    带连接池、默认超时和重试策略的 Session：
+    连接错误与 5xx 按指数退避重试（仅幂等方法），被限流时按 Retry-After / 限流重置时间等待后重试
+    """
+
+    def __init__(self, timeout: float, max_retries: int, pool_size: int):
+        super().__init__()
+        self.timeout = timeout
+        self.max_retries = max_retries
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.mount('http://', adapter)
+        self.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        # 显式传入 verify，避免被 REQUESTS_CA_BUNDLE 等环境变量覆盖
+        kwargs.setdefault('verify', self.verify)
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        max_wait = float(os.getenv('HTTP_MAX_RETRY_WAIT', 60))
+        attempt = 0
+        while True:
+            try:
+                response = super().request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warn(f"请求失败 {method} {url}: {e}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                attempt += 1
+                continue
+
+            if attempt >= self.max_retries:
+                return response
+            delay = _rate_limit_wait(response)
+            if delay is not None:
+                if delay > max_wait:
+                    logger.warn(f"请求被限流 {method} {url}，需等待 {delay:.0f} 秒，超过 HTTP_MAX_RETRY_WAIT，不再重试")
+                    return response
+                # 限流重置时间已到但仍返回限流时，至少按退避时间等待
+                delay = max(delay, backoff_delay(attempt))
+            elif idempotent and response.status_code in RETRY_STATUS_CODES:
+                delay = _parse_retry_after(response.headers.get('Retry-After'))
+                delay = min(delay, max_wait) if delay is not None else backoff_delay(attempt)
+            else:
+                return response
+            logger.warn(f"请求返回 {response.status_code} {method} {url}，{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+            response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+def get_session(base_url: str, token: str, verify: bool = True) -> ApiSession:
+    """
+    获取与 (host, token) 绑定的共享 Session，复用 TCP/TLS 连接
+    :param base_url: 服务地址，如 https://gitlab.example.com
+    :param token: 访问令牌，不同令牌使用不同的连接池
+    :param verify: 是否校验证书
+    """
+    parsed = urlparse(base_url or '')
+    key = (os.getpid(), parsed.scheme, parsed.netloc, token, verify)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = ApiSession(timeout=float(os.getenv('HTTP_TIMEOUT', 30)),
+                                 max_retries=int(os.getenv('HTTP_MAX_RETRIES', 3)),
+                                 pool_size=int(os.getenv('HTTP_POOL_SIZE', 10)))
+            session.verify = verify
+            _sessions[key] = session
+        return session
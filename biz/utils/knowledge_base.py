@@ -1,61 +1,106 @@
 import os
 import json
+import multiprocessing
+import threading
+import time
 import uuid
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Dict, Any, Optional, Tuple
 from pathlib import Path
 import hashlib
-import chromadb
-from chromadb.config import Settings
-from sentence_transformers import SentenceTransformer
-import PyPDF2
-from docx import Document
-import markdown
-from bs4 import BeautifulSoup
+import itertools
+from collections import OrderedDict
+import numpy as np
 import requests
 import yaml
+from biz.utils.bm25_index import BM25Index
+from biz.utils.diff_terms import build_diff_queries, extract_diff_terms
+from biz.utils.embedder import get_embedding_model, get_model_fingerprint
+from biz.utils.embedding_cache import EmbeddingCache
+from biz.utils.language_detector import LANGUAGES, detect_language
 from biz.utils.log import logger
-import re
+from biz.utils.text_splitter import TextSplitter
 
 
 class DocumentProcessor:
     """文档处理器，支持多种文档格式"""
     
+    # 按纯文本读取的扩展名
+    TEXT_EXTENSIONS = ['.txt', '.py', '.js', '.java', '.cpp', '.c', '.go']
+    # 支持的全部扩展名
+    SUPPORTED_EXTENSIONS = ['.pdf', '.docx', '.md'] + TEXT_EXTENSIONS
+    # 流式读取文本文件时每次读取的字符数
+    READ_BLOCK_SIZE = 64 * 1024
+    
+    @staticmethod
+    def iter_pdf_pages(file_path: str) -> Iterator[str]:
+        """逐页提取PDF文本"""
+        import PyPDF2
+        
+        with open(file_path, 'rb') as file:
+            reader = PyPDF2.PdfReader(file)
+            for page in reader.pages:
+                yield (page.extract_text() or "") + "\n"
+    
     @staticmethod
-    def extract_text_from_pdf(file_path: str) -> str:
+    def iter_docx_paragraphs(file_path: str) -> Iterator[str]:
+        """逐段提取Word文档文本"""
+        from docx import Document
+        
+        for paragraph in Document(file_path).paragraphs:
+            yield paragraph.text + "\n"
+    
+    @classmethod
+    def iter_text_blocks(cls, file_path: str) -> Iterator[str]:
+        """分块读取文本文件"""
+        with open(file_path, 'r', encoding='utf-8') as file:
+            while True:
+                block = file.read(cls.READ_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+    
+    @classmethod
+    def iter_document(cls, file_path: str) -> Iterator[str]:
+        """
+        根据文件类型流式提取文档文本，依次产出页、段落或文本块，拼接后即完整文本（未去除首尾空白）。
+        与 process_document 不同，读取失败时直接抛出异常
+        """
+        ext = Path(file_path).suffix.lower()
+        
+        if ext == '.pdf':
+            return cls.iter_pdf_pages(file_path)
+        elif ext == '.docx':
+            return cls.iter_docx_paragraphs(file_path)
+        elif ext == '.md' or ext in cls.TEXT_EXTENSIONS:
+            return cls.iter_text_blocks(file_path)
+        else:
+            raise ValueError(f"不支持的文件类型: {ext}")
+    
+    @classmethod
+    def extract_text_from_pdf(cls, file_path: str) -> str:
         """从PDF文件提取文本"""
         try:
-            with open(file_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
-                return text.strip()
+            return "".join(cls.iter_pdf_pages(file_path)).strip()
         except Exception as e:
             logger.error(f"PDF文件处理失败: {e}")
             return ""
     
-    @staticmethod
-    def extract_text_from_docx(file_path: str) -> str:
+    @classmethod
+    def extract_text_from_docx(cls, file_path: str) -> str:
         """从Word文档提取文本"""
         try:
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return text.strip()
+            return "".join(cls.iter_docx_paragraphs(file_path)).strip()
         except Exception as e:
             logger.error(f"Word文档处理失败: {e}")
             return ""
     
     @staticmethod
     def extract_text_from_md(file_path: str) -> str:
-        """从Markdown文件提取文本"""
+        """从Markdown文件提取文本，保留标题和代码块标记，供分割器按章节、代码块切分"""
         try:
             with open(file_path, 'r', encoding='utf-8') as file:
-                md_content = file.read()
-                html = markdown.markdown(md_content)
-                soup = BeautifulSoup(html, 'html.parser')
-                return soup.get_text().strip()
+                return file.read().strip()
         except Exception as e:
             logger.error(f"Markdown文件处理失败: {e}")
             return ""
@@ -81,70 +126,170 @@ class DocumentProcessor:
             return cls.extract_text_from_docx(file_path)
         elif ext == '.md':
             return cls.extract_text_from_md(file_path)
-        elif ext in ['.txt', '.py', '.js', '.java', '.cpp', '.c', '.go']:
+        elif ext in cls.TEXT_EXTENSIONS:
             return cls.extract_text_from_txt(file_path)
         else:
             logger.warning(f"不支持的文件类型: {ext}")
             return ""
 
 
-class TextSplitter:
-    """文本分割器"""
-    
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        self.chunk_size = chunk_size
-        self.chunk_overlap = chunk_overlap
-    
-    def split_text(self, text: str) -> List[str]:
-        """将文本分割成块"""
-        if len(text) <= self.chunk_size:
-            return [text]
-        
-        chunks = []
-        start = 0
-        
-        while start < len(text):
-            end = start + self.chunk_size
-            
-            # 尝试在句子边界分割
-            if end < len(text):
-                # 寻找最近的句号、问号或感叹号
-                sentence_ends = ['.', '?', '!', '\n', '。', '？', '！']
-                for i in range(end, max(start + self.chunk_size - 200, start), -1):
-                    if text[i] in sentence_ends:
-                        end = i + 1
-                        break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - self.chunk_overlap
-            
-        return chunks
+def _lstrip_segments(segments: Iterable[str]) -> Iterator[str]:
+    """去掉片段流开头的空白"""
+    segments = iter(segments)
+    for segment in segments:
+        segment = segment.lstrip()
+        if segment:
+            yield segment
+            break
+    yield from segments
+
+
+def collect_document_files(paths: List[str]) -> List[str]:
+    """展开文件和目录（递归），返回支持的文档文件路径，保持输入顺序并去重"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, file_names in os.walk(path):
+                # 跳过隐藏目录（如 .git）
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                for file_name in sorted(file_names):
+                    if Path(file_name).suffix.lower() in DocumentProcessor.SUPPORTED_EXTENSIONS:
+                        files.append(os.path.join(root, file_name))
+        elif os.path.isfile(path):
+            files.append(path)
+        else:
+            logger.warning(f"文件或目录不存在: {path}")
+    return list(dict.fromkeys(files))
+
+
+# 代码审查时检索知识库使用的查询模板，与 LANGUAGES 中的语言组合成固定的查询集合
+REVIEW_QUERY_TEMPLATES = [
+    "{language} standards coding best practices",  # 基础查询
+    "{language} common pitfalls and solutions",  # 常见问题
+    "{language} security guidelines",  # 安全指南
+    "{language} performance optimization",  # 性能优化
+]
+
+# 模板查询向量的持久化文件，保存在知识库目录下
+QUERY_EMBEDDINGS_FILE = "query_embeddings.json"
+# 知识库版本号文件，知识库内容每次变更时递增，多个进程通过它判断本地缓存是否过期
+KB_VERSION_FILE = "kb_version"
+# 内置文档清单：每个内置文档的内容哈希及其 doc_id，同步时只重新处理内容变化的文档
+BUILTIN_MANIFEST_FILE = "builtin_manifest.json"
+# 向量缓存目录，保存在知识库目录下
+EMBEDDING_CACHE_DIR = "embedding_cache"
+# 倒数排名融合（RRF）的平滑常数，结果在每个排序列表中的得分为 1 / (RRF_K + 名次)
+RRF_K = 60
+# 文档处理流程（文本提取、分块）的版本，流程变化后递增，内置文档会重新处理
+DOCUMENT_PIPELINE_VERSION = 2
+
+
+def _join_chunks(chunks: List[Dict[str, Any]]) -> str:
+    """按顺序拼接文档块；块带有偏移时去掉与上一块重叠的部分"""
+    parts = []
+    previous_end = None
+    for chunk in chunks:
+        content, start, end = chunk['content'], chunk.get('start'), chunk.get('end')
+        if start is not None and previous_end is not None and start < previous_end:
+            content = content[previous_end - start:]
+            if content:
+                parts.append(content)
+        else:
+            if parts:
+                parts.append('\n\n')
+            parts.append(content)
+        previous_end = end if end is not None and start is not None else None
+    return ''.join(parts)
+
+
+def _make_doc_id(title: str, content_head: str) -> str:
+    """文档 ID 由标题和文档前 100 个字符决定"""
+    return hashlib.md5(f"{title}_{content_head[:100]}".encode()).hexdigest()[:8]
+
+
+def _dedupe_by_doc_id(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按 doc_id 去重，保留相似度最高的结果并按相似度排序"""
+    unique_results = {}
+    for result in results:
+        doc_id = result['metadata']['doc_id']
+        if doc_id not in unique_results or result['score'] > unique_results[doc_id]['score']:
+            unique_results[doc_id] = result
+    return sorted(unique_results.values(), key=lambda x: x['score'], reverse=True)
+
+
+def _reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], n_results: int) -> List[Dict[str, Any]]:
+    """
+    倒数排名融合：按块在各个排序列表（每个集合的向量检索、关键词检索）中的 1 / (RRF_K + 名次) 之和排序，
+    同一个块只保留一份，得分相同时按相似度排序
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, result in enumerate(ranking, 1):
+            key = (result['source'], result['metadata']['doc_id'], result['metadata']['chunk_index'])
+            entry = fused.setdefault(key, [0.0, result])
+            entry[0] += 1.0 / (RRF_K + rank)
+    ordered = sorted(fused.values(), key=lambda entry: (entry[0], entry[1]['score']), reverse=True)
+    return [result for _, result in ordered[:n_results]]
 
 
 class KnowledgeBase:
     """知识库管理器"""
-    
+
+    # 进程内共享的知识库实例，按存储路径区分
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, db_path: str = None) -> "KnowledgeBase":
+        """获取共享的知识库实例，首次调用时初始化，之后跨请求、跨任务复用"""
+        db_path = db_path or os.getenv("KNOWLEDGE_BASE_PATH", "data/knowledge_base")
+        instance = cls._instances.get(db_path)
+        if instance is not None:
+            return instance
+        with cls._instances_lock:
+            instance = cls._instances.get(db_path)
+            if instance is None:
+                instance = cls(db_path)
+                cls._instances[db_path] = instance
+            return instance
+
+    @classmethod
+    def reset_instance(cls, db_path: str = None):
+        """丢弃共享实例，下次 get_instance 时重新创建"""
+        db_path = db_path or os.getenv("KNOWLEDGE_BASE_PATH", "data/knowledge_base")
+        with cls._instances_lock:
+            cls._instances.pop(db_path, None)
+
     def __init__(self, db_path: str = "data/knowledge_base"):
         self.db_path = db_path
+        # 写操作（添加、删除、重新加载）互斥
+        self._write_lock = threading.RLock()
+        # doc_id -> 文档信息及其 chunk id 的索引，按集合分别维护，避免每次列出文档都扫描整个集合
+        self._doc_index = {}
+        # 各集合文档块的 BM25 关键词索引，与 doc_id 索引一样增量维护，共用一把锁
+        self._lexical_index = {}
+        self._doc_index_lock = threading.Lock()
+        self.hybrid_search = os.getenv("HYBRID_SEARCH_ENABLED", "1") == "1"
+        # 代码审查检索结果缓存：(语言, 相似度阈值, 知识库版本) -> 结果
+        self._retrieval_cache = {}
+        self._retrieval_cache_lock = threading.Lock()
+        # chromadb 导入较慢，只在创建知识库时导入，文档处理等轻量功能不受影响
+        import chromadb
+        from chromadb.config import Settings
+        
         self.client = chromadb.PersistentClient(
             path=db_path,
             settings=Settings(allow_reset=True)
         )
-        # 使用本地模型路径
-        project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-        model_path = os.path.join(project_root, 'model', 'all-MiniLM-L6-v2')
-        
-        # 检查本地模型是否存在
-        if os.path.exists(model_path):
-            logger.info(f"使用本地模型: {model_path}")
-            self.model = SentenceTransformer(model_path)
-        else:
-            logger.warning(f"本地模型路径不存在: {model_path}, 使用在线模型")
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.text_splitter = TextSplitter()
+        self.model = get_embedding_model()
+        # 按内容哈希缓存块向量，内容相同的块不会重复经过模型
+        self.embedding_cache = EmbeddingCache(os.path.join(db_path, EMBEDDING_CACHE_DIR), get_model_fingerprint()) \
+            if os.getenv("EMBEDDING_CACHE_ENABLED", "1") == "1" else None
+        # 检索查询向量只在内存中按 LRU 缓存，查询文本随变更而变，不写入持久化的向量缓存
+        self._query_embeddings = OrderedDict()
+        self._query_embeddings_lock = threading.Lock()
+        self._review_query_embeddings = self._load_review_query_embeddings()
+        self.text_splitter = TextSplitter(int(os.getenv("CHUNK_SIZE", 1000)), int(os.getenv("CHUNK_OVERLAP", 200)))
         self.doc_processor = DocumentProcessor()
         
         # 创建集合，使用余弦相似度
@@ -162,23 +307,11 @@ class KnowledgeBase:
         # 可以通过环境变量禁用自动初始化
         auto_init = os.getenv("AUTO_INIT_BUILTIN_KNOWLEDGE", "1") == "1"
         if config.get("settings", {}).get("auto_init", True) and auto_init:
-            # 检查内置集合是否为空
+            # 按内容哈希增量同步，内置文档没有变化时几乎没有开销
             try:
-                existing_docs = self.builtin_collection.get(include=["metadatas"])
-                # 更严格的检查：确保真的有文档内容
-                if not existing_docs['metadatas'] or len(existing_docs['metadatas']) == 0:
-                    logger.info("内置知识库为空，开始初始化...")
-                    self._init_builtin_knowledge()
-                else:
-                    # 检查是否有有效的文档（不是空文档）
-                    valid_docs = [doc for doc in existing_docs['metadatas'] if doc.get('title') and doc.get('title').strip()]
-                    if not valid_docs:
-                        logger.info("内置知识库中没有有效文档，开始初始化...")
-                        self._init_builtin_knowledge()
-                    else:
-                        logger.info(f"内置知识库已存在 {len(valid_docs)} 个有效文档，跳过初始化")
+                self.sync_builtin_knowledge(config)
             except Exception as e:
-                logger.warning(f"检查内置知识库状态失败: {e}，跳过自动初始化")
+                logger.warning(f"同步内置知识库失败: {e}，跳过自动初始化")
         else:
             logger.info("自动初始化内置知识库已禁用")
     
@@ -192,6 +325,153 @@ class KnowledgeBase:
                 metadata=metadata
             )
     
+    def _load_review_query_embeddings(self) -> Dict[str, List[float]]:
+        """
+        加载预先计算的模板查询向量（REVIEW_QUERY_TEMPLATES × LANGUAGES）；
+        文件不存在或模型指纹变化时重新计算并保存，稳定运行时代码审查检索不再需要模型推理
+        """
+        file_path = os.path.join(self.db_path, QUERY_EMBEDDINGS_FILE)
+        fingerprint = get_model_fingerprint()
+        queries = [template.format(language=language)
+                   for language in LANGUAGES for template in REVIEW_QUERY_TEMPLATES]
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            embeddings = data.get("embeddings", {})
+            if data.get("model_fingerprint") == fingerprint and all(query in embeddings for query in queries):
+                return embeddings
+            logger.info("模型或查询模板已变化，重新计算模板查询向量")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取模板查询向量失败: {e}，重新计算")
+
+        embeddings = dict(zip(queries, self._encode_texts(queries, persistent=False)))
+        try:
+            os.makedirs(self.db_path, exist_ok=True)
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"model_fingerprint": fingerprint, "embeddings": embeddings}, f)
+            os.replace(tmp_path, file_path)
+            logger.info(f"已保存 {len(embeddings)} 个模板查询向量: {file_path}")
+        except OSError as e:
+            logger.warning(f"保存模板查询向量失败: {e}")
+        return embeddings
+
+    def get_review_query_embeddings(self, language: str) -> Tuple[List[str], List[List[float]]]:
+        """获取某种语言的代码审查检索查询及其向量"""
+        queries = [template.format(language=language) for template in REVIEW_QUERY_TEMPLATES]
+        missing = [query for query in queries if query not in self._review_query_embeddings]
+        if missing:
+            self._review_query_embeddings.update(zip(missing, self._encode_texts(missing, persistent=False)))
+        return queries, [self._review_query_embeddings[query] for query in queries]
+
+    def _select_collections(self, source: str = "all") -> List[tuple]:
+        """按范围选择集合，返回 [(source_name, collection)]"""
+        collections = []
+        if source in ["all", "custom"]:
+            collections.append(("custom", self.custom_collection))
+        if source in ["all", "builtin"]:
+            collections.append(("builtin", self.builtin_collection))
+        return collections
+
+    def get_version(self) -> int:
+        """当前知识库版本号，知识库内容没有变更过时为 0"""
+        try:
+            with open(os.path.join(self.db_path, KB_VERSION_FILE), 'r', encoding='utf-8') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _bump_version(self) -> int:
+        """
+        知识库内容变更后递增版本号。取 max(当前版本 + 1, 当前纳秒时间戳)，
+        多个进程同时变更时也能保持单调递增且基本不会重复
+        """
+        previous = self.get_version()
+        version = max(previous + 1, time.time_ns())
+        os.makedirs(self.db_path, exist_ok=True)
+        file_path = os.path.join(self.db_path, KB_VERSION_FILE)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(str(version))
+        os.replace(tmp_path, file_path)
+        # 本进程的 doc_id 索引、关键词索引已经增量更新，变更前有效的索引在新版本下仍然有效
+        with self._doc_index_lock:
+            for index in itertools.chain(self._doc_index.values(), self._lexical_index.values()):
+                if index["version"] == previous:
+                    index["version"] = version
+        return version
+
+    def _get_doc_index(self, source_name: str, collection) -> Dict[str, Dict[str, Any]]:
+        """
+        获取集合的 doc_id 索引：{doc_id: {doc_id, title, tags, chunk_ids}}。
+        索引在本进程的增删操作中增量维护；知识库版本号变化（其他进程修改了知识库）时重新构建
+        """
+        version = self.get_version()
+        with self._doc_index_lock:
+            index = self._doc_index.get(source_name)
+            if index is not None and index["version"] == version:
+                return index["docs"]
+
+        # 只取元数据构建索引
+        all_data = collection.get(include=["metadatas"])
+        docs = {}
+        for chunk_id, metadata in zip(all_data['ids'], all_data['metadatas']):
+            doc_id = metadata['doc_id']
+            if doc_id not in docs:
+                docs[doc_id] = {
+                    "doc_id": doc_id,
+                    "title": metadata['title'],
+                    "tags": metadata['tags'],
+                    "chunk_ids": []
+                }
+            docs[doc_id]["chunk_ids"].append(chunk_id)
+        with self._doc_index_lock:
+            self._doc_index[source_name] = {"version": version, "docs": docs}
+        return docs
+
+    def _index_add_document(self, source_name: str, doc_id: str, title: str, tags: str, chunk_ids: List[str]):
+        with self._doc_index_lock:
+            index = self._doc_index.get(source_name)
+            if index is None:
+                return
+            index["docs"][doc_id] = {"doc_id": doc_id, "title": title, "tags": tags, "chunk_ids": list(chunk_ids)}
+
+    def _index_remove_document(self, source_name: str, doc_id: str):
+        with self._doc_index_lock:
+            index = self._doc_index.get(source_name)
+            if index is None:
+                return
+            index["docs"].pop(doc_id, None)
+
+    def _get_lexical_index(self, source_name: str, collection) -> BM25Index:
+        """获取集合的 BM25 关键词索引，首次使用或知识库版本号变化时从集合中的块重新构建"""
+        version = self.get_version()
+        with self._doc_index_lock:
+            index = self._lexical_index.get(source_name)
+            if index is not None and index["version"] == version:
+                return index["index"]
+
+        all_data = collection.get(include=["documents"])
+        lexical_index = BM25Index()
+        lexical_index.add(all_data['ids'], all_data['documents'])
+        with self._doc_index_lock:
+            self._lexical_index[source_name] = {"version": version, "index": lexical_index}
+        return lexical_index
+
+    def _lexical_index_add(self, source_name: str, chunk_ids: List[str], chunk_texts: List[str]):
+        with self._doc_index_lock:
+            index = self._lexical_index.get(source_name)
+        if index is not None:
+            index["index"].add(chunk_ids, chunk_texts)
+
+    def _lexical_index_remove(self, source_name: str, chunk_ids: List[str]):
+        with self._doc_index_lock:
+            index = self._lexical_index.get(source_name)
+        if index is not None:
+            index["index"].remove(chunk_ids)
+
     def _load_builtin_config(self) -> Dict[str, Any]:
         """加载内置知识库配置"""
         config_path = "conf/builtin_knowledge.yml"
@@ -205,27 +485,77 @@ class KnowledgeBase:
             logger.error(f"加载配置文件失败: {e}")
             return {"builtin_documents": [], "settings": {"enabled": True}}
     
-    def _init_builtin_knowledge(self):
-        """从配置文件和文档文件初始化内置知识库"""
-        config = self._load_builtin_config()
+    def _load_builtin_manifest(self) -> Dict[str, Any]:
+        """加载内置文档清单，文件不存在或损坏时返回空清单"""
+        try:
+            with open(os.path.join(self.db_path, BUILTIN_MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取内置文档清单失败: {e}，重新同步所有内置文档")
+            return {}
+
+    def _save_builtin_manifest(self, manifest: Dict[str, Any]):
+        os.makedirs(self.db_path, exist_ok=True)
+        file_path = os.path.join(self.db_path, BUILTIN_MANIFEST_FILE)
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, file_path)
+
+    def _builtin_content_hash(self, title: str, file_path: str, tags: List[str]) -> str:
+        """内置文档的内容哈希：文件内容、标题、标签和分块参数任一变化都需要重新分块和向量化"""
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps([title, tags, DOCUMENT_PIPELINE_VERSION, self.text_splitter.chunk_size,
+                                  self.text_splitter.chunk_overlap], ensure_ascii=False).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+
+    def sync_builtin_knowledge(self, config: Dict[str, Any] = None) -> Dict[str, int]:
+        """
+        按内容哈希增量同步内置文档：只重新分块、向量化内容变化或缺失的文档，
+        删除已从配置中移除的文档；模型变化时全部重新向量化。
+        文件暂时缺失、读取或重新加载失败时保留已有的旧版本，内容变化的文档在新版本添加成功后才删除旧版本
+        :return: 各类文档数量 {added, updated, removed, unchanged, failed}
+        """
+        config = config if config is not None else self._load_builtin_config()
+        stats = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0, "failed": 0}
         
         # 检查是否禁用内置知识库
         if not config.get("settings", {}).get("enabled", True):
             logger.info("内置知识库已禁用")
-            return
+            return stats
         
         builtin_docs = config.get("builtin_documents", [])
         if not builtin_docs:
             logger.warning("配置文件中没有找到内置文档配置")
-            return
         
-        # 加载每个内置文档
-        loaded_count = 0
-        for doc_config in builtin_docs:
-            try:
+        with self._write_lock:
+            fingerprint = get_model_fingerprint()
+            manifest = self._load_builtin_manifest()
+            entries = manifest.get("documents", {}) if manifest.get("model_fingerprint") == fingerprint else {}
+            existing_docs = self._get_doc_index("builtin", self.builtin_collection)
+            
+            new_entries = {}
+            pending = []
+            configured_titles = set()
+            
+            def keep_previous(title: str):
+                """加载失败时沿用清单中的旧版本（模型未变化且旧版本仍在集合中）"""
+                stats["failed"] += 1
+                entry = entries.get(title)
+                if entry and entry["doc_id"] in existing_docs:
+                    new_entries[title] = entry
+                    logger.warning(f"保留内置文档的旧版本: {title}")
+            
+            for doc_config in builtin_docs:
                 title = doc_config.get("title", "未知文档")
                 file_path = doc_config.get("file", "")
                 tags = doc_config.get("tags", [])
+                configured_titles.add(title)
                 
                 if not file_path:
                     logger.warning(f"文档 {title} 没有指定文件路径")
@@ -234,33 +564,77 @@ class KnowledgeBase:
                 # 检查文件是否存在
                 if not os.path.exists(file_path):
                     logger.warning(f"文档文件不存在: {file_path}")
+                    keep_previous(title)
                     continue
                 
-                # 读取文档内容
-                content = self.doc_processor.process_document(file_path)
-                if not content.strip():
-                    logger.warning(f"文档 {title} 内容为空")
+                try:
+                    content_hash = self._builtin_content_hash(title, file_path, tags)
+                except OSError as e:
+                    logger.error(f"❌ 读取内置文档失败 {title}: {e}")
+                    keep_previous(title)
                     continue
                 
-                # 添加到知识库
-                self.add_builtin_document(title, content, tags)
-                loaded_count += 1
-                logger.info(f"✅ 成功加载内置文档: {title}")
-                
-            except Exception as e:
-                logger.error(f"❌ 加载内置文档失败 {doc_config.get('title', '未知')}: {e}")
+                entry = entries.get(title)
+                if entry and entry["content_hash"] == content_hash and entry["doc_id"] in existing_docs:
+                    new_entries[title] = entry
+                    stats["unchanged"] += 1
+                else:
+                    pending.append((title, file_path, tags, content_hash, entry is not None))
+            
+            # 删除标题已从配置中移除的文档；模型变化（或没有清单）时旧向量不可再用，且维度可能不同，全部先删除
+            model_changed = manifest.get("model_fingerprint") != fingerprint
+            for doc_id, doc in list(existing_docs.items()):
+                if doc["title"] not in configured_titles:
+                    self.delete_document(doc_id, source="builtin")
+                    stats["removed"] += 1
+                elif model_changed:
+                    self.delete_document(doc_id, source="builtin")
+            
+            for title, file_path, tags, content_hash, updated in pending:
+                try:
+                    # 读取文档内容
+                    content = self.doc_processor.process_document(file_path)
+                    if not content.strip():
+                        logger.warning(f"文档 {title} 内容为空")
+                        keep_previous(title)
+                        continue
+                    
+                    # 新版本与旧版本的 doc_id 相同时（文档开头没有变化）只能先删除旧版本
+                    doc_id = _make_doc_id(title, content)
+                    if doc_id in existing_docs:
+                        self.delete_document(doc_id, source="builtin")
+                    
+                    # 添加到知识库
+                    doc_id = self.add_builtin_document(title, content, tags)
+                    new_entries[title] = {"doc_id": doc_id, "content_hash": content_hash, "file": file_path}
+                    stats["updated" if updated else "added"] += 1
+                    logger.info(f"✅ 成功加载内置文档: {title}")
+                except Exception as e:
+                    logger.error(f"❌ 加载内置文档失败 {title}: {e}")
+                    keep_previous(title)
+            
+            # 新版本添加成功后，删除同一标题不再被清单引用的旧版本（以及没有清单时的历史数据）
+            keep_doc_ids = {entry["doc_id"] for entry in new_entries.values()}
+            for doc_id, doc in list(existing_docs.items()):
+                if doc["title"] in new_entries and doc_id not in keep_doc_ids:
+                    self.delete_document(doc_id, source="builtin")
+            
+            if new_entries != entries or manifest.get("model_fingerprint") != fingerprint:
+                self._save_builtin_manifest({"model_fingerprint": fingerprint, "documents": new_entries})
         
-        logger.info(f"内置知识库初始化完成，成功加载 {loaded_count} 个文档")
+        logger.info(f"内置知识库同步完成: 新增 {stats['added']}，更新 {stats['updated']}，"
+                    f"删除 {stats['removed']}，未变化 {stats['unchanged']}")
+        return stats
+
+    def reload_builtin_knowledge(self) -> Dict[str, int]:
+        """重新同步内置文档（内置文档或配置变更后调用），只处理有变化的文档"""
+        return self.sync_builtin_knowledge()
     
     def add_custom_document(self, title: str, file_path: str, tags: List[str] = None) -> str:
-        """添加自定义文档到知识库"""
+        """添加自定义文档到知识库：边提取边分块、向量化，大文档不会整体读入内存"""
         try:
-            # 处理文档
-            content = self.doc_processor.process_document(file_path)
-            if not content:
-                raise ValueError("文档内容为空")
-            
-            return self._add_document(self.custom_collection, title, content, tags or [], "custom")
+            segments = _lstrip_segments(self.doc_processor.iter_document(file_path))
+            return self._add_document_stream(self.custom_collection, title, segments, tags or [], "custom")
         except Exception as e:
             logger.error(f"添加自定义文档失败: {e}")
             raise
@@ -269,43 +643,238 @@ class KnowledgeBase:
         """添加内置文档到知识库"""
         return self._add_document(self.builtin_collection, title, content, tags or [], "builtin")
     
-    def _add_document(self, collection, title: str, content: str, tags: List[str], source: str) -> str:
-        """内部方法：添加文档到指定集合"""
+    def add_custom_documents(self, file_paths: List[str], tags: List[str] = None, workers: int = None,
+                             on_progress: Callable[[Dict[str, Any]], None] = None,
+                             titles: List[str] = None) -> Dict[str, Any]:
+        """
+        批量添加自定义文档：多进程提取文本，分块累积到 INGEST_BATCH_SIZE 个后统一向量化并一次写入集合
+        :param file_paths: 文档文件路径
+        :param tags: 所有文档共用的标签
+        :param workers: 提取文本的进程数，默认取 INGEST_WORKERS，未配置时为 CPU 核数
+        :param on_progress: 每批写入后回调，参数为当前统计信息
+        :param titles: 与 file_paths 一一对应的标题（如上传时的原文件名），默认使用文件名
+        :return: {total, processed, chunks, elapsed, documents: [{file, title, doc_id}], failed: [file]}
+        """
+        tags = tags or []
+        batch_size = max(1, int(os.getenv("INGEST_BATCH_SIZE", 512)))
+        workers = workers or int(os.getenv("INGEST_WORKERS", 0)) or os.cpu_count() or 1
+        stats = {"total": len(file_paths), "processed": 0, "chunks": 0, "elapsed": 0.0, "documents": [], "failed": []}
+        start_time = time.time()
+        # 待写入的文档：(file_path, title, doc_id, chunk_ids, chunk_texts, chunk_metadatas)
+        pending = []
+        titles = dict(zip(file_paths, titles)) if titles else {}
+        
+        def flush():
+            if not pending:
+                return
+            chunk_ids = [chunk_id for item in pending for chunk_id in item[3]]
+            chunk_texts = [text for item in pending for text in item[4]]
+            chunk_metadatas = [metadata for item in pending for metadata in item[5]]
+            embeddings = self._encode_texts(chunk_texts)
+            with self._write_lock:
+                self._add_chunks(self.custom_collection, chunk_ids, chunk_texts, chunk_metadatas, embeddings)
+                self._lexical_index_add("custom", chunk_ids, chunk_texts)
+                for file_path, title, doc_id, doc_chunk_ids, _, _ in pending:
+                    self._index_add_document("custom", doc_id, title, ",".join(tags), doc_chunk_ids)
+                    stats["documents"].append({"file": file_path, "title": title, "doc_id": doc_id})
+                self._bump_version()
+            pending.clear()
+            
+            stats["chunks"] += len(chunk_ids)
+            stats["elapsed"] = time.time() - start_time
+            logger.info(f"批量导入进度: {stats['processed']}/{stats['total']} 个文件, 已写入 {stats['chunks']} 个块, "
+                        f"{stats['processed'] / stats['elapsed']:.1f} 文件/秒, {stats['chunks'] / stats['elapsed']:.1f} 块/秒")
+            if on_progress is not None:
+                on_progress(dict(stats))
+        
+        pending_doc_ids = set()
+        for file_path, content in self._extract_documents(file_paths, workers):
+            stats["processed"] += 1
+            if not content.strip():
+                logger.warning(f"文档内容为空或格式不支持: {file_path}")
+                stats["failed"].append(file_path)
+                continue
+            
+            title = titles.get(file_path) or os.path.basename(file_path)
+            doc_id, chunk_ids, chunk_texts, chunk_metadatas = self._prepare_chunks(title, content, tags, "custom")
+            if doc_id in pending_doc_ids:
+                logger.warning(f"重复的文档，跳过: {file_path}")
+                continue
+            pending_doc_ids.add(doc_id)
+            pending.append((file_path, title, doc_id, chunk_ids, chunk_texts, chunk_metadatas))
+            if sum(len(item[3]) for item in pending) >= batch_size:
+                flush()
+        flush()
+        
+        stats["elapsed"] = time.time() - start_time
+        logger.info(f"批量导入完成: 成功 {len(stats['documents'])} 个，失败 {len(stats['failed'])} 个，"
+                    f"共 {stats['chunks']} 个块，耗时 {stats['elapsed']:.1f} 秒")
+        return stats
+    
+    @staticmethod
+    def _extract_documents(file_paths: List[str], workers: int) -> Iterator[Tuple[str, str]]:
+        """按输入顺序返回 (file_path, 文本内容)，文件较多时在进程池中并行提取"""
+        if workers <= 1 or len(file_paths) <= 1:
+            for file_path in file_paths:
+                yield file_path, DocumentProcessor.process_document(file_path)
+            return
+        # 调用方进程已加载 Chroma 和模型、有多个线程，fork 出的子进程可能卡在继承来的锁（如日志锁）上，使用 spawn
+        with ProcessPoolExecutor(max_workers=min(workers, len(file_paths)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            yield from zip(file_paths, executor.map(DocumentProcessor.process_document, file_paths, chunksize=4))
+    
+    def _encode_texts(self, texts: List[str], persistent: bool = True) -> List[List[float]]:
+        """
+        按 EMBEDDING_BATCH_SIZE 分批向量化，启用向量缓存时只计算未缓存的文本；
+        persistent 为 False 时不读写持久化的向量缓存（如检索查询）
+        """
+        batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", 64))
+        
+        def encode(batch: List[str]):
+            return self.model.encode(batch, batch_size=batch_size)
+        
+        if self.embedding_cache is None or not persistent:
+            return encode(texts).tolist()
+        return self.embedding_cache.encode(texts, encode).tolist()
+    
+    def _encode_queries(self, queries: List[str]) -> List[List[float]]:
+        """检索查询向量化，最近使用的 QUERY_EMBEDDING_CACHE_SIZE 个查询向量缓存在内存中"""
+        max_size = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 1024))
+        embeddings = {}
+        with self._query_embeddings_lock:
+            for query in queries:
+                if query in self._query_embeddings:
+                    self._query_embeddings.move_to_end(query)
+                    embeddings[query] = self._query_embeddings[query]
+        missing = list(dict.fromkeys(query for query in queries if query not in embeddings))
+        if missing:
+            embeddings.update(zip(missing, self._encode_texts(missing, persistent=False)))
+            with self._query_embeddings_lock:
+                for query in missing:
+                    self._query_embeddings[query] = embeddings[query]
+                while len(self._query_embeddings) > max_size:
+                    self._query_embeddings.popitem(last=False)
+        return [embeddings[query] for query in queries]
+    
+    def _add_chunks(self, collection, chunk_ids: List[str], chunk_texts: List[str],
+                    chunk_metadatas: List[Dict[str, Any]], embeddings: List[List[float]]):
+        """写入文档块，超过 Chroma 单次写入上限时分多次写入"""
+        max_batch_size = getattr(self.client, "max_batch_size", None) or len(chunk_ids) or 1
+        for start in range(0, len(chunk_ids), max_batch_size):
+            end = start + max_batch_size
+            collection.add(
+                ids=chunk_ids[start:end],
+                documents=chunk_texts[start:end],
+                metadatas=chunk_metadatas[start:end],
+                embeddings=embeddings[start:end]
+            )
+    
+    def _prepare_chunks(self, title: str, content: str, tags: List[str],
+                        source: str) -> Tuple[str, List[str], List[str], List[Dict[str, Any]]]:
+        """分割文本，生成 doc_id 以及各个块的 id 和元数据"""
         # 分割文本
-        chunks = self.text_splitter.split_text(content)
+        spans = self.text_splitter.split_offsets(content)
         
         # 生成文档ID
-        doc_id = hashlib.md5(f"{title}_{content[:100]}".encode()).hexdigest()[:8]
+        doc_id = _make_doc_id(title, content)
         
         # 准备数据
         chunk_ids = []
         chunk_texts = []
         chunk_metadatas = []
         
-        for i, chunk in enumerate(chunks):
+        for i, (start, end) in enumerate(spans):
             chunk_id = f"{doc_id}_chunk_{i}"
             chunk_ids.append(chunk_id)
-            chunk_texts.append(chunk)
+            chunk_texts.append(content[start:end])
+            # 记录块在文档中的偏移，拼接完整文档时去掉块之间的重叠
             chunk_metadatas.append({
                 "doc_id": doc_id,
                 "title": title,
                 "chunk_index": i,
+                "start": start,
+                "end": end,
                 "tags": ",".join(tags),
                 "source": source
             })
+        return doc_id, chunk_ids, chunk_texts, chunk_metadatas
+    
+    def _add_document(self, collection, title: str, content: str, tags: List[str], source: str) -> str:
+        """内部方法：添加文档到指定集合"""
+        with self._write_lock:
+            doc_id, chunk_ids, chunk_texts, chunk_metadatas = self._prepare_chunks(title, content, tags, source)
         
-        # 向量化并存储
-        embeddings = self.model.encode(chunk_texts).tolist()
+            # 向量化并存储
+            embeddings = self._encode_texts(chunk_texts)
+            self._add_chunks(collection, chunk_ids, chunk_texts, chunk_metadatas, embeddings)
+            self._lexical_index_add(source, chunk_ids, chunk_texts)
+            self._index_add_document(source, doc_id, title, ",".join(tags), chunk_ids)
+            self._bump_version()
         
-        collection.add(
-            ids=chunk_ids,
-            documents=chunk_texts,
-            metadatas=chunk_metadatas,
-            embeddings=embeddings
-        )
+            logger.info(f"文档已添加: {title}, 分割为 {len(chunk_ids)} 个块")
+            return doc_id
+    
+    def _add_document_stream(self, collection, title: str, segments: Iterable[str], tags: List[str],
+                             source: str) -> str:
+        """
+        内部方法：流式添加文档，segments 拼接后为文档全文。分块结果与 _add_document 相同，
+        每累积 INGEST_BATCH_SIZE 个块向量化并写入一次；中途失败时删除已写入的块
+        """
+        batch_size = max(1, int(os.getenv("INGEST_BATCH_SIZE", 512)))
+        segments = iter(segments)
+        # doc_id 取决于文档前 100 个字符，先读够再开始分块
+        head = []
+        head_length = 0
+        for segment in segments:
+            head.append(segment)
+            head_length += len(segment)
+            if head_length >= 100:
+                break
+        doc_id = _make_doc_id(title, ''.join(head))
         
-        logger.info(f"文档已添加: {title}, 分割为 {len(chunks)} 个块")
-        return doc_id
+        with self._write_lock:
+            chunk_ids = []
+            batch_ids, batch_texts, batch_metadatas = [], [], []
+            
+            def flush():
+                if not batch_ids:
+                    return
+                self._add_chunks(collection, batch_ids, batch_texts, batch_metadatas, self._encode_texts(batch_texts))
+                self._lexical_index_add(source, batch_ids, batch_texts)
+                chunk_ids.extend(batch_ids)
+                batch_ids.clear()
+                batch_texts.clear()
+                batch_metadatas.clear()
+            
+            try:
+                for i, (start, end, text) in enumerate(self.text_splitter.split_stream(itertools.chain(head, segments))):
+                    batch_ids.append(f"{doc_id}_chunk_{i}")
+                    batch_texts.append(text)
+                    batch_metadatas.append({
+                        "doc_id": doc_id,
+                        "title": title,
+                        "chunk_index": i,
+                        "start": start,
+                        "end": end,
+                        "tags": ",".join(tags),
+                        "source": source
+                    })
+                    if len(batch_ids) >= batch_size:
+                        flush()
+                flush()
+            except Exception:
+                if chunk_ids:
+                    collection.delete(ids=chunk_ids)
+                    self._lexical_index_remove(source, chunk_ids)
+                raise
+            if not chunk_ids:
+                raise ValueError("文档内容为空")
+            
+            self._index_add_document(source, doc_id, title, ",".join(tags), chunk_ids)
+            self._bump_version()
+            
+            logger.info(f"文档已添加: {title}, 分割为 {len(chunk_ids)} 个块")
+            return doc_id
     
     def search_relevant_documents(self, query: str, n_results: int = 5, source: str = "all", similarity_threshold: float = 0.0) -> List[Dict[str, Any]]:
         """搜索相关文档
@@ -315,18 +884,33 @@ class KnowledgeBase:
             source: 搜索范围，可选值: all, custom, builtin
             similarity_threshold: 相似度阈值，取值范围[0,1]，只返回相似度大于等于该值的结果
         """
-        query_embedding = self.model.encode([query]).tolist()
-        
-        results = []
-        
-        # 选择搜索的集合
-        collections_to_search = []
-        if source in ["all", "custom"]:
-            collections_to_search.append(("custom", self.custom_collection))
-        if source in ["all", "builtin"]:
-            collections_to_search.append(("builtin", self.builtin_collection))
+        return self.search_relevant_documents_batch([query], n_results, source, similarity_threshold)[0]
+
+    def search_relevant_documents_batch(self, queries: List[str], n_results: int = 5, source: str = "all", similarity_threshold: float = 0.0,
+                                        query_embeddings: List[List[float]] = None) -> List[List[Dict[str, Any]]]:
+        """批量搜索相关文档：所有查询一次向量化，每个集合只发起一次多向量查询；
+        启用混合检索（HYBRID_SEARCH_ENABLED）时同时按 BM25 关键词检索，与向量检索结果做倒数排名融合，
+        关键词检索补充的块同样需要满足相似度阈值
+        Args:
+            queries: 搜索查询列表
+            n_results: 每个查询返回的结果数量
+            source: 搜索范围，可选值: all, custom, builtin
+            similarity_threshold: 相似度阈值，取值范围[0,1]，只返回相似度大于等于该值的结果
+            query_embeddings: 预先计算好的查询向量，传入时不再调用模型
+
+        Returns:
+            List[List[Dict[str, Any]]]: 与 queries 一一对应的结果列表
+        """
+        batch_results = [[] for _ in queries]
+        if not queries:
+            return batch_results
+
+        if query_embeddings is None:
+            query_embeddings = self._encode_queries(queries)
         
-        for source_name, collection in collections_to_search:
+        # 每个查询的排序列表：每个集合的向量检索结果，启用混合检索时还有关键词检索结果
+        batch_rankings = [[] for _ in queries]
+        for source_name, collection in self._select_collections(source):
             try:
                 # 检查集合是否为空
                 collection_count = collection.count()
@@ -338,29 +922,79 @@ class KnowledgeBase:
                 actual_n_results = max(1, min(n_results, collection_count))
                 
                 search_results = collection.query(
-                    query_embeddings=query_embedding,
+                    query_embeddings=query_embeddings,
                     n_results=actual_n_results,
                     include=["documents", "metadatas", "distances"]
                 )
                 
-                if search_results['documents'] and len(search_results['documents'][0]) > 0:
-                    for i in range(len(search_results['documents'][0])):
-                        similarity_score = 1 - search_results['distances'][0][i]  # cosine distance转换为相似度
+                for query_index, documents in enumerate(search_results['documents'] or []):
+                    ranking = []
+                    for i in range(len(documents)):
+                        similarity_score = 1 - search_results['distances'][query_index][i]  # cosine distance转换为相似度
                         # 只添加相似度大于等于阈值的结果
                         if similarity_score >= similarity_threshold:
-                            results.append({
-                                "content": search_results['documents'][0][i],
-                                "metadata": search_results['metadatas'][0][i],
+                            ranking.append({
+                                "content": documents[i],
+                                "metadata": search_results['metadatas'][query_index][i],
                                 "score": similarity_score,
                                 "source": source_name
                             })
+                    batch_rankings[query_index].append(ranking)
+                
+                if self.hybrid_search:
+                    lexical_rankings = self._search_lexical(source_name, collection, queries, query_embeddings,
+                                                            actual_n_results, similarity_threshold)
+                    for rankings, ranking in zip(batch_rankings, lexical_rankings):
+                        rankings.append(ranking)
             except Exception as e:
                 logger.error(f"搜索 {source_name} 集合失败: {e}")
         
+        if self.hybrid_search:
+            return [_reciprocal_rank_fusion(rankings, n_results) for rankings in batch_rankings]
+        
         # 按相似度排序
-        results.sort(key=lambda x: x['score'], reverse=True)
+        for results, rankings in zip(batch_results, batch_rankings):
+            results.extend(result for ranking in rankings for result in ranking)
+            results.sort(key=lambda x: x['score'], reverse=True)
+            del results[n_results:]
         
-        return results[:n_results]
+        return batch_results
+
+    def _search_lexical(self, source_name: str, collection, queries: List[str], query_embeddings: List[List[float]],
+                        n_results: int, similarity_threshold: float) -> List[List[Dict[str, Any]]]:
+        """
+        在集合的 BM25 索引中检索每个查询，命中的块一次性从集合中取出，
+        用保存的向量计算与查询的相似度，返回与 queries 对应的、按 BM25 得分排序的结果
+        """
+        lexical_index = self._get_lexical_index(source_name, collection)
+        batch_hits = [lexical_index.search(query, n_results) for query in queries]
+        hit_ids = sorted({chunk_id for hits in batch_hits for chunk_id, _ in hits})
+        if not hit_ids:
+            return [[] for _ in queries]
+        
+        chunks = collection.get(ids=hit_ids, include=["documents", "metadatas", "embeddings"])
+        chunks_by_id = {chunk_id: (document, metadata, embedding) for chunk_id, document, metadata, embedding
+                        in zip(chunks['ids'], chunks['documents'], chunks['metadatas'], chunks['embeddings'])}
+        batch_results = []
+        for hits, query_embedding in zip(batch_hits, query_embeddings):
+            results = []
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            for chunk_id, _ in hits:
+                if chunk_id not in chunks_by_id:
+                    continue
+                document, metadata, embedding = chunks_by_id[chunk_id]
+                chunk_vector = np.asarray(embedding, dtype=np.float32)
+                similarity_score = float(query_vector @ chunk_vector /
+                                         max(np.linalg.norm(query_vector) * np.linalg.norm(chunk_vector), 1e-12))
+                if similarity_score >= similarity_threshold:
+                    results.append({
+                        "content": document,
+                        "metadata": metadata,
+                        "score": similarity_score,
+                        "source": source_name
+                    })
+            batch_results.append(results)
+        return batch_results
     
     def search_relevant_documents_with_full_docs(self, query: str, n_results: int = 5, source: str = "all", similarity_threshold: float = 0.2) -> List[Dict[str, Any]]:
         """搜索相关文档，当文档块相似度大于阈值时返回完整文档
@@ -374,52 +1008,98 @@ class KnowledgeBase:
         Returns:
             List[Dict[str, Any]]: 相关文档列表，包含完整文档内容
         """
-        query_embedding = self.model.encode([query]).tolist()
-        
+        return self.search_relevant_documents_with_full_docs_batch([query], n_results, source, similarity_threshold)[0]
+
+    def search_relevant_documents_with_full_docs_batch(self, queries: List[str], n_results: int = 5, source: str = "all", similarity_threshold: float = 0.2,
+                                                       query_embeddings: List[List[float]] = None) -> List[List[Dict[str, Any]]]:
+        """批量搜索相关文档并返回完整文档，所有查询命中的文档合并后每个集合只获取一次
+
+        Returns:
+            List[List[Dict[str, Any]]]: 与 queries 一一对应的结果列表
+        """
         # 先进行常规搜索获取相关chunk
-        chunk_results = self.search_relevant_documents(query, n_results * 3, source, similarity_threshold)
+        batch_chunk_results = self.search_relevant_documents_batch(queries, n_results * 3, source, similarity_threshold, query_embeddings)
         
         # 收集需要获取完整文档的doc_id
         doc_ids_to_fetch = set()
-        for result in chunk_results:
-            if result['score'] >= similarity_threshold:
-                doc_id = result['metadata']['doc_id']
-                doc_ids_to_fetch.add(doc_id)
+        for chunk_results in batch_chunk_results:
+            for result in chunk_results:
+                if result['score'] >= similarity_threshold:
+                    doc_ids_to_fetch.add(result['metadata']['doc_id'])
         
-        # 获取完整文档内容
-        full_docs = {}
-        collections_to_search = []
-        if source in ["all", "custom"]:
-            collections_to_search.append(("custom", self.custom_collection))
-        if source in ["all", "builtin"]:
-            collections_to_search.append(("builtin", self.builtin_collection))
+        full_docs = self._fetch_full_documents(doc_ids_to_fetch, source)
         
-        for source_name, collection in collections_to_search:
+        # 构建最终结果
+        batch_results = []
+        for chunk_results in batch_chunk_results:
+            results = []
+            used_doc_ids = set()
+            for result in chunk_results:
+                doc_id = result['metadata']['doc_id']
+                if doc_id in used_doc_ids:
+                    # 同一文档的其他块已经以完整文档返回，避免重复
+                    continue
+                if doc_id in full_docs:
+                    # 使用完整文档内容
+                    full_doc = full_docs[doc_id]
+                    results.append({
+                        "content": full_doc['content'],
+                        "metadata": {
+                            "doc_id": doc_id,
+                            "title": full_doc['title'],
+                            "tags": full_doc['tags'],
+                            "source": full_doc['source'],
+                            "chunk_count": full_doc['chunk_count'],
+                            "is_full_document": True
+                        },
+                        "score": result['score'],
+                        "source": full_doc['source']
+                    })
+                    used_doc_ids.add(doc_id)
+                else:
+                    # 使用原始chunk内容
+                    results.append(result)
+            
+            # 保持检索结果的顺序（相似度或融合排名），限制结果数量
+            batch_results.append(results[:n_results])
+        return batch_results
+
+    def _fetch_full_documents(self, doc_ids: set, source: str = "all") -> Dict[str, Dict[str, Any]]:
+        """按 doc_id 获取完整文档（按块顺序拼接），返回 {doc_id: 文档信息}"""
+        full_docs = {}
+        if not doc_ids:
+            return full_docs
+
+        for source_name, collection in self._select_collections(source):
             try:
-                # 获取集合中所有数据
-                all_data = collection.get(include=["documents", "metadatas"])
+                # 只获取命中文档的块
+                all_data = collection.get(
+                    where={"doc_id": {"$in": sorted(doc_ids)}},
+                    include=["documents", "metadatas"]
+                )
                 
                 # 按doc_id分组
                 doc_chunks = {}
                 for i, metadata in enumerate(all_data['metadatas']):
                     doc_id = metadata['doc_id']
-                    if doc_id in doc_ids_to_fetch:
-                        if doc_id not in doc_chunks:
-                            doc_chunks[doc_id] = {
-                                'title': metadata['title'],
-                                'chunks': [],
-                                'source': source_name,
-                                'tags': metadata['tags']
-                            }
-                        doc_chunks[doc_id]['chunks'].append({
-                            'content': all_data['documents'][i],
-                            'chunk_index': metadata['chunk_index']
-                        })
+                    if doc_id not in doc_chunks:
+                        doc_chunks[doc_id] = {
+                            'title': metadata['title'],
+                            'chunks': [],
+                            'source': source_name,
+                            'tags': metadata['tags']
+                        }
+                    doc_chunks[doc_id]['chunks'].append({
+                        'content': all_data['documents'][i],
+                        'chunk_index': metadata['chunk_index'],
+                        'start': metadata.get('start'),
+                        'end': metadata.get('end')
+                    })
                 
                 # 合并chunk并按索引排序
                 for doc_id, doc_info in doc_chunks.items():
                     doc_info['chunks'].sort(key=lambda x: x['chunk_index'])
-                    full_content = '\n\n'.join([chunk['content'] for chunk in doc_info['chunks']])
+                    full_content = _join_chunks(doc_info['chunks'])
                     full_docs[doc_id] = {
                         'title': doc_info['title'],
                         'content': full_content,
@@ -430,205 +1110,112 @@ class KnowledgeBase:
                     
             except Exception as e:
                 logger.error(f"获取 {source_name} 完整文档失败: {e}")
-        
-        # 构建最终结果
-        results = []
-        for result in chunk_results:
-            doc_id = result['metadata']['doc_id']
-            if doc_id in full_docs:
-                # 使用完整文档内容
-                results.append({
-                    "content": full_docs[doc_id]['content'],
-                    "metadata": {
-                        "doc_id": doc_id,
-                        "title": full_docs[doc_id]['title'],
-                        "tags": full_docs[doc_id]['tags'],
-                        "source": full_docs[doc_id]['source'],
-                        "chunk_count": full_docs[doc_id]['chunk_count'],
-                        "is_full_document": True
-                    },
-                    "score": result['score'],
-                    "source": full_docs[doc_id]['source']
-                })
-                # 从full_docs中移除，避免重复
-                del full_docs[doc_id]
-            else:
-                # 使用原始chunk内容
-                results.append(result)
-        
-        # 按相似度排序并限制结果数量
-        results.sort(key=lambda x: x['score'], reverse=True)
-        return results[:n_results]
+        return full_docs
     
-    def get_knowledge_for_code_review(self, code_content: str, similarity_threshold: float = 0.2) -> List[Dict[str, Any]]:
+    def get_knowledge_for_code_review(self, code_content: str, similarity_threshold: float = 0.2,
+                                      languages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """获取代码审查相关的知识文档
         
         Args:
             code_content: 代码内容
             similarity_threshold: 相似度阈值，当文档块相似度大于该值时返回完整文档
+            languages: 变更涉及的语言（按文件扩展名标注），为空时从代码内容中检测主要语言
             
         Returns:
             List[Dict[str, Any]]: 相关文档列表
         """
-        # 定义语言特征规则
-        language_patterns = {
-            "python": {
-                "keywords": [
-                    (r"\bdef\s+\w+\s*\(", 3),  # 函数定义
-                    (r"\bclass\s+\w+[:\(]", 3),  # 类定义
-                    (r"\bimport\s+[\w\s,]+", 2),  # import语句
-                    (r"from\s+[\w\.]+\s+import", 2),  # from import语句
-                    (r"@\w+", 1),  # 装饰器
-                    (r":\s*$", 1),  # 代码块开始
-                    (r"__\w+__", 1),  # 魔术方法
-                    (r"self\.", 1),  # self引用
-                ],
-                "libraries": ["django", "flask", "requests", "numpy", "pandas", "tensorflow", "pytorch"]
-            },
-            "javascript": {
-                "keywords": [
-                    (r"\bconst\s+\w+\s*=", 3),  # const声明
-                    (r"\blet\s+\w+\s*=", 3),  # let声明
-                    (r"=>\s*{", 2),  # 箭头函数
-                    (r"\bfunction\s+\w+\s*\(", 2),  # 函数声明
-                    (r"\bimport\s+.*\bfrom\b", 2),  # ES6 import
-                    (r"\bexport\s+", 1),  # export语句
-                    (r"\bawait\b", 1),  # async/await
-                ],
-                "libraries": ["react", "vue", "angular", "express", "node", "axios"]
-            },
-            "java": {
-                "keywords": [
-                    (r"\bclass\s+\w+", 3),  # 类定义
-                    (r"\bpublic\s+|private\s+|protected\s+", 2),  # 访问修饰符
-                    (r"@\w+", 2),  # 注解
-                    (r"\binterface\s+\w+", 2),  # 接口定义
-                    (r"\bextends\s+|\bimplements\s+", 1),  # 继承和实现
-                ],
-                "libraries": ["spring", "hibernate", "mybatis", "junit"]
-            },
-            "go": {
-                "keywords": [
-                    (r"\bfunc\s+\w+\s*\(", 3),  # 函数定义
-                    (r"\btype\s+\w+\s+struct\b", 3),  # 结构体定义
-                    (r"\bpackage\s+\w+", 2),  # 包声明
-                    (r"\binterface\s*{", 2),  # 接口定义
-                    (r"\bgo\s+", 1),  # goroutine
-                ],
-                "libraries": ["gin", "gorm", "echo"]
-            },
-            "cpp": {
-                "keywords": [
-                    (r"#include\s+[<\"][\w\.]+[>\"]", 3),  # include语句
-                    (r"\bclass\s+\w+", 3),  # 类定义
-                    (r"\btemplate\s*<", 2),  # 模板
-                    (r"::\s*", 1),  # 作用域解析
-                ],
-                "libraries": ["boost", "qt", "opencv"]
-            },
-            "html": {
-                "keywords": [
-                    (r"<\w+[^>]*>", 2),  # HTML标签
-                    (r"</\w+>", 1),  # 结束标签
-                    (r"\bclass\s*=\s*[\"']", 1),  # class属性
-                ],
-                "libraries": []
-            },
-            "css": {
-                "keywords": [
-                    (r"{\s*[\w\-]+\s*:", 2),  # 规则块
-                    (r"@media\b", 2),  # 媒体查询
-                    (r"#[\w\-]+\s*{", 1),  # ID选择器
-                ],
-                "libraries": []
-            }
-        }
-        
-        # 检测代码语言特征
-        language_scores = {}
-        for lang, patterns in language_patterns.items():
-            score = 0
-            # 检查关键字模式
-            for pattern, weight in patterns["keywords"]:
-                matches = len(re.findall(pattern, code_content))
-                score += matches * weight
-            
-            # 检查常用库
-            for lib in patterns["libraries"]:
-                if lib in code_content.lower():
-                    score += 2
-            
-            if score > 0:
-                language_scores[lang] = score
-                logger.info(f"\n--------{lang} score: {score}--------")
-        
-        # 确定主要语言 - 选择得分最高的语言
-        primary_language = None
-        if language_scores:
-            primary_language = max(language_scores.items(), key=lambda x: x[1])[0]
+        if not languages:
+            primary_language = detect_language(code_content)
+            languages = [primary_language] if primary_language else []
+        languages = list(dict.fromkeys(languages))
         
-        logger.info(f"\n--------Primary language: {primary_language}--------")
+        logger.info(f"代码审查检索语言: {languages}")
         
         # 如果没有检测到任何语言特征，返回空列表
-        if not primary_language:
+        if not languages:
             logger.info("No language features detected")
             return []
         
-        # 构建多个搜索查询
-        search_queries = [
-            f"{primary_language} standards coding best practices",  # 基础查询
-            f"{primary_language} common pitfalls and solutions",  # 常见问题
-            f"{primary_language} security guidelines",  # 安全指南
-            f"{primary_language} performance optimization"  # 性能优化
-        ]
-        
-        # 合并多个查询的结果，使用新的完整文档检索方法
-        all_results = []
-        for query in search_queries:
-            results = self.search_relevant_documents_with_full_docs(query, n_results=2, source='all', similarity_threshold=similarity_threshold)
-            all_results.extend(results)
-        
-        # 去重并保留相似度最高的结果
-        unique_results = {}
-        for result in all_results:
-            doc_id = result['metadata']['doc_id']
-            if doc_id not in unique_results or result['score'] > unique_results[doc_id]['score']:
-                unique_results[doc_id] = result
+        # 检索结果只取决于语言、阈值和知识库内容，按语言分别缓存，知识库没有变更时直接复用
+        version = self.get_version()
+        language_results = {}
+        with self._retrieval_cache_lock:
+            for language in languages:
+                cached_results = self._retrieval_cache.get((language, similarity_threshold, version))
+                if cached_results is not None:
+                    language_results[language] = cached_results
+        if language_results:
+            logger.info(f"命中知识检索缓存: {list(language_results)}, 阈值 {similarity_threshold}, 版本 {version}")
         
-        # 按相似度排序
-        sorted_results = sorted(unique_results.values(), key=lambda x: x['score'], reverse=True)
+        missing = [language for language in languages if language not in language_results]
+        if missing:
+            # 未命中缓存的语言，查询合并在一起：一次检索每个集合，向量使用预先计算好的模板查询向量
+            search_queries, query_embeddings, query_languages = [], [], []
+            for language in missing:
+                queries, embeddings = self.get_review_query_embeddings(language)
+                search_queries.extend(queries)
+                query_embeddings.extend(embeddings)
+                query_languages.extend([language] * len(queries))
+            
+            missing_results = {language: [] for language in missing}
+            batch_results = self.search_relevant_documents_with_full_docs_batch(
+                search_queries, n_results=2, source='all', similarity_threshold=similarity_threshold,
+                query_embeddings=query_embeddings)
+            for language, results in zip(query_languages, batch_results):
+                missing_results[language].extend(results)
+            
+            with self._retrieval_cache_lock:
+                # 只保留当前版本的缓存
+                self._retrieval_cache = {key: value for key, value in self._retrieval_cache.items() if key[2] == version}
+                for language, results in missing_results.items():
+                    language_results[language] = _dedupe_by_doc_id(results)
+                    self._retrieval_cache[(language, similarity_threshold, version)] = language_results[language]
         
-        return sorted_results
+        # 多语言 MR 合并各语言的结果，去重并保留相似度最高的结果
+        return _dedupe_by_doc_id([result for language in languages for result in language_results[language]])
+    
+    def get_knowledge_for_diff(self, diff_text: str, similarity_threshold: float = 0.2,
+                               languages: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """按 diff 新增代码中的导入、调用和标识符检索知识库，返回文档块而不是完整文档
+        
+        Args:
+            diff_text: diff 文本
+            similarity_threshold: 相似度阈值
+            languages: 变更涉及的语言，第一个语言加在查询前，为空时从 diff 中检测
+            
+        Returns:
+            List[Dict[str, Any]]: 按融合排名排序的文档块，没有提取到检索词时返回空列表；
+            不做 token 预算，由调用方按顺序打包（knowledge_packer.pack_knowledge）
+        """
+        terms = extract_diff_terms(diff_text, int(os.getenv("RAG_DIFF_QUERY_TERMS", 8)))
+        language = languages[0] if languages else detect_language(diff_text)
+        queries = build_diff_queries(terms, language)
+        if not queries:
+            logger.info("变更中没有提取到检索词")
+            return []
+        logger.info(f"按变更检索知识: {queries}")
+        
+        # 所有查询一次批量检索，各查询的结果再做一次倒数排名融合，被多个查询命中的块排在前面
+        n_results = int(os.getenv("SEARCH_RESULTS_LIMIT", 5))
+        batch_results = self.search_relevant_documents_batch(queries, n_results, 'all', similarity_threshold)
+        results = _reciprocal_rank_fusion(batch_results, n_results * len(queries))
+        logger.info(f"按变更检索到 {len(results)} 个文档块")
+        return results
     
     def list_documents(self, source: str = "all") -> List[Dict[str, Any]]:
         """列出所有文档"""
         docs = []
         
-        collections_to_list = []
-        if source in ["all", "custom"]:
-            collections_to_list.append(("custom", self.custom_collection))
-        if source in ["all", "builtin"]:
-            collections_to_list.append(("builtin", self.builtin_collection))
-        
-        for source_name, collection in collections_to_list:
+        for source_name, collection in self._select_collections(source):
             try:
-                all_data = collection.get(include=["metadatas"])
-                
-                # 按文档分组
-                doc_groups = {}
-                for metadata in all_data['metadatas']:
-                    doc_id = metadata['doc_id']
-                    if doc_id not in doc_groups:
-                        doc_groups[doc_id] = {
-                            "doc_id": doc_id,
-                            "title": metadata['title'],
-                            "tags": metadata['tags'].split(',') if metadata['tags'] else [],
-                            "source": source_name,
-                            "chunk_count": 0
-                        }
-                    doc_groups[doc_id]['chunk_count'] += 1
-                
-                docs.extend(list(doc_groups.values()))
+                for doc in self._get_doc_index(source_name, collection).values():
+                    docs.append({
+                        "doc_id": doc['doc_id'],
+                        "title": doc['title'],
+                        "tags": doc['tags'].split(',') if doc['tags'] else [],
+                        "source": source_name,
+                        "chunk_count": len(doc['chunk_ids'])
+                    })
             except Exception as e:
                 logger.error(f"列出 {source_name} 文档失败: {e}")
         
@@ -636,39 +1223,48 @@ class KnowledgeBase:
     
     def delete_document(self, doc_id: str, source: str = "custom"):
         """删除文档"""
+        source_name = "custom" if source == "custom" else "builtin"
         collection = self.custom_collection if source == "custom" else self.builtin_collection
         
-        try:
-            # 获取该文档的所有chunk
-            all_data = collection.get(include=["metadatas", "documents"])
-            chunk_ids_to_delete = []
-            
-            # 遍历所有元数据，找到匹配的文档ID
-            for i, metadata in enumerate(all_data['metadatas']):
-                if metadata.get('doc_id') == doc_id:
-                    chunk_ids_to_delete.append(all_data['ids'][i])
+        with self._write_lock:
+            try:
+                # 按 doc_id 过滤，只获取该文档所有chunk的ID
+                chunk_ids_to_delete = collection.get(where={"doc_id": doc_id}, include=[])['ids']
             
-            if chunk_ids_to_delete:
-                # 删除所有相关的块
-                collection.delete(ids=chunk_ids_to_delete)
-                logger.info(f"已删除文档 {doc_id}，共 {len(chunk_ids_to_delete)} 个块")
-            else:
-                logger.warning(f"未找到文档 {doc_id}")
-        except Exception as e:
-            logger.error(f"删除文档失败: {e}")
-            raise
+                if chunk_ids_to_delete:
+                    # 删除所有相关的块
+                    collection.delete(ids=chunk_ids_to_delete)
+                    self._index_remove_document(source_name, doc_id)
+                    self._lexical_index_remove(source_name, chunk_ids_to_delete)
+                    self._bump_version()
+                    logger.info(f"已删除文档 {doc_id}，共 {len(chunk_ids_to_delete)} 个块")
+                else:
+                    logger.warning(f"未找到文档 {doc_id}")
+            except Exception as e:
+                logger.error(f"删除文档失败: {e}")
+                raise
 
     def clear_builtin_collection(self):
         """清空内置文档集合"""
-        try:
-            # 获取所有文档
-            all_data = self.builtin_collection.get(include=["metadatas"])
-            if all_data and all_data['metadatas']:
-                # 获取所有文档块的ID
-                chunk_ids = all_data['ids']
-                # 删除所有文档
-                self.builtin_collection.delete(ids=chunk_ids)
-                logger.info(f"已清空内置文档集合，共删除 {len(chunk_ids)} 个文档块")
-        except Exception as e:
-            logger.error(f"清空内置文档集合失败: {e}")
-            raise
\ No newline at end of file
+        with self._write_lock:
+            try:
+                # 获取所有文档
+                all_data = self.builtin_collection.get(include=[])
+                if all_data and all_data['ids']:
+                    # 获取所有文档块的ID
+                    chunk_ids = all_data['ids']
+                    # 删除所有文档
+                    self.builtin_collection.delete(ids=chunk_ids)
+                    logger.info(f"已清空内置文档集合，共删除 {len(chunk_ids)} 个文档块")
+                with self._doc_index_lock:
+                    self._doc_index["builtin"] = {"version": self.get_version(), "docs": {}}
+                    self._lexical_index["builtin"] = {"version": self.get_version(), "index": BM25Index()}
+                # 清单随集合一起清空，下次同步时重新加载所有内置文档
+                try:
+                    os.remove(os.path.join(self.db_path, BUILTIN_MANIFEST_FILE))
+                except FileNotFoundError:
+                    pass
+                self._bump_version()
+            except Exception as e:
+                logger.error(f"清空内置文档集合失败: {e}")
+                raise
\ No newline at end of file
@@ -0,0 +1,101 @@
+import re
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from biz.utils.bm25_index import tokenize
+from biz.utils.token_util import count_tokens, count_tokens_cached
+
+# 文档之间、章节之间的分隔
+SEPARATOR = "\n\n"
+# 按 Markdown 标题切分章节，章节本身超出预算时再按空行切分为段落
+_HEADING_PATTERN = re.compile(r"^(?=#{1,6}\s)", re.MULTILINE)
+_PARAGRAPH_PATTERN = re.compile(r"\n\s*\n")
+
+TokenCounter = Callable[[str], int]
+
+
+def format_knowledge_header(doc: Dict[str, Any], partial: bool = False) -> str:
+    """文档标题行，完整文档标注 [完整文档]，只保留部分章节时标注 [节选]"""
+    metadata = doc['metadata']
+    if partial:
+        mark = ' [节选]'
+    else:
+        mark = ' [完整文档]' if metadata.get('is_full_document', False) else ''
+    return f"### {metadata['title']} (相似度: {doc['score']:.2f}){mark}"
+
+
+def split_sections(content: str, max_tokens: int, counter: TokenCounter = count_tokens_cached) -> List[str]:
+    """按标题切分章节，超过 max_tokens 的章节再按段落切分"""
+    sections = []
+    for section in _HEADING_PATTERN.split(content):
+        section = section.strip()
+        if not section:
+            continue
+        if counter(section) <= max_tokens:
+            sections.append(section)
+        else:
+            sections.extend(paragraph.strip() for paragraph in _PARAGRAPH_PATTERN.split(section) if paragraph.strip())
+    return sections
+
+
+def _select_sections(content: str, max_tokens: int, query_terms: Set[str],
+                     counter: TokenCounter) -> Tuple[List[str], int]:
+    """
+    在预算内挑选与查询共有词最多的章节，共有词相同时靠前的章节优先
+    :return: (按原文顺序的章节, 章节及其间分隔的 token 数)
+    """
+    sections = split_sections(content, max_tokens, counter)
+    ranked = sorted(range(len(sections)), key=lambda i: -len(query_terms.intersection(tokenize(sections[i]))))
+    separator_tokens = counter(SEPARATOR)
+    chosen, used_tokens = set(), 0
+    for i in ranked:
+        cost = counter(sections[i]) + (separator_tokens if chosen else 0)
+        if used_tokens + cost <= max_tokens:
+            chosen.add(i)
+            used_tokens += cost
+    return [sections[i] for i in sorted(chosen)], used_tokens
+
+
+def pack_knowledge(docs: List[Dict[str, Any]], max_tokens: int, query: str = "",
+                   counter: TokenCounter = count_tokens_cached,
+                   header_counter: TokenCounter = count_tokens) -> Tuple[str, Dict[str, int]]:
+    """
+    把检索结果按给定的顺序（检索排名）贪心地放入 max_tokens 的预算：放得下的文档整体保留，
+    放不下的文档只保留与 query（代码变更）最相关的章节，一个章节也放不下时丢弃
+    :param docs: 检索结果，包含 content、metadata（title、is_full_document）、score
+    :param max_tokens: 知识文档的 token 预算
+    :param query: 用于挑选章节的文本
+    :param counter: 文档内容的 token 计数函数，同一文档在多次审查中反复出现，默认带缓存
+    :param header_counter: 标题行的 token 计数函数，标题含相似度，每次都不同，默认不缓存
+    :return: (拼接后的知识文本, 统计：文档数、完整保留、节选、丢弃的文档数，候选、使用、裁剪的 token 数)
+    """
+    report = {"budget": max_tokens, "documents": len(docs), "full": 0, "partial": 0, "dropped": 0,
+              "candidate_tokens": 0, "used_tokens": 0, "trimmed_tokens": 0}
+    query_terms = set(tokenize(query)) if query else set()
+    separator_tokens = counter(SEPARATOR)
+    entries, used_tokens = [], 0
+    for doc in docs:
+        header = format_knowledge_header(doc)
+        tokens = header_counter(header + "\n") + counter(doc['content'])
+        report["candidate_tokens"] += tokens
+        separator_cost = separator_tokens if entries else 0
+        if used_tokens + separator_cost + tokens <= max_tokens:
+            entries.append(f"{header}\n{doc['content']}")
+            used_tokens += separator_cost + tokens
+            report["full"] += 1
+            continue
+
+        header = format_knowledge_header(doc, partial=True)
+        header_tokens = header_counter(header + "\n")
+        remaining = max_tokens - used_tokens - separator_cost - header_tokens
+        sections, section_tokens = _select_sections(doc['content'], remaining, query_terms, counter) \
+            if remaining > 0 else ([], 0)
+        if sections:
+            entries.append(f"{header}\n{SEPARATOR.join(sections)}")
+            used_tokens += separator_cost + header_tokens + section_tokens
+            report["partial"] += 1
+            continue
+        report["dropped"] += 1
+
+    report["used_tokens"] = used_tokens
+    report["trimmed_tokens"] = max(0, report["candidate_tokens"] - used_tokens)
+    return SEPARATOR.join(entries), report
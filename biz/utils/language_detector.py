@@ -0,0 +1,162 @@
+import os
+import re
+from collections import Counter
+from typing import Dict, List, Optional
+
+# 支持检索知识库的语言，与知识库中的查询模板组合成固定的查询集合
+LANGUAGES = ["python", "javascript", "java", "go", "cpp", "html", "css"]
+
+# 文件扩展名 -> 语言，变更列表中有文件路径时优先使用
+EXTENSION_LANGUAGES = {
+    ".py": "python", ".pyi": "python",
+    ".js": "javascript", ".jsx": "javascript", ".mjs": "javascript", ".cjs": "javascript",
+    ".ts": "javascript", ".tsx": "javascript", ".vue": "javascript",
+    ".java": "java",
+    ".go": "go",
+    ".c": "cpp", ".cc": "cpp", ".cpp": "cpp", ".cxx": "cpp", ".h": "cpp", ".hpp": "cpp",
+    ".html": "html", ".htm": "html",
+    ".css": "css", ".scss": "css", ".less": "css",
+}
+
+# 语言特征：(前缀字面量, 后续正则, {语言: 权重})。所有特征合并为一个正则，只扫描一遍文本。
+# 每个分支都以字面字符开头，编译后的正则可以先按首字符快速跳过不可能匹配的位置；
+# 以单词字符开头的前缀要求前面是单词边界。同一位置只会命中排在前面的特征，因此更具体的特征要放在前面，
+# 后续部分尽量用前瞻判断而不消耗文本，避免吞掉后面还能命中其他特征的文本
+LANGUAGE_FEATURES = [
+    # Python
+    ("def", r"\s+(?=\w+\s*\()", {"python": 3}),
+    ("class", r"\s+(?=\w+\s*(?:\(|:\s*$))", {"python": 3}),
+    ("from", r"\s+(?=[\w.]+\s+import\b)", {"python": 2}),
+    ("self", r"\.", {"python": 1}),
+    ("__", r"\w+__", {"python": 1}),
+    # JavaScript / TypeScript
+    ("import", r"\s+(?=[^\n]*\bfrom\s+['\"])", {"javascript": 2}),
+    ("const", r"\s+(?=\w+\s*=)", {"javascript": 3}),
+    ("let", r"\s+(?=\w+\s*=)", {"javascript": 3}),
+    ("=>", r"\s*\{", {"javascript": 2}),
+    ("function", r"\s+(?=\w+\s*\()", {"javascript": 2}),
+    ("export", r"\s+", {"javascript": 1}),
+    ("await", r"\b", {"javascript": 1}),
+    # Go
+    ("func", r"\s+(?=(?:\([^)]*\)\s*)?\w+\s*\()", {"go": 3}),
+    ("type", r"\s+(?=\w+\s+struct\b)", {"go": 3}),
+    ("package", r"\s+(?=\w+\s*$)", {"go": 2}),
+    ("interface", r"\s*\{", {"go": 2}),
+    ("go", r"\s+(?=\w+\()", {"go": 1}),
+    # C / C++
+    ("#include", r"\s*[<\"][\w./]+[>\"]", {"cpp": 3}),
+    ("template", r"\s*<", {"cpp": 2}),
+    ("::", r"(?<=\w::)(?=\w)", {"cpp": 1}),
+    # Java（class 定义在 Java 和 C++ 中写法相同）
+    ("class", r"\s+(?=\w)", {"java": 3, "cpp": 3}),
+    ("import", r"\s+(?=[\w.]+)", {"python": 2, "java": 1}),
+    ("public", r"\s+", {"java": 2}),
+    ("private", r"\s+", {"java": 2}),
+    ("protected", r"\s+", {"java": 2}),
+    ("interface", r"\s+(?=\w)", {"java": 2}),
+    ("extends", r"\s+", {"java": 1}),
+    ("implements", r"\s+", {"java": 1}),
+    # CSS
+    ("@media", r"\b", {"css": 2}),
+    ("#", r"[\w-]+\s*\{", {"css": 1}),
+    ("{", r"\s*[\w-]+\s*:", {"css": 2}),
+    # 注解 / 装饰器
+    ("@", r"\w+", {"java": 2, "python": 1}),
+    # HTML
+    ("class", r"\s*=\s*[\"']", {"html": 1}),
+    ("</", r"\w+>", {"html": 1}),
+    ("<", r"\w+[^<>\n]*>", {"html": 2}),
+]
+
+# 常用库，不区分大小写，每个库出现即加分（不按出现次数累计）
+LANGUAGE_LIBRARIES = {
+    "python": ["django", "flask", "requests", "numpy", "pandas", "tensorflow", "pytorch"],
+    "javascript": ["react", "vue", "angular", "express", "node", "axios"],
+    "java": ["spring", "hibernate", "mybatis", "junit"],
+    "go": ["gin", "gorm", "echo"],
+    "cpp": ["boost", "qt", "opencv"],
+}
+LIBRARY_WEIGHT = 2
+
+
+def _branch(first: str, group: str, tail: str) -> str:
+    """以字面字符 first 开头的分支，first 为单词字符时要求前面是单词边界"""
+    boundary = r"(?<!\w.)" if re.match(r"\w", first) else ""
+    return f"{re.escape(first)}{boundary}(?P<{group}>{tail})"
+
+
+def _compile_scanner():
+    branches = []
+    # 分组名 -> (库名, {语言: 权重})，特征的库名为 None
+    groups = {}
+    for i, (prefix, tail, weights) in enumerate(LANGUAGE_FEATURES):
+        branches.append(_branch(prefix[0], f"f{i}", re.escape(prefix[1:]) + tail))
+        groups[f"f{i}"] = (None, weights)
+    for language, libraries in LANGUAGE_LIBRARIES.items():
+        for library in libraries:
+            # 首字符分别按大小写展开，保证每个分支都以字面字符开头
+            for first in dict.fromkeys([library[0], library[0].upper()]):
+                group = f"lib{len(groups)}"
+                branches.append(_branch(first, group, f"(?i:{re.escape(library[1:])})\\b"))
+                groups[group] = (library, {language: LIBRARY_WEIGHT})
+    return re.compile("|".join(branches), re.MULTILINE), groups
+
+
+_SCANNER, _SCANNER_GROUPS = _compile_scanner()
+
+
+def score_languages(text: str) -> Dict[str, int]:
+    """单次扫描文本，返回各语言的特征得分"""
+    scores = Counter()
+    seen_libraries = set()
+    for match in _SCANNER.finditer(text):
+        library, weights = _SCANNER_GROUPS[match.lastgroup]
+        if library is not None:
+            if library in seen_libraries:
+                continue
+            seen_libraries.add(library)
+        for language, weight in weights.items():
+            scores[language] += weight
+    return dict(scores)
+
+
+def detect_language(text: str) -> Optional[str]:
+    """根据代码特征检测主要语言，没有任何特征时返回 None"""
+    scores = score_languages(text)
+    if not scores:
+        return None
+    return max(scores.items(), key=lambda item: item[1])[0]
+
+
+def detect_file_language(path: str, content: str = "") -> Optional[str]:
+    """优先按扩展名判断文件语言，扩展名无法判断时扫描文件内容"""
+    language = EXTENSION_LANGUAGES.get(os.path.splitext(path or "")[1].lower())
+    if language:
+        return language
+    return detect_language(content) if content else None
+
+
+def detect_change_languages(changes: list) -> Dict[str, str]:
+    """
+    为变更列表中的每个文件标注语言
+    :param changes: filter_changes 过滤后的变更列表
+    :return: {new_path: 语言}，无法判断语言的文件不包含在内
+    """
+    labels = {}
+    for change in changes:
+        path = change.get("new_path", "")
+        language = detect_file_language(path, change.get("diff", ""))
+        if language:
+            labels[path] = language
+    return labels
+
+
+def rank_change_languages(changes: list) -> List[str]:
+    """变更涉及的语言，按变更行数从多到少排序"""
+    labels = detect_change_languages(changes)
+    weights = Counter()
+    for change in changes:
+        language = labels.get(change.get("new_path", ""))
+        if language:
+            weights[language] += change.get("additions", 0) + change.get("deletions", 0) or 1
+    return [language for language, _ in weights.most_common()]
@@ -1,5 +1,7 @@
 import os
-from multiprocessing import Process
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from redis import Redis
 from rq import Queue
@@ -11,8 +13,80 @@ queue_driver = os.getenv('QUEUE_DRIVER', 'async')
 if queue_driver == 'rq':
     queues = {}
 
+# async 模式下常驻的工作进程池，以及限制积压任务数量的信号量
+_pool = None
+_backlog = None
+_pool_lock = threading.Lock()
 
-def handle_queue(function: callable, data: any, token: str, url: str, url_slug: str):
+
+def _warm_up_worker():
+    """
+    工作进程启动时执行：提前导入任务处理模块并创建可复用的 LLM 客户端、知识库等对象，
+    使后续任务无需重复初始化
+    """
+    try:
+        from biz.queue.worker import warm_up
+        warm_up()
+    except Exception as e:
+        logger.error(f'工作进程预热失败: {e}')
+
+
+def _noop():
+    return None
+
+
+def _create_pool():
+    global _pool, _backlog
+    max_workers = int(os.getenv('QUEUE_MAX_WORKERS', 4))
+    max_backlog = int(os.getenv('QUEUE_MAX_BACKLOG', 50))
+    _pool = ProcessPoolExecutor(max_workers=max_workers, initializer=_warm_up_worker)
+    if _backlog is None:
+        # 正在执行 + 排队等待的任务总数上限
+        _backlog = threading.BoundedSemaphore(max_workers + max_backlog)
+    # 预先拉起全部工作进程，避免第一个 webhook 到来时才冷启动
+    for _ in range(max_workers):
+        _pool.submit(_noop)
+    logger.info(f'工作进程池已启动，QUEUE_MAX_WORKERS: {max_workers}，QUEUE_MAX_BACKLOG: {max_backlog}')
+
+
+def init_queue():
+    """初始化任务队列，async 模式下预热工作进程池"""
+    if queue_driver == 'rq':
+        return
+    with _pool_lock:
+        if _pool is None:
+            _create_pool()
+
+
+def _on_task_done(future):
+    _backlog.release()
+    if future.cancelled():
+        logger.warn('队列任务已取消')
+        return
+    exception = future.exception()
+    if exception:
+        logger.error(f'队列任务执行失败: {exception}')
+
+
+def _submit(function: callable, *args):
+    with _pool_lock:
+        if _pool is None:
+            _create_pool()
+        try:
+            return _pool.submit(function, *args)
+        except BrokenProcessPool:
+            # 工作进程异常退出（如 OOM）后进程池不可用，重建后再提交
+            logger.error('工作进程池已损坏，正在重建...')
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _create_pool()
+            return _pool.submit(function, *args)
+
+
+def handle_queue(function: callable, data: any, token: str, url: str, url_slug: str) -> bool:
+    """
+    将任务放入队列异步执行
+    :return: 任务是否被接受；async 模式下积压任务已满时返回 False
+    """
     if queue_driver == 'rq':
         if url_slug not in queues:
             logger.info(f'REDIS_HOST: {os.getenv("REDIS_HOST", "127.0.0.1")}，REDIS_PORT: {os.getenv("REDIS_PORT", 6379)}')
@@ -20,6 +94,16 @@ def handle_queue(function: callable, data: any, token: str, url: str, url_slug:
                                                                               os.getenv('REDIS_PORT', 6379)))
 
         queues[url_slug].enqueue(function, data, token, url, url_slug)
-    else:
-        process = Process(target=function, args=(data, token, url, url_slug))
-        process.start()
+        return True
+
+    init_queue()
+    if not _backlog.acquire(blocking=False):
+        logger.warn(f'任务队列已满，拒绝处理: {function.__name__}, url_slug: {url_slug}')
+        return False
+    try:
+        future = _submit(function, data, token, url, url_slug)
+    except Exception:
+        _backlog.release()
+        raise
+    future.add_done_callback(_on_task_done)
+    return True
@@ -5,9 +5,11 @@ from jinja2 import Template
 
 from biz.llm.factory import Factory
 from biz.utils.log import logger
-from biz.utils.token_util import count_tokens, truncate_text_by_tokens
+from biz.utils.token_util import count_and_truncate, count_tokens, count_tokens_cached
+from biz.utils.diff_terms import changes_to_diff_text
+from biz.utils.knowledge_packer import pack_knowledge
 from biz.utils.knowledge_base import KnowledgeBase
-from biz.utils.code_reviewer import BaseReviewer, CodeReviewer
+from biz.utils.code_reviewer import BaseReviewer, CodeReviewer, ProgressCallback
 
 
 class RAGCodeReviewer(BaseReviewer):
@@ -15,9 +17,14 @@ class RAGCodeReviewer(BaseReviewer):
     
     def __init__(self):
         super().__init__("rag_code_review_prompt")
-        self.knowledge_base = KnowledgeBase()
+        self.knowledge_base = KnowledgeBase.get_instance()
         self.enable_rag = os.getenv("ENABLE_RAG", "1") == "1"
         self.similarity_threshold = float(os.getenv("RAG_SIMILARITY_THRESHOLD", "0.2"))
+        # diff：按变更中的导入、调用和标识符检索文档块；language：按语言的固定查询检索完整文档
+        self.retrieval_mode = os.getenv("RAG_RETRIEVAL_MODE", "diff")
+        # 整个提示词的 token 预算，代码变更优先，知识文档使用剩余部分且不超过 RAG_KNOWLEDGE_MAX_TOKENS
+        self.prompt_max_tokens = int(os.getenv("RAG_PROMPT_MAX_TOKENS", 32000))
+        self.knowledge_max_tokens = int(os.getenv("RAG_KNOWLEDGE_MAX_TOKENS", 2000))
         logger.info(f"RAG功能状态: {'启用' if self.enable_rag else '禁用'}")
         logger.info(f"RAG相似度阈值: {self.similarity_threshold}")
     
@@ -83,85 +90,103 @@ class RAGCodeReviewer(BaseReviewer):
             }
         }
     
-    def get_relevant_knowledge(self, code_content: str, similarity_threshold: float = None) -> str:
-        """获取相关知识文档"""
+    def get_relevant_knowledge(self, code_content: str, similarity_threshold: float = None,
+                               languages: Optional[List[str]] = None, max_tokens: int = None) -> str:
+        """
+        获取相关知识文档，languages 为空时从代码内容中检测语言；
+        diff 检索模式下没有检索到文档块时（如变更中没有可用的检索词）退回按语言检索。
+        检索结果按检索排名在 max_tokens（默认 RAG_KNOWLEDGE_MAX_TOKENS）内打包，放不下的文档只保留相关章节
+        """
         if not self.enable_rag:
             return ""
         
         # 使用实例的相似度阈值作为默认值
         if similarity_threshold is None:
             similarity_threshold = self.similarity_threshold
+        if max_tokens is None:
+            max_tokens = self.knowledge_max_tokens
         
         try:
-            relevant_docs = self.knowledge_base.get_knowledge_for_code_review(code_content, similarity_threshold)
+            diff_text = changes_to_diff_text(code_content)
+            relevant_docs = []
+            if self.retrieval_mode == "diff":
+                relevant_docs = self.knowledge_base.get_knowledge_for_diff(diff_text, similarity_threshold, languages)
+            if not relevant_docs:
+                relevant_docs = self.knowledge_base.get_knowledge_for_code_review(code_content, similarity_threshold, languages)
             
             if not relevant_docs:
                 return ""
             
-            knowledge_text = "\n\n".join([
-                f"### {doc['metadata']['title']} (相似度: {doc['score']:.2f}){' [完整文档]' if doc['metadata'].get('is_full_document', False) else ''}\n{doc['content']}"
-                for doc in relevant_docs
-            ])
-            
-            logger.info(f"检索到 {len(relevant_docs)} 个相关文档片段")
+            knowledge_text, report = pack_knowledge(relevant_docs, max_tokens, diff_text)
+            logger.info(f"检索到 {len(relevant_docs)} 个相关文档片段，完整保留 {report['full']} 个，"
+                        f"节选 {report['partial']} 个，丢弃 {report['dropped']} 个，"
+                        f"使用 {report['used_tokens']}/{max_tokens} tokens，裁剪 {report['trimmed_tokens']} tokens")
             return knowledge_text
             
         except Exception as e:
             logger.error(f"获取相关知识失败: {e}")
             return ""
     
-    def review_and_strip_code(self, changes_text: str, commits_text: str = "", similarity_threshold: float = None, temperature: Optional[float] = None) -> str:
-        """RAG增强的代码审查"""
+    def review_and_strip_code(self, changes_text: str, commits_text: str = "", similarity_threshold: float = None,
+                              temperature: Optional[float] = None, on_progress: Optional[ProgressCallback] = None,
+                              languages: Optional[List[str]] = None) -> str:
+        """RAG增强的代码审查，传入 on_progress 时流式审查并回调已生成的内容"""
         if not changes_text:
             logger.info("代码为空")
             return "代码为空"
         
+        messages = self.prepare_messages(changes_text, commits_text, languages, similarity_threshold)
+        # 进行审查并清理格式
+        return self.strip_review_result(self.call_llm(messages, temperature, on_progress))
+    
+    def prepare_messages(self, changes_text: str, commits_text: str = "", languages: Optional[List[str]] = None,
+                         similarity_threshold: float = None) -> List[Dict[str, Any]]:
+        """截断超长代码变更，按变更检索相关知识，在提示词总预算的剩余部分内放入知识文档并构建消息"""
         # 使用实例的相似度阈值作为默认值
         if similarity_threshold is None:
             similarity_threshold = self.similarity_threshold
         
         # Token限制处理
         review_max_tokens = int(os.getenv("REVIEW_MAX_TOKENS", 10000))
-        tokens_count = count_tokens(changes_text)
-        if tokens_count > review_max_tokens:
-            changes_text = truncate_text_by_tokens(changes_text, review_max_tokens)
+        # 返回的数量可能是 UTF-8 字节数（token 数的上界），用于预算偏保守，但不必再编码一次；
+        # 截断时是原文的 token 数，截断后不超过 review_max_tokens
+        changes_tokens, changes_text = count_and_truncate(changes_text, review_max_tokens)
+        changes_tokens = min(changes_tokens, review_max_tokens)
         
         # 获取相关知识
         relevant_docs = ""
         if self.enable_rag:
-            relevant_docs = self.get_relevant_knowledge(changes_text, similarity_threshold)
+            # 提示词模板、代码变更和提交信息之外剩余的预算留给知识文档
+            prompt_tokens = (count_tokens_cached(self.prompts["system_message"]["content"])
+                             + count_tokens_cached(self.prompts["user_message"]["content"])
+                             + changes_tokens + count_tokens(commits_text or ""))
+            knowledge_tokens = min(self.knowledge_max_tokens, self.prompt_max_tokens - prompt_tokens)
+            if knowledge_tokens > 0:
+                relevant_docs = self.get_relevant_knowledge(changes_text, similarity_threshold, languages,
+                                                            knowledge_tokens)
+            else:
+                logger.warning(f"代码变更已占满提示词预算 {self.prompt_max_tokens} tokens，不添加知识文档")
         
-        # 进行审查
-        review_result = self.review_code(changes_text, commits_text, relevant_docs, temperature).strip()
-        
-        # 清理格式
-        if review_result.startswith("```markdown") and review_result.endswith("```"):
-            return review_result[11:-3].strip()
-        return review_result
+        return self._build_messages(changes_text, commits_text, relevant_docs)
     
-    def review_code(self, diffs_text: str, commits_text: str = "", relevant_docs: str = "", temperature: Optional[float] = None) -> str:
-        """基于RAG的代码审查"""
-        # 构建消息
+    def _build_messages(self, diffs_text: str, commits_text: str = "", relevant_docs: str = "") -> List[Dict[str, Any]]:
         user_content = self.prompts["user_message"]["content"].format(
             diffs_text=diffs_text,
             commits_text=commits_text or "无提交信息",
             relevant_docs=relevant_docs or "无相关文档"
         )
         
-        messages = [
+        return [
             self.prompts["system_message"],
             {
                 "role": "user",
                 "content": user_content
             }
         ]
-        
-        # 打印相关文档信息
-        # if relevant_docs:
-        #     logger.info("\n相关文档信息:")
-        #     logger.info(f"\n{'='*50}\n{relevant_docs}\n{'='*50}")
-        
-        return self.call_llm(messages, temperature)
+    
+    def review_code(self, diffs_text: str, commits_text: str = "", relevant_docs: str = "", temperature: Optional[float] = None) -> str:
+        """基于RAG的代码审查"""
+        return self.call_llm(self._build_messages(diffs_text, commits_text, relevant_docs), temperature)
     
     def add_knowledge_document(self, title: str, file_path: str, tags: List[str] = None) -> str:
         """添加知识文档"""
@@ -173,6 +198,13 @@ class RAGCodeReviewer(BaseReviewer):
             logger.error(f"添加知识文档失败: {e}")
             raise
     
+    def add_knowledge_documents(self, file_paths: List[str], tags: List[str] = None, workers: int = None,
+                                on_progress=None, titles: List[str] = None) -> Dict[str, Any]:
+        """批量添加知识文档"""
+        stats = self.knowledge_base.add_custom_documents(file_paths, tags, workers, on_progress, titles)
+        logger.info(f"批量添加知识文档: 成功 {len(stats['documents'])} 个，失败 {len(stats['failed'])} 个")
+        return stats
+    
     def list_knowledge_documents(self) -> List[Dict[str, Any]]:
         """列出所有知识文档"""
         return self.knowledge_base.list_documents()
@@ -184,10 +216,8 @@ class RAGCodeReviewer(BaseReviewer):
     
     def restore_builtin_documents(self):
         """恢复所有内置文档"""
-        # 先清空内置文档集合
-        self.knowledge_base.clear_builtin_collection()
-        # 重新初始化内置文档
-        self.knowledge_base._init_builtin_knowledge()
+        # 按内容哈希同步，只重新加载被删除或内容变化的内置文档
+        self.knowledge_base.reload_builtin_knowledge()
         logger.info("内置文档已恢复")
     
     @staticmethod
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, List, Optional
+
+from biz.utils.log import logger
+
+# 提示词中的变更是变更列表的 str()，diff 的换行被转义为 \n（前面的反斜杠本身被转义时除外），规范化前先还原为换行
+ESCAPED_NEWLINE_PATTERN = re.compile(r"(?<!\\)((?:\\\\)*)(?:\\r)?\\n")
+# diff 中 hunk 头的行号在 rebase 后会变化，但不影响代码内容，计算缓存键时去掉；
+# 每个文件 diff 的第一个 hunk 头紧跟在 str() 的引号后面
+HUNK_HEADER_PATTERN = re.compile(r"(^|['\"])@@ -\d+(?:,\d+)? \+\d+(?:,\d+)? @@", re.MULTILINE)
+# 行尾空白，str() 中的制表符同样被转义为 \t
+TRAILING_SPACES_PATTERN = re.compile(r"(?:[ \t]|(?<!\\)\\t)+$", re.MULTILINE)
+
+
+class ReviewCache:
+    """
+    审查结果缓存，以规范化后的 diff、提交信息、渲染后的提示词、模型供应商/模型名称和温度计算的哈希作为键，
+    持久化到 SQLite，支持过期时间（REVIEW_CACHE_TTL）和条目数上限（REVIEW_CACHE_MAX_ENTRIES）淘汰
+    """
+    DB_FILE = "data/review_cache.db"
+
+    def __init__(self, db_file: str = None):
+        self.db_file = db_file or ReviewCache.DB_FILE
+        self.enabled = os.getenv("REVIEW_CACHE_ENABLED", "1") == "1"
+        self.ttl = int(os.getenv("REVIEW_CACHE_TTL", 7 * 24 * 3600))
+        self.max_entries = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", 5000))
+        if self.enabled:
+            self.init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_file, timeout=10)
+
+    def init_db(self):
+        """初始化缓存表"""
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS review_cache (
+                            cache_key TEXT PRIMARY KEY,
+                            review_result TEXT,
+                            created_at INTEGER,
+                            accessed_at INTEGER
+                        )
+                    ''')
+                cursor.execute('CREATE INDEX IF NOT EXISTS idx_review_cache_accessed_at ON review_cache (accessed_at)')
+                cursor.execute('''
+                        CREATE TABLE IF NOT EXISTS review_cache_stats (
+                            name TEXT PRIMARY KEY,
+                            value INTEGER DEFAULT 0
+                        )
+                    ''')
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"审查缓存初始化失败: {e}")
+            self.enabled = False
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """规范化文本：还原转义的换行并统一换行符，去掉行尾空白和 hunk 头中的行号，只用于计算缓存键"""
+        text = ESCAPED_NEWLINE_PATTERN.sub(lambda match: match.group(1) + "\n", text)
+        text = text.replace("\r\n", "\n")
+        text = TRAILING_SPACES_PATTERN.sub("", text)
+        return HUNK_HEADER_PATTERN.sub(r"\1@@ @@", text)
+
+    @staticmethod
+    def make_key(messages: List[Dict[str, str]], provider: str, model: str, temperature: float) -> str:
+        """计算缓存键，messages 中已包含渲染后的提示词、diff 和提交信息"""
+        payload = json.dumps({
+            "messages": [{"role": m.get("role"), "content": ReviewCache.normalize(m.get("content", ""))}
+                         for m in messages],
+            "provider": provider,
+            "model": model,
+            "temperature": temperature,
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _incr_stat(self, cursor, name: str):
+        cursor.execute('''
+                INSERT INTO review_cache_stats (name, value) VALUES (?, 1)
+                ON CONFLICT(name) DO UPDATE SET value = value + 1
+            ''', (name,))
+
+    def get(self, key: str) -> Optional[str]:
+        """查询缓存，命中时返回审查结果，并记录命中/未命中次数"""
+        if not self.enabled:
+            return None
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT review_result FROM review_cache WHERE cache_key = ? AND created_at >= ?',
+                               (key, now - self.ttl))
+                row = cursor.fetchone()
+                if row:
+                    cursor.execute('UPDATE review_cache SET accessed_at = ? WHERE cache_key = ?', (now, key))
+                    self._incr_stat(cursor, "hits")
+                else:
+                    self._incr_stat(cursor, "misses")
+                conn.commit()
+                return row[0] if row else None
+        except sqlite3.DatabaseError as e:
+            logger.error(f"读取审查缓存失败: {e}")
+            return None
+
+    def set(self, key: str, review_result: str):
+        """写入缓存，并淘汰过期和超出数量上限的条目"""
+        if not self.enabled:
+            return
+        now = int(time.time())
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                        INSERT OR REPLACE INTO review_cache (cache_key, review_result, created_at, accessed_at)
+                        VALUES (?, ?, ?, ?)
+                    ''', (key, review_result, now, now))
+                cursor.execute('DELETE FROM review_cache WHERE created_at < ?', (now - self.ttl,))
+                cursor.execute('''
+                        DELETE FROM review_cache WHERE cache_key IN (
+                            SELECT cache_key FROM review_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                        )
+                    ''', (self.max_entries,))
+                conn.commit()
+        except sqlite3.DatabaseError as e:
+            logger.error(f"写入审查缓存失败: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """返回缓存条目数以及累计命中、未命中次数"""
+        result = {"enabled": self.enabled, "entries": 0, "hits": 0, "misses": 0}
+        if not self.enabled:
+            return result
+        try:
+            with self._connect() as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT COUNT(*) FROM review_cache')
+                result["entries"] = cursor.fetchone()[0]
+                cursor.execute('SELECT name, value FROM review_cache_stats')
+                for name, value in cursor.fetchall():
+                    result[name] = value
+        except sqlite3.DatabaseError as e:
+            logger.error(f"读取审查缓存统计失败: {e}")
+        return result
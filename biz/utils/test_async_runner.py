@@ -0,0 +1,37 @@
+import asyncio
+import concurrent.futures
+import threading
+from unittest import TestCase, main
+
+from biz.utils.async_runner import get_event_loop, run_async
+
+
+class TestRunAsync(TestCase):
+    def test_runs_on_shared_loop(self):
+        async def current_loop():
+            return asyncio.get_running_loop(), threading.current_thread()
+
+        loop, thread = run_async(current_loop())
+        self.assertIs(loop, get_event_loop())
+        self.assertEqual(thread.name, "async-runner")
+        self.assertIsNot(thread, threading.current_thread())
+        # 多次调用（包括多个线程同时调用）复用同一个事件循环
+        self.assertIs(run_async(current_loop())[0], loop)
+        with concurrent.futures.ThreadPoolExecutor(4) as executor:
+            loops = list(executor.map(lambda _: run_async(current_loop())[0], range(4)))
+        self.assertTrue(all(other is loop for other in loops))
+
+    def test_exception_and_timeout(self):
+        async def fail():
+            raise ValueError("失败")
+
+        with self.assertRaises(ValueError):
+            run_async(fail())
+        with self.assertRaises(concurrent.futures.TimeoutError):
+            run_async(asyncio.sleep(1), timeout=0.01)
+        # 超时后事件循环仍可继续使用
+        self.assertEqual(run_async(asyncio.sleep(0, result="ok")), "ok")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from unittest import TestCase, main
+
+from biz.utils.bm25_index import BM25Index, tokenize
+
+
+class TestBM25Index(TestCase):
+    def test_tokenize_identifiers_and_calls(self):
+        tokens = tokenize("df = SimpleDateFormat(pattern); eval(code) 线程安全")
+        self.assertIn("simpledateformat", tokens)
+        self.assertIn("date", tokens)
+        self.assertIn("eval(", tokens)
+        self.assertIn("线程", tokens)
+        self.assertNotIn("pattern(", tokens)
+
+    def test_exact_matches_rank_first_and_removal(self):
+        index = BM25Index()
+        index.add(["style", "dates", "eval"], [
+            "General style guide: naming, formatting and comments for Java code.",
+            "SimpleDateFormat is not thread safe, use DateTimeFormatter in Java code.",
+            "Never call eval( on user input; eval is dangerous.",
+        ])
+        self.assertEqual(index.search("SimpleDateFormat", 3)[0][0], "dates")
+        self.assertEqual([item_id for item_id, _ in index.search("eval(", 3)], ["eval"])
+
+        index.remove(["eval"])
+        self.assertEqual(index.search("eval(", 3), [])
+        self.assertEqual(len(index), 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import ast
+import asyncio
+import os
+from unittest import TestCase, main, mock
+
+from biz.utils.code_reviewer import CodeReviewer
+
+
+class FakeClient:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def stream_completions(self, messages, temperature=None):
+        yield from self.chunks
+
+
+class TestStreamLlm(TestCase):
+    def make_reviewer(self, chunks) -> CodeReviewer:
+        # 不创建真实的 LLM 客户端
+        reviewer = CodeReviewer.__new__(CodeReviewer)
+        reviewer.client = FakeClient(chunks)
+        return reviewer
+
+    @mock.patch.dict(os.environ, {"REVIEW_STREAMING_INTERVAL": "3600"})
+    def test_first_output_is_reported_immediately(self):
+        progress = []
+        reviewer = self.make_reviewer(["", "\n", "### 问题", "\n- 第一条", "\n总分:80分"])
+        result = reviewer._stream_llm([], 0.3, progress.append)
+        self.assertEqual(result, "\n### 问题\n- 第一条\n总分:80分")
+        # 间隔内只在第一段非空内容到达时回调一次
+        self.assertEqual(progress, ["### 问题"])
+
+    @mock.patch.dict(os.environ, {"REVIEW_STREAMING_INTERVAL": "0"})
+    def test_progress_after_interval(self):
+        progress = []
+        self.make_reviewer(["a", "b", "c"])._stream_llm([], 0.3, progress.append)
+        self.assertEqual(progress, ["a", "ab", "abc"])
+
+
+class FakeCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+
+class FakeAsyncClient:
+    """按文件名返回得分，排在前面的单元耗时更长，记录同时进行的请求数"""
+    default_temperature = 0.3
+    default_model = "fake"
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.active = 0
+        self.max_active = 0
+        self.finished = []
+
+    async def acompletions(self, messages, temperature=None):
+        path = messages[0]["content"]
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        await asyncio.sleep(self.delays[path])
+        self.active -= 1
+        self.finished.append(path)
+        return f"{path} 没有问题\n总分:{self.delays[path] * 1000:.0f}分"
+
+
+class TestReviewChangesPerFile(TestCase):
+    @mock.patch.dict(os.environ, {"REVIEW_MODE": "per_file", "REVIEW_CONCURRENCY": "2", "REVIEW_MAX_TOKENS": "10000"})
+    def test_results_keep_unit_order_under_concurrency_limit(self):
+        paths = [f"src/file{i}.py" for i in range(5)]
+        changes = [{"new_path": path, "diff": "@@ -1 +1 @@\n+x = 1\n", "additions": 1, "deletions": 0}
+                   for path in paths]
+        client = FakeAsyncClient({path: (len(paths) - i) * 0.01 for i, path in enumerate(paths)})
+        reviewer = CodeReviewer.__new__(CodeReviewer)
+        reviewer.client = client
+        reviewer.cache = FakeCache()
+        # 消息中只保留文件名，不加载提示词
+        reviewer.prepare_messages = lambda changes_text, commits_text, languages: \
+            [{"role": "user", "content": ast.literal_eval(changes_text)[0]["new_path"]}]
+        progress = []
+
+        result = reviewer.review_changes(changes, on_progress=progress.append)
+
+        self.assertEqual(client.max_active, 2)
+        # 完成顺序与单元顺序不同，合并结果仍按单元顺序排列
+        self.assertEqual(client.finished[0], paths[1])
+        positions = [result.index(f"### 📄 {path}\n\n{path} 没有问题") for path in paths]
+        self.assertEqual(positions, sorted(positions))
+        self.assertIn("得分: 50分", result)
+        self.assertIn("总分: 30分", result)
+        self.assertEqual(len(progress), len(paths))
+        self.assertTrue(progress[-1].endswith(f"已完成 {len(paths)}/{len(paths)} 个审查单元"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+from unittest import TestCase, main
+
+from biz.utils.diff_terms import build_diff_queries, changes_to_diff_text, extract_diff_terms
+
+DIFF = """@@ -1,3 +1,6 @@
+ import os
++import java.text.SimpleDateFormat;
++from hashlib import md5
++    formatter = new SimpleDateFormat("yyyy-MM-dd");
++    digest = md5(password).hexdigest()  # eval(x) 只是注释
++    cached_formatter = formatter
+-    removed_helper(value)
+"""
+
+
+class TestDiffTerms(TestCase):
+    def test_extract_terms_from_added_lines(self):
+        terms = extract_diff_terms(DIFF)
+        self.assertEqual(terms["imports"][:3], ["java.text.SimpleDateFormat", "hashlib", "hashlib.md5"])
+        self.assertIn("SimpleDateFormat", terms["calls"])
+        self.assertIn("md5", terms["calls"])
+        self.assertNotIn("eval", terms["calls"])
+        self.assertNotIn("removed_helper", terms["calls"])
+        self.assertIn("cached_formatter", terms["identifiers"])
+        self.assertNotIn("new", terms["identifiers"])
+
+        queries = build_diff_queries(terms, "java")
+        self.assertEqual(len(queries), 3)
+        self.assertTrue(all(query.startswith("java ") for query in queries))
+        self.assertIn("SimpleDateFormat(", queries[1])
+
+    def test_context_lines_are_ignored(self):
+        diff = ("@@ -1,4 +1,5 @@\n import os\n+import json\n def handle(request):\n"
+                "     old_value = legacy_handler(request)\n     return compute_total(old_value)\n")
+        self.assertEqual(extract_diff_terms(diff), {"imports": ["json"], "calls": [], "identifiers": []})
+
+    def test_js_default_import_is_not_a_module(self):
+        diff = "@@ -0,0 +1,3 @@\n+import React from 'react'\n+import axios, { get } from 'axios'\n+import os, sys\n"
+        self.assertEqual(sorted(extract_diff_terms(diff)["imports"]), ["axios", "os", "react"])
+
+    def test_changes_repr_is_restored(self):
+        changes = [{"diff": "@@ -1 +1 @@\n+eval(code)\n", "new_path": "a.py"}]
+        self.assertEqual(changes_to_diff_text(str(changes)), changes[0]["diff"])
+        # 截断后无法解析时直接反转义换行
+        self.assertIn("\n+eval(code)", changes_to_diff_text(str(changes)[:40]))
+        self.assertEqual(extract_diff_terms(changes_to_diff_text(str(changes)))["calls"], ["eval"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+from types import SimpleNamespace
+from unittest import TestCase, main, mock
+
+import numpy as np
+
+from biz.utils import embedder
+from biz.utils.embedder import OnnxEmbedder
+
+# 填充位置的输出，池化时没有按 attention_mask 排除会明显偏离
+PADDING_VALUE = 1000.0
+
+
+class FakeTokenizer:
+    """每个字母一个 token（a=1, b=2, ...），按批内最长的句子右侧填充 0"""
+
+    def encode_batch(self, texts):
+        length = max(len(text) for text in texts)
+        encodings = []
+        for text in texts:
+            ids = [ord(char) - ord("a") + 1 for char in text]
+            padding = [0] * (length - len(ids))
+            encodings.append(SimpleNamespace(ids=ids + padding, attention_mask=[1] * len(ids) + padding,
+                                             type_ids=[0] * length))
+        return encodings
+
+
+class FakeSession:
+    """token 向量为 (id, 1)，填充位置为 PADDING_VALUE"""
+
+    def __init__(self):
+        self.feeds = []
+
+    def run(self, output_names, feeds):
+        self.feeds.append(sorted(feeds))
+        ids = feeds["input_ids"].astype(np.float32)
+        token_embeddings = np.stack([ids, np.ones_like(ids)], axis=-1)
+        token_embeddings[feeds["input_ids"] == 0] = PADDING_VALUE
+        return [token_embeddings]
+
+
+def make_embedder(normalize: bool) -> OnnxEmbedder:
+    # 不加载真实的 ONNX 模型和分词器
+    model = OnnxEmbedder.__new__(OnnxEmbedder)
+    model.normalize = normalize
+    model.tokenizer = FakeTokenizer()
+    model.session = FakeSession()
+    model.input_names = {"input_ids", "attention_mask"}
+    return model
+
+
+class TestOnnxEmbedder(TestCase):
+    def test_mean_pooling_ignores_padding_and_keeps_input_order(self):
+        model = make_embedder(normalize=False)
+        # 按长度排序后 "dddd"、"ab" 同一批，"ab" 被填充
+        embeddings = model.encode(["ab", "dddd", "a"], batch_size=2)
+        np.testing.assert_allclose(embeddings, [[1.5, 1], [4, 1], [1, 1]])
+        self.assertEqual(embeddings.dtype, np.float32)
+        # 模型没有的输入不传给会话
+        self.assertEqual(model.session.feeds, [["attention_mask", "input_ids"]] * 2)
+
+    def test_normalize(self):
+        model = make_embedder(normalize=True)
+        embeddings = model.encode(["ab", "c"])
+        np.testing.assert_allclose(embeddings, [[0.83205, 0.5547], [0.948683, 0.316228]], rtol=1e-5)
+        np.testing.assert_allclose(model.encode("c"), embeddings[1])
+
+
+class TestEmbeddingBackend(TestCase):
+    def tearDown(self):
+        embedder._resolve_backend.cache_clear()
+
+    def test_fallback_to_torch_when_modules_missing(self):
+        embedder._resolve_backend.cache_clear()
+        with mock.patch.dict(os.environ, {"EMBEDDING_BACKEND": "onnx-int8"}), \
+                mock.patch.object(embedder.importlib.util, "find_spec", lambda name: None if name == "onnx" else object()):
+            self.assertEqual(embedder.get_embedding_backend(), "torch")
+        embedder._resolve_backend.cache_clear()
+        with mock.patch.dict(os.environ, {"EMBEDDING_BACKEND": "ONNX"}), \
+                mock.patch.object(embedder.importlib.util, "find_spec", lambda name: object()):
+            self.assertEqual(embedder.get_embedding_backend(), "onnx")
+
+
+class TestOnnxExport(TestCase):
+    def test_reexport_when_source_model_changes(self):
+        with tempfile.TemporaryDirectory() as onnx_dir, \
+                mock.patch.dict(os.environ, {"EMBEDDING_ONNX_DIR": onnx_dir}), \
+                mock.patch.object(embedder, "get_model_fingerprint", return_value="new"), \
+                mock.patch.object(embedder, "export_onnx_model") as export, \
+                mock.patch.object(embedder, "OnnxEmbedder"):
+            model_dir = embedder.get_onnx_model_dir("test-model", "onnx")
+            os.makedirs(model_dir)
+            open(os.path.join(model_dir, embedder.ONNX_MODEL_FILE), "w").close()
+            config_path = os.path.join(model_dir, embedder.ONNX_CONFIG_FILE)
+            with open(config_path, "w") as f:
+                json.dump({"max_seq_length": 256, "normalize": True, "source_fingerprint": "old"}, f)
+
+            embedder._load_model("test-model", "onnx")
+            export.assert_called_once_with("test-model", "onnx")
+
+            export.reset_mock()
+            with open(config_path, "w") as f:
+                json.dump({"max_seq_length": 256, "normalize": True, "source_fingerprint": "new"}, f)
+            embedder._load_model("test-model", "onnx")
+            export.assert_not_called()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+import tempfile
+from unittest import TestCase, main
+
+import numpy as np
+
+from biz.utils.embedding_cache import EmbeddingCache
+
+
+class FakeEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), text.count("a"), 1.0] for text in texts], dtype=np.float32)
+
+
+class TestEmbeddingCache(TestCase):
+    def test_only_new_texts_are_encoded_and_persisted(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            encoder = FakeEncoder()
+            cache = EmbeddingCache(cache_dir, "model-a")
+            first = cache.encode(["aa", "b", "aa"], encoder)
+            self.assertEqual(encoder.calls, [["aa", "b"]])
+            np.testing.assert_array_equal(first, encoder(["aa", "b", "aa"]))
+
+            # 新实例从磁盘读取，已缓存的文本不再计算
+            encoder = FakeEncoder()
+            second = EmbeddingCache(cache_dir, "model-a").encode(["b", "ccc", "aa"], encoder)
+            self.assertEqual(encoder.calls, [["ccc"]])
+            np.testing.assert_array_equal(second, encoder(["b", "ccc", "aa"]))
+
+    def test_model_change_clears_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            EmbeddingCache(cache_dir, "model-a").encode(["aa"], FakeEncoder())
+            cache = EmbeddingCache(cache_dir, "model-b")
+            self.assertEqual(len(cache), 0)
+            encoder = FakeEncoder()
+            cache.encode(["aa"], encoder)
+            self.assertEqual(encoder.calls, [["aa"]])
+
+    def test_max_entries_enforced_on_append(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache = EmbeddingCache(cache_dir, "model-a", max_entries=3)
+            cache.encode(["a", "b"], FakeEncoder())
+            cache.encode(["b", "c"], FakeEncoder())
+            self.assertEqual(len(cache), 3)
+            # 写入后超过上限时先清空，再写入本次计算的向量
+            vectors = cache.encode(["d", "ee"], FakeEncoder())
+            self.assertEqual(len(cache), 2)
+            np.testing.assert_array_equal(vectors, FakeEncoder()(["d", "ee"]))
+            self.assertEqual(len(EmbeddingCache(cache_dir, "model-a", max_entries=3)), 2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+from unittest import TestCase, main, mock
+
+import numpy as np
+
+from biz.utils import knowledge_base
+from biz.utils.knowledge_base import KnowledgeBase
+
+
+class StubEncoder:
+    """按文本哈希生成固定的向量，记录每次调用的文本"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size=32, **kwargs):
+        self.calls.append(list(texts))
+        return np.array([np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest()[:8], 16)).random(8) + 1
+                         for text in texts], dtype=np.float32)
+
+
+class KnowledgeBaseTestCase(TestCase):
+    """临时目录中的 Chroma 知识库，向量化模型替换为 StubEncoder，不自动同步内置文档"""
+
+    def setUp(self):
+        try:
+            import chromadb  # noqa: F401
+        except ImportError as e:
+            self.skipTest(f"依赖未安装: {e.name}")
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.encoder = StubEncoder()
+        patches = [
+            mock.patch.object(knowledge_base, "get_embedding_model", return_value=self.encoder),
+            mock.patch.object(knowledge_base, "get_model_fingerprint", return_value="stub"),
+            mock.patch.dict(os.environ, {"AUTO_INIT_BUILTIN_KNOWLEDGE": "0", "ANONYMIZED_TELEMETRY": "False",
+                                         "CHUNK_SIZE": "200", "CHUNK_OVERLAP": "20"}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.kb = KnowledgeBase(os.path.join(self.tmp_dir.name, "kb"))
+
+    def write_file(self, name: str, content: str) -> str:
+        file_path = os.path.join(self.tmp_dir.name, name)
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return file_path
+
+    def documents(self, source: str) -> list:
+        return sorted((doc["title"], doc["doc_id"]) for doc in self.kb.list_documents(source))
+
+
+class TestAddCustomDocuments(KnowledgeBaseTestCase):
+    def test_batches_span_documents(self):
+        contents = [f"# 文档 {i}\n\n" + f"第 {i} 篇的内容。" * 30 for i in range(4)]
+        file_paths = [self.write_file(f"doc{i}.md", content) for i, content in enumerate(contents)]
+        file_paths.append(self.write_file("empty.md", "   "))
+        file_paths.append(self.write_file("unknown.xyz", "不支持的格式"))
+        # 与 doc0 标题、内容相同，doc_id 重复
+        file_paths.append(self.write_file("copy.md", contents[0]))
+        titles = [os.path.basename(path) for path in file_paths[:-1]] + ["doc0.md"]
+        progress = []
+        # 创建知识库时计算的模板查询向量不算
+        self.encoder.calls.clear()
+
+        with mock.patch.dict(os.environ, {"INGEST_BATCH_SIZE": "5"}):
+            stats = self.kb.add_custom_documents(file_paths, ["规范"], workers=1, on_progress=progress.append,
+                                                 titles=titles)
+
+        self.assertEqual([doc["title"] for doc in stats["documents"]], titles[:4])
+        self.assertEqual(stats["failed"], file_paths[4:6])
+        self.assertEqual(stats["processed"], len(file_paths))
+        self.assertEqual(len(self.documents("custom")), 4)
+        # 每批累积到 INGEST_BATCH_SIZE 个块后写入，一批包含多个文档的块，最后一批在结束时写入
+        self.assertEqual(len(progress), len(self.encoder.calls))
+        self.assertGreater(len(progress), 1)
+        self.assertTrue(any(len({text.split("篇")[0] for text in call}) > 1 for call in self.encoder.calls))
+        self.assertEqual(progress[-1]["chunks"], stats["chunks"])
+        self.assertEqual(sum(len(call) for call in self.encoder.calls), stats["chunks"])
+
+    def test_extract_documents_in_worker_processes(self):
+        file_paths = [self.write_file(f"doc{i}.txt", f"内容 {i}") for i in range(3)]
+        self.assertEqual(list(KnowledgeBase._extract_documents(file_paths, workers=2)),
+                         [(path, f"内容 {i}") for i, path in enumerate(file_paths)])
+
+
+class TestSyncBuiltinKnowledge(KnowledgeBaseTestCase):
+    def make_config(self, *names: str) -> dict:
+        return {"settings": {"enabled": True},
+                "builtin_documents": [{"title": name, "file": os.path.join(self.tmp_dir.name, name), "tags": []}
+                                      for name in names]}
+
+    def test_keep_previous_version_on_failure(self):
+        self.write_file("a.md", "# 规范 A\n\n旧版本的内容")
+        self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        old_documents = self.documents("builtin")
+
+        # 新版本添加失败
+        self.write_file("a.md", "# 规范 A 修订\n\n新版本的内容")
+        with mock.patch.object(self.kb, "add_builtin_document", side_effect=RuntimeError("向量化失败")):
+            stats = self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        self.assertEqual((stats["updated"], stats["failed"]), (0, 1))
+        self.assertEqual(self.documents("builtin"), old_documents)
+
+        # 文件暂时缺失
+        os.remove(os.path.join(self.tmp_dir.name, "a.md"))
+        stats = self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        self.assertEqual((stats["removed"], stats["failed"]), (0, 1))
+        self.assertEqual(self.documents("builtin"), old_documents)
+
+    def test_delete_previous_version_after_new_one_added(self):
+        self.write_file("a.md", "# 规范 A\n\n旧版本的内容")
+        self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        (_, old_doc_id), = self.documents("builtin")
+
+        self.write_file("a.md", "# 规范 A 修订\n\n新版本的内容")
+        add_builtin_document = self.kb.add_builtin_document
+        doc_ids_on_add = []
+
+        def add_and_record(*args, **kwargs):
+            doc_ids_on_add.append([doc_id for _, doc_id in self.documents("builtin")])
+            return add_builtin_document(*args, **kwargs)
+
+        with mock.patch.object(self.kb, "add_builtin_document", side_effect=add_and_record):
+            stats = self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        self.assertEqual(stats["updated"], 1)
+        self.assertEqual(doc_ids_on_add, [[old_doc_id]])
+        (_, new_doc_id), = self.documents("builtin")
+        self.assertNotEqual(new_doc_id, old_doc_id)
+
+    def test_update_with_same_doc_id(self):
+        head = "# 规范 A\n\n" + "开头不变。" * 30
+        self.write_file("a.md", head + "\n\n旧的结尾")
+        self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        old_documents = self.documents("builtin")
+
+        # 前 100 个字符不变，doc_id 相同，只能先删除旧版本再添加
+        self.write_file("a.md", head + "\n\n新的结尾")
+        stats = self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        self.assertEqual(stats["updated"], 1)
+        self.assertEqual(self.documents("builtin"), old_documents)
+        contents = self.kb.builtin_collection.get(where={"doc_id": old_documents[0][1]})["documents"]
+        self.assertIn("新的结尾", "".join(contents))
+        self.assertNotIn("旧的结尾", "".join(contents))
+
+    def test_removed_counted_without_manifest_or_after_model_change(self):
+        self.write_file("a.md", "# 规范 A\n\n内容 A")
+        self.write_file("b.md", "# 规范 B\n\n内容 B")
+        self.kb.sync_builtin_knowledge(self.make_config("a.md", "b.md"))
+
+        with mock.patch.object(knowledge_base, "get_model_fingerprint", return_value="other"):
+            stats = self.kb.sync_builtin_knowledge(self.make_config("a.md"))
+        self.assertEqual((stats["added"], stats["removed"]), (1, 1))
+        self.assertEqual([title for title, _ in self.documents("builtin")], ["a.md"])
+
+        self.write_file("b.md", "# 规范 B\n\n内容 B")
+        self.kb.sync_builtin_knowledge(self.make_config("a.md", "b.md"))
+        os.remove(os.path.join(self.kb.db_path, knowledge_base.BUILTIN_MANIFEST_FILE))
+        stats = self.kb.sync_builtin_knowledge(self.make_config("b.md"))
+        self.assertEqual((stats["added"], stats["removed"]), (1, 1))
+        self.assertEqual([title for title, _ in self.documents("builtin")], ["b.md"])
+
+
+if __name__ == '__main__':
+    main()
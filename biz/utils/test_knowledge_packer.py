@@ -0,0 +1,55 @@
+from unittest import TestCase, main
+
+from biz.utils import knowledge_packer
+
+
+def count_words(text: str) -> int:
+    return len(text.split())
+
+
+def pack_knowledge(docs, max_tokens, query=""):
+    return knowledge_packer.pack_knowledge(docs, max_tokens, query, counter=count_words, header_counter=count_words)
+
+
+def make_doc(title: str, content: str, score: float, full: bool = False) -> dict:
+    return {"content": content, "score": score, "metadata": {"title": title, "is_full_document": full}}
+
+
+GUIDE = "\n".join([
+    "# Java 规范",
+    "## 命名 naming rules for classes and methods",
+    "## 日期 SimpleDateFormat is not thread safe use DateTimeFormatter instead",
+    "## 日志 logging levels and message format conventions for services",
+])
+
+
+class TestKnowledgePacker(TestCase):
+    def test_documents_fit_in_given_order(self):
+        # 检索排名（如倒数排名融合）靠前的文档优先，不按相似度重新排序
+        docs = [make_doc("first", "a b c", 0.3), make_doc("second", "d e f", 0.9)]
+        text, report = pack_knowledge(docs, 100)
+        self.assertTrue(text.startswith("### first (相似度: 0.30)"))
+        self.assertEqual((report["full"], report["partial"], report["dropped"]), (2, 0, 0))
+        self.assertEqual(report["trimmed_tokens"], 0)
+
+        text, report = pack_knowledge(docs, 7)
+        self.assertNotIn("### second", text)
+        self.assertLessEqual(report["used_tokens"], 7)
+        self.assertEqual(report["trimmed_tokens"], report["candidate_tokens"] - report["used_tokens"])
+
+    def test_oversized_document_keeps_relevant_sections(self):
+        docs = [make_doc("Java 规范", GUIDE, 0.8, full=True)]
+        text, report = pack_knowledge(docs, 18, query="+ SimpleDateFormat f = new SimpleDateFormat(p);")
+        self.assertEqual(report["partial"], 1)
+        self.assertIn("[节选]", text)
+        self.assertIn("SimpleDateFormat is not thread safe", text)
+        self.assertNotIn("logging levels", text)
+        self.assertLessEqual(count_words(text), 18)
+
+        _, report = pack_knowledge(docs, 3)
+        self.assertEqual(report["dropped"], 1)
+        self.assertEqual(report["used_tokens"], 0)
+
+
+if __name__ == '__main__':
+    main()
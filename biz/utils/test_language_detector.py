@@ -0,0 +1,28 @@
+from unittest import TestCase, main
+
+from biz.utils.language_detector import detect_change_languages, detect_language, rank_change_languages
+
+
+class TestLanguageDetector(TestCase):
+    def test_detect_language_from_content(self):
+        self.assertEqual(detect_language("+from flask import Flask\n+def index(self):\n+    return self.name"), "python")
+        self.assertEqual(detect_language("+import React from 'react'\n+const App = () => {\n"), "javascript")
+        self.assertEqual(detect_language("+package main\n+func (s *Server) Run() {\n"), "go")
+        self.assertEqual(detect_language("+#include <vector>\n+template <typename T>\n"), "cpp")
+        self.assertIsNone(detect_language("README 更新"))
+
+    def test_detect_change_languages(self):
+        changes = [
+            {"new_path": "app/main.py", "diff": "+x = 1", "additions": 1, "deletions": 0},
+            {"new_path": "web/src/App.tsx", "diff": "+<div/>", "additions": 30, "deletions": 5},
+            {"new_path": "scripts/deploy", "diff": "+import os\n+def main():\n", "additions": 2, "deletions": 0},
+            {"new_path": "docs/README.md", "diff": "+说明", "additions": 1, "deletions": 0},
+        ]
+        self.assertEqual(detect_change_languages(changes), {
+            "app/main.py": "python", "web/src/App.tsx": "javascript", "scripts/deploy": "python"})
+        # 按变更行数排序
+        self.assertEqual(rank_change_languages(changes), ["javascript", "python"])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import os
+import signal
+import tempfile
+import time
+from unittest import TestCase, main, mock
+
+from biz.utils import queue
+
+# 等待任务完成、进程池重建的超时时间（秒）
+WAIT_TIMEOUT = 20
+
+
+def _wait_for_file(path, token, url, url_slug):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _fail(path, token, url, url_slug):
+    raise RuntimeError("task failed")
+
+
+def _kill_worker(path, token, url, url_slug):
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def _touch(path, token, url, url_slug):
+    open(path, "w").close()
+
+
+def _noop_task(path, token, url, url_slug):
+    return None
+
+
+def _submit(function, path: str = "") -> bool:
+    return queue.handle_queue(function, path, "token", "http://gitlab.example.com", "gitlab_example_com")
+
+
+def _wait_until(condition) -> bool:
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+class TestQueue(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        # 1 个工作进程 + 1 个排队任务，第 3 个任务被拒绝；工作进程不做预热
+        patches = [
+            mock.patch.object(queue, "queue_driver", "async"),
+            mock.patch.object(queue, "_warm_up_worker", queue._noop),
+            mock.patch.dict(os.environ, {"QUEUE_MAX_WORKERS": "1", "QUEUE_MAX_BACKLOG": "1"}),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        queue._pool, queue._backlog = None, None
+
+    def tearDown(self):
+        if queue._pool is not None:
+            queue._pool.shutdown(wait=True, cancel_futures=True)
+        queue._pool, queue._backlog = None, None
+        self.tmp_dir.cleanup()
+
+    def test_reject_when_full_and_release_on_completion(self):
+        signal_file = os.path.join(self.tmp_dir.name, "go")
+        self.assertTrue(_submit(_wait_for_file, signal_file))
+        self.assertTrue(_submit(_wait_for_file, signal_file))
+        self.assertFalse(_submit(_noop_task))
+
+        open(signal_file, "w").close()
+        self.assertTrue(_wait_until(lambda: _submit(_noop_task)))
+
+    def test_release_on_failure(self):
+        self.assertTrue(_submit(_fail))
+        self.assertTrue(_submit(_fail))
+        self.assertTrue(_wait_until(lambda: _submit(_noop_task)))
+
+    def test_rebuild_pool_after_worker_killed(self):
+        self.assertTrue(_submit(_kill_worker))
+        broken_pool = queue._pool
+        self.assertTrue(_wait_until(lambda: broken_pool._broken))
+
+        # 进程池已损坏时提交会重建进程池，任务在新的工作进程中执行
+        done_file = os.path.join(self.tmp_dir.name, "done")
+        self.assertTrue(_submit(_touch, done_file))
+        self.assertTrue(_wait_until(lambda: os.path.exists(done_file)))
+        self.assertIsNot(queue._pool, broken_pool)
+
+    def test_webhook_returns_503_when_queue_full(self):
+        try:
+            import api
+        except ImportError as e:
+            self.skipTest(f"依赖未安装: {e.name}")
+        with mock.patch.object(api, "handle_queue", return_value=False):
+            response = api.api_app.test_client().post(
+                "/review/webhook", json={"object_kind": "merge_request"},
+                headers={"X-Gitlab-Token": "token", "X-Gitlab-Instance": "http://gitlab.example.com"})
+        self.assertEqual(response.status_code, 503)
+
+
+if __name__ == '__main__':
+    main()
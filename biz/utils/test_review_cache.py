@@ -0,0 +1,31 @@
+from unittest import TestCase, main
+
+from biz.utils.review_cache import ReviewCache
+
+
+def make_messages(changes: list) -> list:
+    # 与 CodeReviewer 一致：变更列表以 str() 渲染进提示词
+    return [
+        {"role": "system", "content": "你是代码审查专家"},
+        {"role": "user", "content": f"代码变更：\n{changes}\n\n提交历史：\nfix"},
+    ]
+
+
+def make_key(diff: str) -> str:
+    changes = [{"diff": diff, "new_path": "app.py", "additions": 1, "deletions": 1}]
+    return ReviewCache.make_key(make_messages(changes), "openai", "gpt-4o", 0.3)
+
+
+class TestReviewCache(TestCase):
+    def test_rebased_diff_shares_key(self):
+        diff = "@@ -10,3 +10,3 @@ def run():\n-    return 1\n+    return 2\n@@ -40 +40 @@\n+print('a\\n')\n"
+        rebased = "@@ -12,3 +12,3 @@ def run():\n-    return 1  \n+    return 2\t\n@@ -45 +45 @@\n+print('a\\n')\n"
+        self.assertEqual(make_key(diff), make_key(rebased))
+        self.assertNotEqual(make_key(diff), make_key(diff.replace("return 2", "return 3")))
+
+    def test_normalize_plain_diff(self):
+        self.assertEqual(ReviewCache.normalize("@@ -1,2 +1,3 @@ x  \r\n+a \n"), "@@ @@ x\n+a\n")
+
+
+if __name__ == '__main__':
+    main()
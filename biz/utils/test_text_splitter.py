@@ -0,0 +1,50 @@
+from unittest import TestCase, main
+
+from biz.utils.text_splitter import TextSplitter
+
+
+class TestTextSplitter(TestCase):
+    def test_sections_and_code_blocks_stay_together(self):
+        section = "## {title}\n\n" + "说明文字。" * 20 + "\n\n```python\ndef f():\n    return 1\n```\n\n"
+        text = "".join(section.format(title=f"第{i}节") for i in range(10))
+        splitter = TextSplitter(chunk_size=300, chunk_overlap=50)
+
+        chunks = splitter.split_text(text)
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 300)
+            # 每个块都从标题开始，代码块不会被拆开
+            self.assertTrue(chunk.startswith("## "))
+            self.assertEqual(chunk.count("```") % 2, 0)
+
+    def test_offsets_cover_text(self):
+        text = "\n".join(f"line {i}. " + "x" * (i % 80) for i in range(500))
+        spans = TextSplitter(chunk_size=200, chunk_overlap=40).split_offsets(text)
+        self.assertEqual(spans[0][0], 0)
+        self.assertEqual(spans[-1][1], len(text))
+        for (start, end), (next_start, next_end) in zip(spans, spans[1:]):
+            self.assertLessEqual(end - start, 200)
+            # 相邻块首尾相接或重叠，且重叠不超过 chunk_overlap
+            self.assertLessEqual(next_start, end)
+            self.assertLess(end - next_start, 40)
+
+    def test_stream_matches_full_text(self):
+        text = "".join(f"## 第{i}节\n" + "说明文字。" * (i % 50) + "\n```\ncode\n```\n" for i in range(200))
+        splitter = TextSplitter(chunk_size=300, chunk_overlap=50)
+        # 片段边界落在行中间、代码块中间
+        segments = [text[i:i + 97] for i in range(0, len(text), 97)]
+
+        stream = list(splitter.split_stream(segments))
+        self.assertEqual([(start, end) for start, end, _ in stream], splitter.split_offsets(text))
+        self.assertTrue(all(text[start:end] == chunk for start, end, chunk in stream))
+
+        # 丢弃的文本止于代码块结束围栏行中间、片段末尾只有半行
+        text = "```~~~~~~def # # a\n\n  \n`````````~~~~~~ a\n.```\n\n\n .a~~~~~~b```# .\n"
+        splitter = TextSplitter(chunk_size=20, chunk_overlap=11)
+        segments = [text[i:i + 3] for i in range(0, len(text), 3)]
+        stream = [(start, end) for start, end, _ in splitter.split_stream(segments)]
+        self.assertEqual(stream, splitter.split_offsets(text))
+
+
+if __name__ == '__main__':
+    main()
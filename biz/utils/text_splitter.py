@@ -0,0 +1,244 @@
+import itertools
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# 结构切分点的优先级：同一窗口内优先在优先级更高的位置切分，优先级相同时取最靠后的位置
+PARAGRAPH, BLOCK, HEADING = range(3)
+
+# 行首的结构：代码块围栏、Markdown 标题、函数/类定义、空行
+_LINE_START = (
+    r"(?:"
+    r"(?P<fence> {0,3}(?:`{3,}|~{3,}))"
+    r"|(?P<heading> {0,3}#{1,6}(?:[ \t]|$))"
+    # 函数、类等定义的开始，允许最多一级缩进（如 Java 类中的方法）
+    r"|(?P<definition>(?: {0,4}|\t?)(?:(?:(?:async[ \t]+)?def|class|func|function|interface|struct|enum"
+    r"|public|private|protected|static|export)\b|@\w))"
+    r"|(?P<blank>[ \t\r]*$)"
+    r")"
+)
+# 正则以换行符开头，引擎按换行符快速定位，普通行在正则内部就被跳过
+_STRUCTURE_PATTERN = re.compile(r"\n" + _LINE_START, re.MULTILINE)
+# 第一行没有前导换行，单独匹配
+_FIRST_LINE_PATTERN = re.compile(_LINE_START, re.MULTILINE)
+# 代码块围栏行，流式分割丢弃已输出的文本时用于推算代码块状态
+_FENCE_LINE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})", re.MULTILINE)
+# 句子结尾，窗口内没有结构切分点和换行时使用，切分位置在标点之后
+_SENTENCE_ENDS = [". ", "? ", "! ", "。", "？", "！", "；"]
+
+
+class TextSplitter:
+    """
+    文本分割器：一次扫描找出结构切分点（Markdown 标题、代码块边界、函数定义、空行），
+    再按优先级贪心选择切分位置，章节和代码块能放进一个块时不会被拆开；
+    窗口内没有结构切分点时依次退回到行首、句尾，最后硬切。
+    分割结果以 (start, end) 偏移表示，只在需要文本时才切片
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, min_chunk_size: Optional[int] = None):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size 必须大于 0")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap 必须大于等于 0 且小于 chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        # 除标题外，切分点距块起点至少 min_chunk_size 个字符，避免产生过小的块
+        self.min_chunk_size = chunk_size // 4 if min_chunk_size is None else min_chunk_size
+
+    def split_text(self, text: str) -> List[str]:
+        """将文本分割成块"""
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """将文本分割成块，返回每个块在原文中的 (start, end) 偏移，块首尾不含空白"""
+        if len(text) <= self.chunk_size:
+            span = _strip_span(text, 0, len(text))
+            return [span] if span[0] < span[1] else []
+        return self._split(text)[0]
+
+    def split_stream(self, segments: Iterable[str]) -> Iterator[Tuple[int, int, str]]:
+        """
+        流式分割：segments（如 PDF 的页、Word 的段落）依次拼接成完整文本，边读边输出 (start, end, 块文本)，
+        偏移相对于完整文本，结果与 split_offsets 一致。缓冲区只保留尚未输出的文本，
+        内存占用与 chunk_size、单个片段和最长一行的长度成正比，与文档总长度无关
+        """
+        buffer = ""
+        # 缓冲区起点在完整文本中的偏移
+        base = 0
+        start = previous_cut = last_end = 0
+        in_fence = None
+        line_start = True
+        for segment in segments:
+            buffer += segment
+            # 至少攒够两个块再切分，最后一个窗口留给后续文本
+            if len(buffer) - start < 2 * self.chunk_size:
+                continue
+            spans, start, previous_cut = self._split(buffer, start, previous_cut, last_end, in_fence,
+                                                     final=False, line_start=line_start)
+            for span_start, span_end in spans:
+                yield base + span_start, base + span_end, buffer[span_start:span_end]
+                last_end = span_end
+            # 丢弃已经不再需要的文本。下一块的起点落在围栏行中间时从该行行首保留：
+            # 代码块结束处的切分点在围栏行的下一行，需要重新扫描整个围栏行才能得到
+            keep = start
+            line_begin = buffer.rfind("\n", 0, start) + 1
+            if (line_begin or line_start) and _FENCE_LINE_PATTERN.match(buffer, line_begin):
+                keep = line_begin
+            in_fence = _fence_state(buffer, keep, in_fence, line_start)
+            line_start = buffer[keep - 1] == "\n" if keep else line_start
+            buffer = buffer[keep:]
+            base += keep
+            previous_cut -= keep
+            last_end = max(last_end - keep, 0)
+            start -= keep
+
+        if base == 0 and len(buffer) <= self.chunk_size:
+            spans = self.split_offsets(buffer)
+        else:
+            spans = self._split(buffer, start, previous_cut, last_end, in_fence, line_start=line_start)[0]
+        for span_start, span_end in spans:
+            yield base + span_start, base + span_end, buffer[span_start:span_end]
+
+    def _split(self, text: str, start: int = 0, previous_cut: int = 0, last_end: int = 0,
+               in_fence: Optional[str] = None, final: bool = True,
+               line_start: bool = True) -> Tuple[List[Tuple[int, int]], int, int]:
+        """
+        从 start 开始切分 text。final 为 False 时 text 之后还有内容，距末尾不足一个块的窗口不处理；
+        in_fence、line_start 为 text 开头处的代码块状态和是否位于行首
+        :return: (块偏移列表, 下一块的起点, 上一次切分的位置)
+        """
+        candidates = _find_structure(text, in_fence, line_start)
+        # 行首结构要看到整行才能确定，final 为 False 时只处理完全落在完整行内的窗口
+        last_line_end = text.rfind("\n")
+        spans = []
+        # 第一个位置大于 start 的候选切分点
+        first = 0
+        while start < len(text):
+            limit = start + self.chunk_size
+            cut_priority = None
+            if not final and (limit + self.chunk_size > len(text) or last_line_end < limit):
+                break
+            if limit >= len(text):
+                cut = len(text)
+            else:
+                while first < len(candidates) and candidates[first][0] <= start:
+                    first += 1
+                best = None
+                i = first
+                while i < len(candidates) and candidates[i][0] <= limit:
+                    position, priority = candidates[i]
+                    # 重叠区域内的切分点已经用过，跳过
+                    if position > previous_cut and (priority == HEADING or position - start >= self.min_chunk_size) \
+                            and (best is None or priority >= best[1]):
+                        best = candidates[i]
+                    i += 1
+                if best:
+                    cut, cut_priority = best
+                else:
+                    cut = _fallback_cut(text, max(previous_cut + 1, start + self.min_chunk_size), limit)
+
+            span = _strip_span(text, start, cut)
+            # 去掉首尾空白后可能被上一块完全包含（重叠很大时），跳过
+            if span[0] < span[1] and span[1] > last_end:
+                spans.append(span)
+                last_end = span[1]
+            if cut >= len(text):
+                start = len(text)
+                break
+
+            # 下一块从 cut - chunk_overlap 之后的第一个行首开始，没有行首时从第一个句尾之后开始，
+            # 都没有时直接从 cut - chunk_overlap 开始；在标题处切分时新章节不带重叠
+            next_start = cut
+            if self.chunk_overlap and cut_priority != HEADING:
+                next_start = _overlap_start(text, max(cut - self.chunk_overlap, start + 1), cut)
+            previous_cut = cut
+            start = next_start
+        return spans, start, previous_cut
+
+
+def _find_structure(text: str, in_fence: Optional[str] = None, line_start: bool = True) -> List[Tuple[int, int]]:
+    """
+    扫描一遍文本，返回按位置递增的结构切分点 [(位置, 优先级)]，代码块内的标题不算
+    :param in_fence: 文本开头是否处于代码块中（围栏字符）
+    :param line_start: 文本开头是否位于行首
+    """
+    candidates = []
+    first_line = _FIRST_LINE_PATTERN.match(text) if line_start else None
+    for match in itertools.chain([first_line] if first_line else [], _STRUCTURE_PATTERN.finditer(text)):
+        kind = match.lastgroup
+        # 行首位置在换行符之后
+        position = match.start() if match is first_line else match.start() + 1
+        if kind == "fence":
+            marker = match.group(kind).lstrip()[0]
+            if in_fence is None:
+                # 代码块开始前
+                in_fence = marker
+                priority = BLOCK
+            elif marker == in_fence:
+                # 代码块结束后（下一行行首）
+                in_fence = None
+                position = text.find("\n", position) + 1
+                if position == 0:
+                    continue
+                priority = BLOCK
+            else:
+                continue
+        elif kind == "heading":
+            if in_fence is not None:
+                continue
+            priority = HEADING
+        elif kind == "definition":
+            priority = BLOCK
+        else:
+            priority = PARAGRAPH
+
+        if candidates and candidates[-1][0] >= position:
+            # 代码块结束位置与下一行的切分点重合，保留优先级高的
+            if priority > candidates[-1][1]:
+                candidates[-1] = (position, priority)
+        else:
+            candidates.append((position, priority))
+    return candidates
+
+
+def _fence_state(text: str, end: int, in_fence: Optional[str], line_start: bool = True) -> Optional[str]:
+    """根据行首位于 text[:end] 内的围栏行推算 end 处的代码块状态，参数含义同 _find_structure"""
+    # 从位置 1 开始搜索时 ^ 只匹配真正的行首
+    for match in _FENCE_LINE_PATTERN.finditer(text, 0 if line_start else 1):
+        if match.start() >= end:
+            break
+        marker = match.group(1)[0]
+        if in_fence is None:
+            in_fence = marker
+        elif marker == in_fence:
+            in_fence = None
+    return in_fence
+
+
+def _fallback_cut(text: str, low: int, limit: int) -> int:
+    """窗口 [low, limit] 内没有结构切分点时，依次在最后一个行首、最后一个句尾切分，都没有时硬切"""
+    line_end = text.rfind("\n", low - 1, limit - 1)
+    if line_end != -1:
+        return line_end + 1
+    sentence_end = max(text.rfind(end, low - 1, limit) + 1 for end in _SENTENCE_ENDS)
+    if sentence_end >= low:
+        return sentence_end
+    return limit
+
+
+def _overlap_start(text: str, low: int, cut: int) -> int:
+    """重叠区域 [low, cut) 内第一个行首或句尾之后的位置，都没有时返回 low"""
+    line_end = text.find("\n", low - 1, cut - 1)
+    if line_end != -1:
+        return line_end + 1
+    sentence_ends = [position + 1 for position in (text.find(end, low - 1, cut) for end in _SENTENCE_ENDS)
+                     if position != -1 and low <= position + 1 < cut]
+    return min(sentence_ends, default=low)
+
+
+def _strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    """去掉区间首尾的空白"""
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
@@ -1,47 +1,115 @@
+from functools import lru_cache
+from typing import Tuple
+
 import tiktoken
 
+DEFAULT_ENCODING = "cl100k_base"  # 适用于 OpenAI GPT 系列
+
+
+@lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    """
+    获取编码器，按名称缓存，每个进程只加载一次。
+
+    Args:
+        encoding_name (str): 编码器名称。
+
+    Returns:
+        tiktoken.Encoding: 编码器。
+    """
+    return tiktoken.get_encoding(encoding_name)
+
+
+def _bytes_within_limit(text: str, max_tokens: int) -> bool:
+    """
+    快速预检查：每个 token 至少对应一个 UTF-8 字节，字节数不超过 max_tokens 的文本一定不会超限，无需编码。
+    """
+    # 字符数的 4 倍是字节数的上界，足够短的文本连 UTF-8 编码也可以省掉
+    return len(text) * 4 <= max_tokens or len(text.encode("utf-8")) <= max_tokens
+
 
-def count_tokens(text: str) -> int:
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
     """
     计算文本的 token 数量。
 
     Args:
         text (str): 输入文本。
+        encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"。
 
     Returns:
         int: token 数量。
     """
-    encoding = tiktoken.get_encoding("cl100k_base")  # 适用于 OpenAI GPT 系列
-    return len(encoding.encode(text))
+    return len(get_encoding(encoding_name).encode_ordinary(text))
 
 
-def truncate_text_by_tokens(text: str, max_tokens: int, encoding_name: str = "cl100k_base") -> str:
+@lru_cache(maxsize=2048)
+def count_tokens_cached(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
     """
-    根据最大 token 数量截断文本。
+    count_tokens 的缓存版本，用于知识库文档、提示词模板等在多次审查中反复出现的文本。
 
     Args:
-        text (str): 需要截断的原始文本。
+        text (str): 输入文本。
+        encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"。
+
+    Returns:
+        int: token 数量。
+    """
+    return count_tokens(text, encoding_name)
+
+
+def within_token_limit(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> bool:
+    """
+    判断文本的 token 数量是否不超过 max_tokens，明显未超限的文本不做编码。
+
+    Args:
+        text (str): 输入文本。
         max_tokens (int): 最大 token 数量。
         encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"。
 
     Returns:
-        str: 截断后的文本。
+        bool: 是否未超限。
+    """
+    return _bytes_within_limit(text, max_tokens) or count_tokens(text, encoding_name) <= max_tokens
+
+
+def count_and_truncate(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> Tuple[int, str]:
     """
-    # 获取编码器
-    encoding = tiktoken.get_encoding(encoding_name)
+    只编码一次，同时得到 token 数量和截断后的文本。
 
-    # 将文本编码为 tokens
-    tokens = encoding.encode(text)
+    Args:
+        text (str): 需要截断的原始文本。
+        max_tokens (int): 最大 token 数量。
+        encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"。
+
+    Returns:
+        Tuple[int, str]: (token 数量, 截断后的文本)。通过预检查跳过编码时，token 数量为 UTF-8 字节数（token 数量的上界）。
+    """
+    if _bytes_within_limit(text, max_tokens):
+        return len(text.encode("utf-8")), text
 
-    # 如果 tokens 数量超过最大限制，则截断
+    encoding = get_encoding(encoding_name)
+    # 使用 encode_ordinary：diff 中出现 <|endoftext|> 等特殊 token 文本时按普通文本处理，不会抛出异常
+    tokens = encoding.encode_ordinary(text)
     if len(tokens) > max_tokens:
-        truncated_tokens = tokens[:max_tokens]
-        truncated_text = encoding.decode(truncated_tokens)
-        return truncated_text
+        return len(tokens), encoding.decode(tokens[:max_tokens])
+    return len(tokens), text
+
 
-    return text
+def truncate_text_by_tokens(text: str, max_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> str:
+    """
+    根据最大 token 数量截断文本。
+
+    Args:
+        text (str): 需要截断的原始文本。
+        max_tokens (int): 最大 token 数量。
+        encoding_name (str): 使用的编码器名称，默认为 "cl100k_base"。
+
+    Returns:
+        str: 截断后的文本。
+    """
+    return count_and_truncate(text, max_tokens, encoding_name)[1]
 
 if __name__ == '__main__':
     text = "Hello, world! This is a test text for token counting."
     print(count_tokens(text))  # 输出：11
-    print(truncate_text_by_tokens(text, 5))  # 输出："Hello, world!"
\ No newline at end of file
+    print(truncate_text_by_tokens(text, 5))  # 输出："Hello, world!"
@@ -117,10 +117,10 @@ def upload_document(file_name, content, tags):
     try:
         # 创建临时文件对象
         import io
-        file_obj = io.BytesIO(content.encode('utf-8'))
+        file_obj = io.BytesIO(content)
         file_obj.name = file_name
         
-        files = {'file': (file_name, file_obj, 'text/plain')}
+        files = {'file': (file_name, file_obj, 'application/octet-stream')}
         data = {
             'title': file_name,
             'tags': ','.join(tags) if tags else ''
@@ -465,7 +465,7 @@ elif page == "📤 文档上传":
     
     st.divider()
     
-    uploaded_file = st.file_uploader("选择要上传的文档", type=['txt', 'md'])
+    uploaded_file = st.file_uploader("选择要上传的文档", type=['txt', 'md', 'pdf', 'docx'])
     
     if uploaded_file is not None:
         st.success("✅ 文件已选择")
@@ -495,8 +495,8 @@ elif page == "📤 文档上传":
         with col2:
             if st.button("📤 上传文档", type="primary", use_container_width=True):
                 with st.spinner("正在上传文档..."):
-                    # 读取文件内容
-                    content = uploaded_file.read().decode('utf-8')
+                    # 读取文件内容（PDF、Word 为二进制，由服务端解析）
+                    content = uploaded_file.getvalue()
                     
                     # 上传文档
                     result = upload_document(uploaded_file.name, content, tags)
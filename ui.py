@@ -252,6 +252,13 @@ def login_page():
                     st.error("用户名或密码错误")
         st.markdown('</div>', unsafe_allow_html=True)
 
+# 按项目或开发者汇总统计数据（来自按天汇总表），计算提交数量和平均得分
+def summarize_stats(stats_df, key):
+    summary = stats_df.groupby(key)[['review_count', 'score_sum']].sum().reset_index()
+    summary['average_score'] = summary['score_sum'] / summary['review_count']
+    return summary
+
+
 # 生成项目提交数量图表
 def generate_project_count_chart(df):
     if df.empty:
@@ -259,8 +266,8 @@ def generate_project_count_chart(df):
         return
 
     # 计算每个项目的提交数量
-    project_counts = df['project_name'].value_counts().reset_index()
-    project_counts.columns = ['project_name', 'count']
+    project_counts = summarize_stats(df, 'project_name').sort_values('review_count', ascending=False)
+    project_counts = project_counts.rename(columns={'review_count': 'count'})
 
     # 生成颜色列表，每个项目一个颜色
     colors = plt.colormaps['tab20'].resampled(len(project_counts))
@@ -285,8 +292,7 @@ def generate_project_score_chart(df):
         return
 
     # 计算每个项目的平均分数
-    project_scores = df.groupby('project_name')['score'].mean().reset_index()
-    project_scores.columns = ['project_name', 'average_score']
+    project_scores = summarize_stats(df, 'project_name')
 
     # 生成颜色列表，每个项目一个颜色
     # colors = plt.cm.get_cmap('Accent', len(project_scores))  # 使用'tab20'颜色映射，适合分类数据
@@ -310,8 +316,8 @@ def generate_author_count_chart(df):
         return
 
     # 计算每个人员的提交数量
-    author_counts = df['author'].value_counts().reset_index()
-    author_counts.columns = ['author', 'count']
+    author_counts = summarize_stats(df, 'author').sort_values('review_count', ascending=False)
+    author_counts = author_counts.rename(columns={'review_count': 'count'})
 
     # 生成颜色列表，每个项目一个颜色
     colors = plt.colormaps['Paired'].resampled(len(author_counts))
@@ -334,8 +340,7 @@ def generate_author_score_chart(df):
         return
 
     # 计算每个人员的平均分数
-    author_scores = df.groupby('author')['score'].mean().reset_index()
-    author_scores.columns = ['author', 'average_score']
+    author_scores = summarize_stats(df, 'author')
 
     # 显示平均分数柱状图
     fig2, ax2 = plt.subplots(figsize=(10, 6))
@@ -386,7 +391,7 @@ def main_page():
     else:
         mr_tab = st.container()
 
-    def display_data(tab, service_func, columns, column_config):
+    def display_data(tab, service_func, stats_func, columns, column_config):
         with tab:
             col1, col2, col3, col4 = st.columns(4)
             with col1:
@@ -397,12 +402,12 @@ def main_page():
             start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
             end_datetime = datetime.datetime.combine(end_date, datetime.time.max)
 
-            data = get_data(service_func, updated_at_gte=int(start_datetime.timestamp()),
-                            updated_at_lte=int(end_datetime.timestamp()), columns=columns)
-            df = pd.DataFrame(data)
+            # 筛选项和统计图表都从按天汇总表读取，不加载原始审查日志
+            all_stats = stats_func(updated_at_gte=int(start_datetime.timestamp()),
+                                   updated_at_lte=int(end_datetime.timestamp()))
 
-            unique_authors = sorted(df["author"].dropna().unique().tolist()) if not df.empty else []
-            unique_projects = sorted(df["project_name"].dropna().unique().tolist()) if not df.empty else []
+            unique_authors = sorted(all_stats["author"].dropna().unique().tolist()) if not all_stats.empty else []
+            unique_projects = sorted(all_stats["project_name"].dropna().unique().tolist()) if not all_stats.empty else []
             with col3:
                 authors = st.multiselect("开发者", unique_authors, default=[], key=f"{tab}_authors")
             with col4:
@@ -419,24 +424,27 @@ def main_page():
                 column_config=column_config
             )
 
-            total_records = len(df)
-            average_score = df["score"].mean() if not df.empty else 0
+            stats = stats_func(authors=authors, project_names=project_names,
+                               updated_at_gte=int(start_datetime.timestamp()),
+                               updated_at_lte=int(end_datetime.timestamp()))
+            total_records = int(stats["review_count"].sum()) if not stats.empty else 0
+            average_score = stats["score_sum"].sum() / total_records if total_records else 0
             st.markdown(f"**总记录数:** {total_records}，**平均得分:** {average_score:.2f}")
 
             # 创建2x2网格布局展示四个图表
             row1, row2, row3, row4 = st.columns(4)
             with row1:
                 st.markdown("<div style='text-align: center; font-size: 20px;'><b>项目提交统计</b></div>", unsafe_allow_html=True)
-                generate_project_count_chart(df)
+                generate_project_count_chart(stats)
             with row2:
                 st.markdown("<div style='text-align: center; font-size: 20px;'><b>项目平均得分</b></div>", unsafe_allow_html=True)
-                generate_project_score_chart(df)
+                generate_project_score_chart(stats)
             with row3:
                 st.markdown("<div style='text-align: center; font-size: 20px;'><b>开发者提交统计</b></div>", unsafe_allow_html=True)
-                generate_author_count_chart(df)
+                generate_author_count_chart(stats)
             with row4:
                 st.markdown("<div style='text-align: center; font-size: 20px;'><b>开发者平均得分</b></div>", unsafe_allow_html=True)
-                generate_author_score_chart(df)
+                generate_author_score_chart(stats)
 
     # Merge Request 数据展示
     mr_columns = ["project_name", "author", "source_branch", "target_branch", "updated_at", "commit_messages", "score",
@@ -462,7 +470,8 @@ def main_page():
         ),
     }
 
-    display_data(mr_tab, ReviewService().get_mr_review_logs, mr_columns, mr_column_config)
+    display_data(mr_tab, ReviewService().get_mr_review_logs, ReviewService().get_mr_review_stats, mr_columns,
+                 mr_column_config)
 
     # Push 数据展示
     if show_push_tab:
@@ -482,7 +491,8 @@ def main_page():
             ),
         }
 
-        display_data(push_tab, ReviewService().get_push_review_logs, push_columns, push_column_config)
+        display_data(push_tab, ReviewService().get_push_review_logs, ReviewService().get_push_review_stats,
+                     push_columns, push_column_config)
 
 
 # 应用入口